@@ -0,0 +1,121 @@
+"""Backtest throughput: every template over a universe of daily bars.
+
+Writes a synthetic universe (geometric Brownian motion with a little
+drift and regime noise) as per-ticker CSVs and ingests them into a market
+data store, unless ``--data-dir`` points at an existing store, then times
+
+* one process running each template over every ticker,
+* the same through ``backtest_tickers``' process pool (``--processes``),
+* a per-bar Python loop of the mean-reversion rule, for scale, on a few
+  tickers, checked against the vectorised result.
+
+    cd backend && python bench/bench_backtest.py [--tickers 500] [--years 10] [--processes 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils import backtest as bt  # noqa: E402
+from utils.marketdata import available_tickers, load_bars, open_store  # noqa: E402
+
+
+def write_universe(data_dir, n, years, seed=7):
+    rng = np.random.default_rng(seed)
+    bars = int(years * bt.BARS_PER_YEAR)
+    dates = np.busday_offset(np.datetime64("2015-01-02"), np.arange(bars), roll="forward")
+    names = ["SPY"] + [f"T{i:04d}" for i in range(n - 1)]
+    for name in names:
+        vol = rng.uniform(0.15, 0.45) / np.sqrt(bt.BARS_PER_YEAR)
+        drift = rng.uniform(-0.05, 0.15) / bt.BARS_PER_YEAR
+        close = 50 * np.exp(np.cumsum(rng.normal(drift, vol, bars)))
+        spread = np.abs(rng.normal(0, vol, bars)) * close
+        open_ = close * (1 + rng.normal(0, vol / 3, bars))
+        high = np.maximum(open_, close) + spread
+        low = np.minimum(open_, close) - spread
+        volume = rng.integers(1e5, 1e7, bars)
+        with open(os.path.join(data_dir, f"{name}.csv"), "w") as f:
+            f.write("Date,Open,High,Low,Close,Volume\n")
+            for row in zip(dates.astype(str), open_, high, low, close, volume):
+                f.write("%s,%.4f,%.4f,%.4f,%.4f,%d\n" % row)
+    return names
+
+
+def loop_mean_reversion(close, period=14, lower=30.0, exit=55.0, cost_bps=bt.BACKTEST_COST_BPS):
+    """Reference per-bar implementation of the mean_reversion template + run()."""
+    n = len(close)
+    returns, held = [0.0] * n, [0.0] * n
+    gains, losses = [0.0] * n, [0.0] * n
+    position = prev_held = 0.0
+    for t in range(n):
+        if t:
+            delta = close[t] - close[t - 1]
+            gains[t], losses[t] = max(delta, 0.0), max(-delta, 0.0)
+            held[t] = position
+            returns[t] = position * (close[t] / close[t - 1] - 1) - abs(position - prev_held) * cost_bps / 1e4
+            prev_held = position
+        if t >= period - 1:
+            g = sum(gains[t - period + 1:t + 1]) / period
+            l = sum(losses[t - period + 1:t + 1]) / period
+            r = 100.0 if l == 0 else 100.0 - 100.0 / (1.0 + g / l)
+            if r < lower:
+                position = 1.0
+            elif r > exit:
+                position = 0.0
+    return np.array(returns), np.array(held)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=500)
+    ap.add_argument("--years", type=float, default=10)
+    ap.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--data-dir", help="existing market data store (see utils/marketdata.py)")
+    ap.add_argument("--loop-tickers", type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or os.path.join(tmp, "store")
+        if args.data_dir is None:
+            csv_dir = os.path.join(tmp, "csv")
+            os.mkdir(csv_dir)
+            write_universe(csv_dir, args.tickers, args.years)
+            start = time.perf_counter()
+            open_store(data_dir).ingest(*(os.path.join(csv_dir, name) for name in sorted(os.listdir(csv_dir))))
+            print(f"ingested {args.tickers} x {args.years:g}y synthetic tickers in {time.perf_counter() - start:.1f} s")
+        tickers = available_tickers(data_dir)
+        bars = sum(len(load_bars(t, data_dir).close) for t in tickers)
+        print(f"{len(tickers)} tickers, {bars:,d} bars, {os.cpu_count()} cpus\n")
+
+        for template in bt.TEMPLATES:
+            start = time.perf_counter()
+            bt.backtest_tickers(template, tickers, processes=1, data_dir=data_dir)
+            t1 = time.perf_counter() - start
+            start = time.perf_counter()
+            results = bt.backtest_tickers(template, tickers, processes=args.processes, data_dir=data_dir)
+            tp = time.perf_counter() - start
+            summary = bt.aggregate(results)
+            print(f"{template:15s} 1 proc {t1:6.2f} s   {args.processes} procs {tp:6.2f} s   "
+                  f"{bars / t1 / 1e6:5.1f} M bars/s   median sharpe {summary['sharpe_ratio']}")
+
+        print()
+        sample = tickers[:args.loop_tickers]
+        closes = [load_bars(t, data_dir).close for t in sample]
+        start = time.perf_counter()
+        loop = [loop_mean_reversion(c.tolist()) for c in closes]
+        t_loop = time.perf_counter() - start
+        start = time.perf_counter()
+        vec = [bt.run("mean_reversion", load_bars(t, data_dir)) for t in sample]
+        t_vec = time.perf_counter() - start
+        same = all(np.allclose(a[0], b[0]) and np.array_equal(a[1], b[1]) for a, b in zip(loop, vec))
+        print(f"mean_reversion on {len(sample)} tickers: per-bar loop {t_loop * 1e3:7.1f} ms, "
+              f"vectorised {t_vec * 1e3:6.1f} ms ({t_loop / t_vec:.0f}x), same result: {same}")
+        bt._pool and bt._pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Payload size and backend CPU of the two chart formats.
+
+    cd backend && python bench/bench_charts.py [--strategies 3] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils.charts import render_charts  # noqa: E402
+from utils.parsing import METRIC_FIELDS  # noqa: E402
+
+
+def fake_strategies(n):
+    return [
+        {"name": f"Strategy {i}", "explanation": "x", **{f: float(i + j) for j, f in enumerate(METRIC_FIELDS)}}
+        for i in range(n)
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--strategies", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    strategies = fake_strategies(args.strategies)
+    render_charts(strategies, "plotly")     # warm plotly's validators
+    rows = {}
+    for fmt in ("plotly", "compact"):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            body = json.dumps(render_charts(strategies, fmt))
+        elapsed = (time.perf_counter() - start) / args.repeat
+        rows[fmt] = (len(body.encode()), elapsed)
+        print(f"{fmt:8s} {len(body.encode()):9,d} bytes  {elapsed * 1e3:8.3f} ms build+serialize")
+    (pb, pt), (cb, ct) = rows["plotly"], rows["compact"]
+    print(f"\ncompact is {pb / cb:.0f}x smaller and {pt / ct:.0f}x cheaper to produce")
+
+
+if __name__ == "__main__":
+    main()
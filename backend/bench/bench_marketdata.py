@@ -0,0 +1,118 @@
+"""Market data store: universe load time, appends and page sharing.
+
+Builds a synthetic universe (``--tickers`` x ``--years`` of daily bars, see
+bench_backtest.py) as CSVs, ingests it, then measures
+
+* loading every ticker by re-parsing its CSV (what a request would do
+  without a data layer) vs. opening the store and taking views of all of it,
+  plus a one-year slice of each,
+* appending one new bar to a ticker (no file rewrite),
+* memory of ``--workers`` processes that each read every close price: their
+  RSS counts the shared page-cache pages in full, PSS splits them between
+  the sharers, so PSS well under RSS means one copy is being shared.
+
+    cd backend && python bench/bench_marketdata.py [--tickers 500] [--years 10] [--workers 4]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from bench_backtest import write_universe  # noqa: E402
+from utils.marketdata import Bars, MarketDataStore, read_file  # noqa: E402
+
+
+def rollup():
+    """``(rss, pss)`` in kB for this process."""
+    out = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                out[key] = int(rest.split()[0])
+    return out["Rss"], out["Pss"]
+
+
+def reader(path, barrier, results):
+    before = rollup()
+    store = MarketDataStore(path)
+    total = sum(float(store.bars(t).close.sum()) for t in store.tickers())
+    barrier.wait()                  # everyone has the pages mapped before PSS is read
+    after = rollup()
+    barrier.wait()
+    results.put((after[0] - before[0], after[1] - before[1], total))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=500)
+    ap.add_argument("--years", type=float, default=10)
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_dir, path = os.path.join(tmp, "csv"), os.path.join(tmp, "store")
+        os.mkdir(csv_dir)
+        write_universe(csv_dir, args.tickers, args.years)
+        files = [os.path.join(csv_dir, f) for f in sorted(os.listdir(csv_dir))]
+
+        start = time.perf_counter()
+        MarketDataStore(path).ingest(*files)
+        t_ingest = time.perf_counter() - start
+        store = MarketDataStore(path)
+        stats = store.stats()
+        print(f"{stats['tickers']} tickers, {stats['bars']:,d} bars, {stats['bytes'] / 1e6:.1f} MB on disk, "
+              f"ingest {t_ingest:.2f} s\n")
+
+        start = time.perf_counter()
+        parsed = {name: bars for f in files for name, bars in read_file(f)}
+        t_csv = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = MarketDataStore(path)
+        views = {t: store.bars(t) for t in store.tickers()}
+        t_open = time.perf_counter() - start
+        end = max(b.dates[-1] for b in views.values())
+        start = time.perf_counter()
+        year = [store.bars(t, end - 365, end) for t in views]
+        t_slice = time.perf_counter() - start
+        same = all(np.array_equal(views[t.upper()].close, b.close) for t, b in parsed.items())
+        print(f"load universe  CSV parse {t_csv * 1e3:8.1f} ms   store open + views {t_open * 1e3:6.2f} ms "
+              f"({t_csv / t_open:.0f}x)   same data: {same}")
+        ticker = next(iter(views))
+        print(f"1-year slice of every ticker {t_slice * 1e3:6.2f} ms ({len(year[0].close)} bars each, "
+              f"zero-copy: {np.shares_memory(year[0].close, views[ticker].close)})")
+
+        size = store.stats()["bytes"]
+        last = views[ticker].dates[-1]
+        appends = 200
+        start = time.perf_counter()
+        for i in range(1, appends + 1):
+            store.append(ticker, Bars(np.array([last + i]), *(np.array([100.0]) for _ in range(5))))
+        t_append = (time.perf_counter() - start) / appends
+        print(f"append 1 bar  {t_append * 1e3:6.2f} ms each (fsync included)   "
+              f"store {size:,d} -> {store.stats()['bytes']:,d} bytes")
+
+        ctx = mp.get_context("spawn")
+        barrier, results = ctx.Barrier(args.workers), ctx.Queue()
+        procs = [ctx.Process(target=reader, args=(path, barrier, results)) for _ in range(args.workers)]
+        for p in procs:
+            p.start()
+        out = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        column_kb = stats["rows"] * 8 / 1024
+        rss = sum(r for r, _, _ in out) / len(out)
+        pss = sum(p for _, p, _ in out) / len(out)
+        print(f"\n{args.workers} reader processes, close column {column_kb / 1024:.1f} MB: "
+              f"per process RSS +{rss / 1024:.1f} MB, PSS +{pss / 1024:.1f} MB "
+              f"(a private copy would be {column_kb / 1024:.1f} MB each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Serialisation time and bytes on the wire for a /chat strategies response.
+
+"before" is FastAPI's default path (``jsonable_encoder`` + ``JSONResponse``),
+"after" is ``FastJSONResponse`` behind ``CompressionMiddleware``. Both are
+measured on the encoder alone and end to end through an ASGI app, for the
+compact and the full-plotly chart formats.
+
+    cd backend && python bench/bench_responses.py [--repeat 300] [--strategies 3]
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils.charts import render_charts  # noqa: E402
+from utils.parsing import build_response_summary, extract_sector_summary, parse_strategies  # noqa: E402
+from utils.providers import FAKE_STRATEGY_ANSWER  # noqa: E402
+from utils.responses import (CompressionMiddleware, FastJSONResponse, RESPONSE_GZIP_LEVEL,  # noqa: E402
+                             brotli, compress)
+
+LINKS = {"3g 1.6 Mbit/s": 1.6e6, "4g 12 Mbit/s": 12e6}
+
+
+def payload(n, chart_format):
+    strategies = parse_strategies(FAKE_STRATEGY_ANSWER)
+    strategies = [dict(strategies[i % len(strategies)], name=f"{strategies[i % len(strategies)]['name']} {i}")
+                  for i in range(n)]
+    return {
+        "session_id": "0f8e4a4e-5d0c-4a3b-9a53-1f1f8b7a2c11",
+        "sector_view_summary": extract_sector_summary(FAKE_STRATEGY_ANSWER),
+        "response": build_response_summary(strategies),
+        "strategies": strategies,
+        "charts": render_charts(strategies, chart_format),
+    }
+
+
+def per_call(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def app_for(body, fast):
+    app = FastAPI()
+    if fast:
+        app.add_middleware(CompressionMiddleware)
+
+        @app.get("/chat")
+        def chat():
+            return FastJSONResponse(body)
+    else:
+        @app.get("/chat")
+        def chat():
+            return body
+    return app
+
+
+async def end_to_end(app, repeat, headers):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        r = await client.get("/chat", headers=headers)
+        wire = int(r.headers.get("content-length", 0))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            r = await client.get("/chat", headers=headers)
+        return (time.perf_counter() - start) / repeat, wire, r.headers.get("etag")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=300)
+    ap.add_argument("--strategies", type=int, default=3)
+    args = ap.parse_args()
+
+    for fmt in ("compact", "plotly"):
+        body = payload(args.strategies, fmt)
+        before = JSONResponse(jsonable_encoder(body)).body
+        after = FastJSONResponse(body).body
+        t_before = per_call(lambda: JSONResponse(jsonable_encoder(body)), args.repeat)
+        t_after = per_call(lambda: FastJSONResponse(body), args.repeat)
+        print(f"\n== {fmt} charts, {args.strategies} strategies ==")
+        print(f"encode   before {t_before * 1e3:7.3f} ms   after {t_after * 1e3:7.3f} ms   "
+              f"({t_before / t_after:.1f}x)   {len(before):,d} / {len(after):,d} bytes")
+
+        sizes = {"identity": (len(after), 0.0)}
+        codings = ["gzip"] + (["br"] if brotli is not None else [])
+        for coding in codings:
+            t = per_call(lambda: compress(after, coding), args.repeat)
+            sizes[coding] = (len(compress(after, coding)), t)
+        for coding, (size, t) in sizes.items():
+            links = "  ".join(f"{name} {size * 8 / bps * 1e3:7.1f} ms" for name, bps in LINKS.items())
+            print(f"{coding:8s} {size:9,d} bytes  compress {t * 1e3:6.3f} ms   transfer: {links}")
+        if brotli is None:
+            print("(brotli not installed: pip install brotli to compare)")
+        print(f"gzip level {RESPONSE_GZIP_LEVEL}, stdlib level 9 would be {len(gzip.compress(after, 9)):,d} bytes")
+
+        accept = {"Accept-Encoding": "br, gzip"}
+        t0, w0, _ = asyncio.run(end_to_end(app_for(body, False), args.repeat, accept))
+        t1, w1, tag = asyncio.run(end_to_end(app_for(body, True), args.repeat, accept))
+        t2, w2, _ = asyncio.run(end_to_end(app_for(body, True), args.repeat, {**accept, "If-None-Match": tag}))
+        print(f"asgi     before {t0 * 1e3:7.3f} ms {w0:9,d} B   after {t1 * 1e3:7.3f} ms {w1:9,d} B   "
+              f"etag hit (304) {t2 * 1e3:7.3f} ms {w2:,d} B")
+
+
+if __name__ == "__main__":
+    main()
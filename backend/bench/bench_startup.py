@@ -0,0 +1,82 @@
+"""Cold-start time of each backend module, checked against a budget.
+
+Every run is a fresh interpreter doing ``python -X importtime -c "import <backend>"``,
+so nothing is cached in-process; the best of ``--runs`` is reported to keep
+disk and scheduler noise out. Also lists the slowest imports (cumulative)
+and fails if any module in ``--forbid`` was imported at start-up.
+
+    cd backend && python bench/bench_startup.py [--budget 1.0] [--runs 5] [--top 10]
+
+Exits 1 when a backend is over budget or pulls in a forbidden module.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKENDS = ("main_openrouter", "main_openrouter_history", "main_hf", "main_openrouter_backup")
+FORBIDDEN = ("langchain", "plotly.graph_objs", "matplotlib", "pandas")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def cold_start(module, forbid):
+    """``(wall seconds, [(cumulative_us, name), ...] top-level first, forbidden found)``."""
+    check = f"import sys; bad = [m for m in {tuple(forbid)!r} if m in sys.modules]; bad and print(*bad)"
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}; {check}"],
+                          cwd=BACKEND_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    imports = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            imports.append((int(m.group(2)), m.group(4)))
+    return wall, imports, proc.stdout.split()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=BACKENDS)
+    ap.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECS", "1.0")),
+                    help="max seconds to import a backend in a fresh interpreter")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--forbid", nargs="*", default=FORBIDDEN,
+                    help="modules that must not be imported at start-up")
+    args = ap.parse_args()
+
+    failed = False
+    for backend in args.backends:
+        try:
+            runs = [cold_start(backend, args.forbid) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{backend:26s} import failed: {e}")
+            failed = True
+            continue
+        wall, imports, bad = min(runs, key=lambda r: r[0])
+        module_secs = next((us for us, name in reversed(imports) if name == backend), 0) / 1e6
+        over = wall > args.budget
+        failed |= over or bool(bad)
+        print(f"{backend:26s} {wall:6.3f} s wall  {module_secs:6.3f} s imports  "
+              f"{'OVER BUDGET' if over else 'ok'}{'  forbidden: ' + ', '.join(bad) if bad else ''}")
+        # top-level packages only: nested lines are already in their parent's cumulative time
+        roots = {}
+        for us, name in imports:
+            root = name.split(".")[0]
+            if name == root and root != backend:
+                roots[root] = max(roots.get(root, 0), us)
+        for name, us in sorted(roots.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"    {us / 1e3:8.1f} ms  {name}")
+
+    print(f"\nbudget {args.budget:.2f} s per backend")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
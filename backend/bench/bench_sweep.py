@@ -0,0 +1,89 @@
+"""Parameter sweep: scaling with processes, pruning and task payloads.
+
+Builds (or reuses, ``--data-dir``) a store like bench_backtest.py, then
+sweeps the mean-reversion grid (180 parameter sets) over ``--tickers``
+tickers and reports
+
+* wall time with 1, 2, 4, ... up to ``--processes`` workers and the
+  speed-up over one (ideal is the worker count, as long as there are that
+  many cores -- this prints ``os.cpu_count()`` next to it),
+* the same sweep without rungs, i.e. every candidate on every ticker,
+  against the pruned one: time, full-backtest equivalents, and how many of
+  the best parameter sets both find,
+* the bytes pickled per task with the shared-memory block vs. shipping each
+  worker the price arrays.
+
+    cd backend && python bench/bench_sweep.py [--tickers 40] [--years 10] [--processes 8]
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from bench_backtest import write_universe  # noqa: E402
+from utils import sweep as sw  # noqa: E402
+from utils.marketdata import available_tickers, load_bars, open_store  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickers", type=int, default=40)
+    ap.add_argument("--years", type=float, default=10)
+    ap.add_argument("--processes", type=int, default=max(os.cpu_count() or 1, 4))
+    ap.add_argument("--data-dir", help="existing market data store (see utils/marketdata.py)")
+    ap.add_argument("--template", default="mean_reversion")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or os.path.join(tmp, "store")
+        if args.data_dir is None:
+            csv_dir = os.path.join(tmp, "csv")
+            os.mkdir(csv_dir)
+            write_universe(csv_dir, args.tickers, args.years)
+            open_store(data_dir).ingest(*(os.path.join(csv_dir, name) for name in sorted(os.listdir(csv_dir))))
+        tickers = available_tickers(data_dir)[:args.tickers]
+        bars = sum(len(load_bars(t, data_dir).close) for t in tickers)
+        grid = sw.grid(sw.DEFAULT_SPACES[args.template])
+        print(f"{args.template}: {len(grid)} parameter sets x {len(tickers)} tickers ({bars:,d} bars), "
+              f"{os.cpu_count()} cpus\n")
+
+        def timed(**kwargs):
+            start = time.perf_counter()
+            strategies, stats = sw.sweep(args.template, tickers, data_dir=data_dir, **kwargs)
+            return time.perf_counter() - start, strategies, stats
+
+        counts = sorted({1, *(2 ** i for i in range(1, 8) if 2 ** i <= args.processes), args.processes})
+        base = None
+        for n in counts:
+            t, strategies, stats = timed(processes=n)
+            base = base or t
+            print(f"{n:3d} procs {t:7.2f} s   speed-up {base / t:5.2f}x (ideal {min(n, os.cpu_count() or 1)}x)   "
+                  f"best {strategies[0]['name']}")
+
+        t_full, full, s_full = timed(processes=1, rungs=(1.0,))
+        t_pruned, pruned, s_pruned = timed(processes=1)
+        top = 10
+        overlap = len({sw._key(s["params"]) for s in full[:top]} & {sw._key(s["params"]) for s in pruned[:top]})
+        print(f"\nno pruning {t_full:6.2f} s, {s_full['full_equivalents']:6.1f} full backtests\n"
+              f"pruned     {t_pruned:6.2f} s, {s_pruned['full_equivalents']:6.1f} full backtests "
+              f"({s_pruned['pruned']} pruned, {s_pruned['saved']:.0%} saved)\n"
+              f"same best: {full[0]['params'] == pruned[0]['params']}, {overlap} of the top {top} in common")
+
+        shared = sw.SharedBars({t: load_bars(t, data_dir) for t in tickers})
+        try:
+            batch = grid[::max(args.processes, 1)]
+            with_shm = len(pickle.dumps((sw._evaluate_batch, args.template, batch, 1.0)))
+            init = len(pickle.dumps((shared.shm.name, shared.layout)))
+            arrays = {t: tuple(b) for t, b in ((t, load_bars(t, data_dir)) for t in tickers)}
+            with_arrays = len(pickle.dumps((sw._evaluate_batch, args.template, batch, 1.0, arrays)))
+        finally:
+            shared.close()
+        print(f"\nper task: {with_shm:,d} bytes with shared memory (+{init:,d} once per worker) "
+              f"vs {with_arrays:,d} bytes pickling the bars")
+
+
+if __name__ == "__main__":
+    main()
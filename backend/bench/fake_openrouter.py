@@ -0,0 +1,134 @@
+"""Local stand-in for the OpenRouter chat-completions API (and HF inference).
+
+Canned answers come from ``utils.providers.fake_reply`` (intent labels, a
+well-formed 3-strategy answer, or a short chat reply). Latency is lognormal
+around ``FAKE_LATENCY`` seconds with spread ``FAKE_SIGMA``; streamed answers
+spend ``FAKE_TTFT`` of it before the first token. ``FAKE_429_RATE`` /
+``FAKE_5XX_RATE`` inject failures (429s carry ``Retry-After: FAKE_RETRY_AFTER``).
+
+    cd backend && uvicorn fake_openrouter:app --app-dir bench --port 8900
+    OPENROUTER_API_URL=http://127.0.0.1:8900/api/v1/chat/completions uvicorn main_openrouter:app
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils.providers import fake_reply  # noqa: E402
+
+
+class FakeConfig:
+
+    def __init__(self, latency=0.5, sigma=0.4, ttft=0.25, rate_429=0.0, rate_5xx=0.0,
+                 retry_after=0.5, chunk_size=24, seed=None):
+        self.latency = latency
+        self.sigma = sigma
+        self.ttft = ttft
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=float(os.getenv("FAKE_LATENCY", "0.5")),
+            sigma=float(os.getenv("FAKE_SIGMA", "0.4")),
+            ttft=float(os.getenv("FAKE_TTFT", "0.25")),
+            rate_429=float(os.getenv("FAKE_429_RATE", "0")),
+            rate_5xx=float(os.getenv("FAKE_5XX_RATE", "0")),
+            retry_after=float(os.getenv("FAKE_RETRY_AFTER", "0.5")),
+            chunk_size=int(os.getenv("FAKE_CHUNK_SIZE", "24")),
+            seed=int(os.environ["FAKE_SEED"]) if os.getenv("FAKE_SEED") else None,
+        )
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def create_app(config: FakeConfig = None) -> FastAPI:
+    config = config or FakeConfig.from_env()
+    rng = random.Random(config.seed)
+    counts = Counter()
+    app = FastAPI()
+
+    def injected_error():
+        r = rng.random()
+        if r < config.rate_429:
+            counts["429"] += 1
+            return JSONResponse({"error": {"code": 429, "message": "Rate limit exceeded"}}, status_code=429,
+                                headers={"Retry-After": str(config.retry_after)})
+        if r < config.rate_429 + config.rate_5xx:
+            counts["5xx"] += 1
+            return JSONResponse({"error": {"code": 502, "message": "Upstream error"}}, status_code=502)
+        return None
+
+    def latency():
+        return config.latency * rng.lognormvariate(0, config.sigma) if config.sigma else config.latency
+
+    def usage(messages, text):
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+                "total_tokens": prompt_tokens + len(text) // 4}
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counts["requests"] += 1
+        error = injected_error()
+        if error is not None:
+            return error
+        messages = body["messages"]
+        text = fake_reply(messages)
+        total = latency()
+
+        if not body.get("stream"):
+            await asyncio.sleep(total)
+            return {
+                "id": f"gen-fake-{counts['requests']}",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage(messages, text),
+            }
+
+        chunks = [text[i:i + config.chunk_size] for i in range(0, len(text), config.chunk_size)]
+        gap = total * (1 - config.ttft) / max(1, len(chunks))
+
+        async def events():
+            yield ": OPENROUTER PROCESSING\n\n"
+            await asyncio.sleep(total * config.ttft)
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(gap)
+                yield "data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": chunk}}]}) + "\n\n"
+            yield "data: " + json.dumps({"choices": [], "usage": usage(messages, text)}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/models/{model:path}")
+    async def hf_inference(model: str, request: Request):
+        body = await request.json()
+        counts["requests"] += 1
+        error = injected_error()
+        if error is not None:
+            return error
+        await asyncio.sleep(latency())
+        return [{"generated_text": fake_reply([{"role": "user", "content": body["inputs"]}])}]
+
+    @app.get("/stats")
+    def stats():
+        return {"config": config.as_dict(), "counts": dict(counts)}
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,361 @@
+"""Concurrent-user load test of the backends against a fake OpenRouter.
+
+Each simulated user replays one scripted conversation after another:
+
+    strategy   "Bullish on X, give me trading strategies"        VIEW_WITH_STRATEGY
+    follow_up  "I'm bullish on X"  ->  "yes please"               VIEW_NO_STRATEGY, then confirm
+    other      small talk                                          OTHER
+
+and every reply is checked against the branch it should have taken.
+``main_hf`` has no intent routing, so it only runs ``strategy``.
+``main_openrouter`` keeps one global conversation memory, so its
+``follow_up`` numbers under concurrency also measure users trampling each
+other's confirmation state; ``main_openrouter_history`` keeps per-session state.
+
+Two modes:
+
+    inprocess   backend and fake upstream run in this process over httpx's
+                ASGI transport (no sockets, no uvicorn). Good for comparing
+                commits; streamed upstream bodies arrive in one piece.
+    uvicorn     fake upstream and backend each run under uvicorn on local
+                ports; memory is the backend process's RSS.
+
+Results go to ``bench/results/<timestamp>-<commit>.json`` (git-ignored); pass
+``--compare`` an older file to print the deltas.
+
+    cd backend && python bench/load_test.py --users 20 --duration 15
+    cd backend && python bench/load_test.py --mode uvicorn --backends main_openrouter_history \\
+        --latency 1.5 --rate-429 0.05 --compare bench/results/<older>.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(HERE, "results")
+
+BACKENDS = ("main_openrouter", "main_openrouter_history", "main_hf")
+WORKLOADS = ("strategy", "follow_up", "other")
+BACKEND_WORKLOADS = {"main_hf": ("strategy",)}
+
+SECTORS = ("tech", "energy", "banks", "telecom", "pharma", "retail", "semiconductors", "utilities")
+SMALL_TALK = ("hello there, how is your day going", "what can you help me with?",
+              "thanks, that was useful", "who built you?", "what time do markets open in london?")
+
+
+def script(workload, user, i, unique=True):
+    """``[(message, expects_strategies), ...]`` for one conversation."""
+    sector = SECTORS[(user + i) % len(SECTORS)]
+    tag = f" (case {user}-{i})" if unique else ""       # defeat the strategy cache
+    if workload == "strategy":
+        return [(f"Bullish on {sector}{tag}, give me trading strategies", True)]
+    if workload == "follow_up":
+        return [(f"I'm bullish on {sector}{tag}", False), ("yes please", True)]
+    return [(SMALL_TALK[(user + i) % len(SMALL_TALK)], False)]
+
+
+def bench_env(upstream):
+    """Environment for a backend talking to the fake at *upstream* (base URL)."""
+    state = tempfile.mkdtemp(prefix="tradegpt-bench-")
+    return {
+        "OPENROUTER_API_URL": f"{upstream}/api/v1/chat/completions",
+        "HUGGING_FACE_API_URL": f"{upstream}/models/mistralai/Mixtral-8x7B-Instruct-v0.1",
+        "OPENROUTER_API_KEYS": "bench-key",
+        "HUGGING_FACE_API_TOKENS": "bench-key",
+        # the fake has no quota; keep the client-side limiter out of the measurement
+        "LLM_KEY_RPM": "100000000", "LLM_KEY_BURST": "100000",
+        "STRATEGY_CACHE_PATH": os.path.join(state, "strategy_cache.sqlite3"),
+        "BATCH_DB_PATH": os.path.join(state, "batch.sqlite3"),
+        "SESSION_DB_PATH": os.path.join(state, "sessions.sqlite3"),     # SESSION_BACKEND=sqlite
+        "INTENT_LOG_PATH": "", "INTENT_MODEL_PATH": "", "INTENT_SHADOW_RATE": "0",
+    }
+
+
+def rss_bytes(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+# ── driving load ────────────────────────────────────────────────────────
+async def run_workload(client, workload, users, duration, unique, session_ids):
+    latencies, errors, wrong_branch = [], 0, 0
+    deadline = time.perf_counter() + duration
+
+    async def user(u):
+        nonlocal errors, wrong_branch
+        session_id, i = None, 0
+        while time.perf_counter() < deadline:
+            for message, expects_strategies in script(workload, u, i, unique):
+                body = {"message": message}
+                if session_ids and session_id:
+                    body["session_id"] = session_id
+                start = time.perf_counter()
+                try:
+                    r = await client.post("/chat", json=body)
+                except httpx.HTTPError:
+                    errors += 1
+                    break
+                latencies.append(time.perf_counter() - start)
+                if r.status_code != 200:
+                    errors += 1
+                    break
+                data = r.json()
+                session_id = data.get("session_id", session_id)
+                if bool(data.get("strategies")) != expects_strategies:
+                    wrong_branch += 1
+            i += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(users)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "wrong_branch": wrong_branch,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+async def sample_rss(pid, peak):
+    while True:
+        rss = rss_bytes(pid)
+        if rss:
+            peak[0] = max(peak[0], rss)
+        await asyncio.sleep(0.25)
+
+
+async def drive(client, backend, args, pid="self"):
+    results = {}
+    for workload in BACKEND_WORKLOADS.get(backend, WORKLOADS):
+        if workload not in args.workloads:
+            continue
+        before = rss_bytes(pid)
+        peak = [before or 0]
+        sampler = asyncio.ensure_future(sample_rss(pid, peak))
+        try:
+            row = await run_workload(client, workload, args.users, args.duration, not args.cacheable,
+                                     session_ids=backend == "main_openrouter_history")
+        finally:
+            sampler.cancel()
+        after = rss_bytes(pid)
+        row.update(rss_before=before, rss_after=after, rss_peak=peak[0] or None,
+                   rss_growth=(after - before) if before and after else None)
+        results[workload] = row
+        print(f"  {backend:26s} {workload:10s} {fmt_row(row)}", flush=True)
+    return results
+
+
+# ── modes ───────────────────────────────────────────────────────────────
+async def run_inprocess(args, fake_config):
+    # bench_env() is already applied: utils.* read their settings at import time
+    from fake_openrouter import create_app
+    from utils import llm_client
+
+    llm_client._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(fake_config)),
+                                           timeout=llm_client._timeout(llm_client.READ_TIMEOUT))
+    results = {}
+    for backend in args.backends:
+        try:
+            module = importlib.import_module(backend)
+        except ImportError as e:
+            print(f"  {backend:26s} skipped: {e}", flush=True)
+            results[backend] = {"skipped": str(e)}
+            continue
+        _reset_state()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=module.app),
+                                     base_url="http://backend", timeout=300) as client:
+            results[backend] = await drive(client, backend, args)
+    # background work (summary folds) must finish against the fake, not a real upstream
+    pending = asyncio.all_tasks() - {asyncio.current_task()}
+    if pending:
+        await asyncio.wait(pending, timeout=30)
+    await llm_client.close_client()
+    return results
+
+
+def _reset_state():
+    # every backend starts cold: no cached strategies or intent labels from the previous one
+    from utils.intent_fast import classifier
+    from utils.strategy_cache import strategy_cache
+    strategy_cache.clear()
+    classifier._cache.clear()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _uvicorn(app, app_dir, port, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", app_dir, "--port", str(port),
+         "--log-level", "warning"],
+        env={**os.environ, **env}, cwd=BACKEND_DIR,
+    )
+
+
+async def _wait_ready(url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{url}: server exited with {proc.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url}: not ready after {timeout}s")
+
+
+async def run_uvicorn(args, fake_config):
+    fake_port = _free_port()
+    fake_env = {"FAKE_LATENCY": str(fake_config.latency), "FAKE_SIGMA": str(fake_config.sigma),
+                "FAKE_TTFT": str(fake_config.ttft), "FAKE_429_RATE": str(fake_config.rate_429),
+                "FAKE_5XX_RATE": str(fake_config.rate_5xx), "FAKE_RETRY_AFTER": str(fake_config.retry_after)}
+    if fake_config.seed is not None:
+        fake_env["FAKE_SEED"] = str(fake_config.seed)
+    fake = _uvicorn("fake_openrouter:app", HERE, fake_port, fake_env)
+    results = {}
+    try:
+        await _wait_ready(f"http://127.0.0.1:{fake_port}/stats", fake)
+        for backend in args.backends:
+            port = _free_port()
+            proc = _uvicorn(f"{backend}:app", BACKEND_DIR, port, bench_env(f"http://127.0.0.1:{fake_port}"))
+            try:
+                await _wait_ready(f"http://127.0.0.1:{port}/", proc)
+            except RuntimeError as e:
+                print(f"  {backend:26s} skipped: {e}", flush=True)
+                results[backend] = {"skipped": str(e)}
+                proc.kill()
+                continue
+            try:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300,
+                                             limits=httpx.Limits(max_connections=args.users * 2)) as client:
+                    results[backend] = await drive(client, backend, args, pid=proc.pid)
+            finally:
+                proc.terminate()
+                proc.wait(10)
+    finally:
+        fake.terminate()
+        fake.wait(10)
+    return results
+
+
+# ── reporting ───────────────────────────────────────────────────────────
+def _ms(v):
+    return f"{v * 1e3:8.1f}" if v is not None else "     n/a"
+
+
+def _mb(v):
+    return f"{v / 2**20:+7.1f}" if v is not None else "    n/a"
+
+
+def fmt_row(row):
+    return (f"{row['requests']:6d} req {row['rps']:8.1f} rps  p50 {_ms(row['p50'])} ms  "
+            f"p95 {_ms(row['p95'])} ms  p99 {_ms(row['p99'])} ms  "
+            f"err {row['errors']:4d}  wrong {row['wrong_branch']:4d}  rss {_mb(row['rss_growth'])} MB")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['commit']}):")
+    for backend, workloads in current["results"].items():
+        for workload, row in workloads.items():
+            old = baseline["results"].get(backend, {}).get(workload)
+            if not isinstance(row, dict) or not isinstance(old, dict) or "rps" not in old:
+                continue
+            deltas = []
+            for key in ("rps", "p50", "p95", "p99"):
+                if row.get(key) and old.get(key):
+                    deltas.append(f"{key} {100 * (row[key] / old[key] - 1):+6.1f}%")
+            print(f"  {backend:26s} {workload:10s} " + "  ".join(deltas))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test the backends against a fake OpenRouter.")
+    ap.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    ap.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    ap.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=WORKLOADS)
+    ap.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per workload")
+    ap.add_argument("--cacheable", action="store_true", help="repeat views so the strategy cache can hit")
+    ap.add_argument("--latency", type=float, default=0.5, help="fake upstream median latency (s)")
+    ap.add_argument("--sigma", type=float, default=0.4, help="lognormal spread of the latency")
+    ap.add_argument("--ttft", type=float, default=0.25, help="share of latency before the first token")
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--rate-5xx", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=float, default=0.5)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None, help="result file (default: bench/results/<time>-<commit>.json)")
+    ap.add_argument("--compare", default=None, help="earlier result file to diff against")
+    args = ap.parse_args()
+
+    sys.path.insert(0, HERE)
+    sys.path.insert(0, BACKEND_DIR)
+    if args.mode == "inprocess":
+        os.environ.update(bench_env("http://fake-openrouter"))
+    from fake_openrouter import FakeConfig
+    fake_config = FakeConfig(args.latency, args.sigma, args.ttft, args.rate_429, args.rate_5xx,
+                             args.retry_after, seed=args.seed)
+
+    print(f"{args.mode}: {args.users} users x {args.duration:.0f}s per workload, "
+          f"upstream ~{args.latency}s (sigma {args.sigma}), 429 {args.rate_429:.0%}, 5xx {args.rate_5xx:.0%}")
+    runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+    results = asyncio.run(runner(args, fake_config))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "settings": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "upstream": fake_config.as_dict(),
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {out}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
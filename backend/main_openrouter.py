@@ -1,27 +1,39 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-
-from utils.memory  import memory
-from utils.charts  import generate_plotly_charts
-from utils.parsing import (
-    extract_sector_summary,
-    parse_strategies,
-    build_response_summary,
-)
-from utils.llm_client   import call_openrouter,detect_intent      
-from utils.prompts      import view_follow_up_prompt, strategy_prompt
-
-app = FastAPI()
+from fastapi.responses import StreamingResponse
+
+from utils.api     import ChatMessage, install, router as shared_routes
+from utils.memory  import ConversationMemory
+from utils.metrics import TOO_FEW_STRATEGIES
+from utils.responses import FastJSONResponse
+from utils.charts  import render_charts
+from utils.parsing import build_response_summary
+from utils.providers    import call_llm
+from utils.prompts      import view_follow_up_prompt
+from utils.speculative  import speculate_intent
+from utils.strategy_cache import strategy_cache
+from utils.intent_fast  import classifier as intent_classifier
+from utils.pipeline     import get_strategies, strategy_request
+from utils.streaming    import sse, stream_strategies, stream_reply
+from utils.session_store import session_store_from_env
+
+app = install(FastAPI(default_response_class=FastJSONResponse))
+app.include_router(shared_routes)     # /strategies/batch, /sweep, /risk, /debug/*
 
 STATE_FLAG = "awaiting_strategy_confirmation"   # key in memory
 LAST_VIEW  = "last_view"                        # key in memory
 
-class ChatMessage(BaseModel):
-    message: str
+# one global conversation, kept wherever SESSION_BACKEND says so every worker sees the same flag
+GLOBAL_SESSION = "global"
+conversations  = session_store_from_env(lambda: ConversationMemory(return_messages=True))
 
 # ─────────────────────────────────────────────────────────────────────────
 @app.post("/chat")
 async def chat(chat_message: ChatMessage):
+    async with conversations.session(GLOBAL_SESSION) as (_, memory):
+        # returned as a Response so FastAPI skips jsonable_encoder
+        return FastJSONResponse(await _chat(chat_message, memory))
+
+async def _chat(chat_message: ChatMessage, memory: ConversationMemory):
     user_text = chat_message.message.strip()
     mem       = memory.load_memory_variables({})
 
@@ -29,18 +41,22 @@ async def chat(chat_message: ChatMessage):
     # 1) If the bot previously asked “Do you want strategies?” …
     # ------------------------------------------------------------------ #
     if mem.get(STATE_FLAG):
-        intent = detect_intent(user_text)
+        view   = mem[LAST_VIEW]
+        prompt, fmt = (None, None) if strategy_cache.contains(view) else strategy_request(view)
+        history = mem["chat_history"]
+        intent, spec = await speculate_intent(
+            user_text, {"VIEW_WITH_STRATEGY": prompt, "OTHER": user_text},
+            awaiting_confirmation=True, histories={"OTHER": history},
+            response_formats={"VIEW_WITH_STRATEGY": fmt},
+        )
         if intent == "VIEW_WITH_STRATEGY":             # user said yes or asked for strategies
-            prompt = strategy_prompt(mem[LAST_VIEW])
-            raw    = call_openrouter(prompt)
-
-            sector_summary = extract_sector_summary(raw)
-            strategies     = parse_strategies(raw)
+            sector_summary, strategies = await get_strategies(view, raw=spec, metrics=chat_message.metrics)
             if len(strategies) < 3:
+                TOO_FEW_STRATEGIES.inc(endpoint="/chat")
                 raise HTTPException(500, "LLM returned fewer than 3 strategies.")
 
             summary_md = build_response_summary(strategies)
-            charts     = generate_plotly_charts(strategies)
+            charts     = render_charts(strategies, chat_message.chart_format)
 
             # reset flag
             memory.save_context({}, {STATE_FLAG: False})
@@ -49,36 +65,41 @@ async def chat(chat_message: ChatMessage):
                 "sector_view_summary": sector_summary,
                 "response": summary_md,
                 "strategies": strategies,
-                "charts": {k: f.to_dict() for k, f in charts.items()},
+                "charts": charts,
             }
 
-        # user did NOT confirm → continue normal chat
-        normal_reply = call_openrouter(user_text)
+        # user did NOT confirm → continue normal chat, with the conversation so far
+        normal_reply = spec if spec is not None else await call_llm(user_text, history=history)
         memory.save_context({"input": user_text}, {"output": normal_reply, STATE_FLAG: False})
         return {"response": normal_reply, "strategies": [], "charts": {}}
 
     # ------------------------------------------------------------------ #
     # 2) Fresh message – classify intent
     # ------------------------------------------------------------------ #
-    intent = detect_intent(user_text)
+    prompt, fmt      = (None, None) if strategy_cache.contains(user_text) else strategy_request(user_text)
+    follow_up_prompt = view_follow_up_prompt(user_text)
+    history          = mem["chat_history"]
+    intent, spec     = await speculate_intent(user_text, {
+        "VIEW_WITH_STRATEGY": prompt,
+        "VIEW_NO_STRATEGY":   follow_up_prompt,
+        "OTHER":              user_text,
+    }, histories={"OTHER": history}, response_formats={"VIEW_WITH_STRATEGY": fmt})
 
     if intent == "VIEW_WITH_STRATEGY":
         # user both shares a view and explicitly asks for strategies
-        prompt         = strategy_prompt(user_text)
-        raw            = call_openrouter(prompt)
-        sector_summary = extract_sector_summary(raw)
-        strategies     = parse_strategies(raw)
+        sector_summary, strategies = await get_strategies(user_text, raw=spec, metrics=chat_message.metrics)
         if len(strategies) < 3:
+            TOO_FEW_STRATEGIES.inc(endpoint="/chat")
             raise HTTPException(500, "LLM returned fewer than 3 strategies.")
 
         summary_md = build_response_summary(strategies)
-        charts     = generate_plotly_charts(strategies)
+        charts     = render_charts(strategies, chat_message.chart_format)
 
         return {
             "sector_view_summary": sector_summary,
             "response": summary_md,
             "strategies": strategies,
-            "charts": {k: f.to_dict() for k, f in charts.items()},
+            "charts": charts,
         }
 
     elif intent == "VIEW_NO_STRATEGY":
@@ -87,17 +108,61 @@ async def chat(chat_message: ChatMessage):
             {"input": user_text},
             {LAST_VIEW: user_text, STATE_FLAG: True}
         )
-        follow_up_prompt = view_follow_up_prompt(user_text)
-        bot_reply        = call_openrouter(follow_up_prompt)
+        bot_reply        = spec if spec is not None else await call_llm(follow_up_prompt)
         return {"response": bot_reply, "strategies": [], "charts": {}}
 
     else:
         # simple conversation
-        normal_reply = call_openrouter(user_text)
+        normal_reply = spec if spec is not None else await call_llm(user_text, history=history)
         memory.save_context({"input": user_text}, {"output": normal_reply})
         return {"response": normal_reply, "strategies": [], "charts": {}}
 
-# -----------------------------------------------------------------------
+# ─────────────────────────────────────────────────────────────────────────
+@app.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage):
+    """Same flow as /chat, streamed as Server-Sent Events."""
+    user_text = chat_message.message.strip()
+    _, memory = await conversations.load(GLOBAL_SESSION)
+    mem       = memory.load_memory_variables({})
+    awaiting  = bool(mem.get(STATE_FLAG))
+    intent    = await intent_classifier.classify(user_text, awaiting_confirmation=awaiting)
+
+    async def events():
+        try:
+            if intent == "VIEW_WITH_STRATEGY":
+                view = mem[LAST_VIEW] if awaiting else user_text
+                ok   = False
+                async for event, data in stream_strategies(view, chat_message.chart_format):
+                    ok = ok or event == "charts"
+                    yield sse(event, data)
+                if ok and awaiting:
+                    memory.save_context({}, {STATE_FLAG: False})
+
+            elif intent == "VIEW_NO_STRATEGY" and not awaiting:
+                memory.save_context(
+                    {"input": user_text},
+                    {LAST_VIEW: user_text, STATE_FLAG: True}
+                )
+                async for event, data in stream_reply(view_follow_up_prompt(user_text)):
+                    yield sse(event, data)
+
+            else:
+                reply = ""
+                async for event, data in stream_reply(user_text, mem["chat_history"]):
+                    reply += data
+                    yield sse(event, data)
+                outputs = {"output": reply}
+                if awaiting:
+                    outputs[STATE_FLAG] = False
+                memory.save_context({"input": user_text}, outputs)
+            await conversations.save(GLOBAL_SESSION, memory)
+        except Exception as e:
+            yield sse("error", str(e))
+        yield sse("done", {"intent": intent})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/")
 def read_root():
     return {"message": "Trading Chatbot Backend (Intent-aware)"}
@@ -1,12 +1,15 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 # from utils.config import OPENROUTER_API_KEY, OPENROUTER_MODEL
-from utils.memory import memory
-from utils.charts import generate_plotly_charts
+from utils.api import install
+from utils.memory import memory, format_history
+from utils.responses import FastJSONResponse
+from utils.charts import render_charts
 from utils.parsing import extract_sector_summary, parse_strategies, build_response_summary
-from utils.llm_client import call_openrouter
+from utils.providers import call_llm
+from utils.scheduler import LLMUnavailable
 
-app = FastAPI()
+app = install(FastAPI(default_response_class=FastJSONResponse))
 
 class ChatMessage(BaseModel):
     message: str
@@ -14,7 +17,7 @@ class ChatMessage(BaseModel):
 @app.post("/chat")
 async def chat(chat_message: ChatMessage):
     context = memory.load_memory_variables({})
-    combined_prompt = f"{context['history']}\nUser: {chat_message.message}"
+    combined_prompt = f"{format_history(context[memory.memory_key])}\nUser: {chat_message.message}"
 
     prompt = f"""
 You are a highly knowledgeable trading assistant. A user has a market view or belief as follows:
@@ -63,18 +66,20 @@ Each strategy should be:
 Only return the 3+ structured strategy blocks. Avoid summaries, disclaimers, or repetition.
 """
     try:
-        raw_text = call_openrouter(prompt)
+        raw_text = await call_llm(prompt)
         sector_summary = extract_sector_summary(raw_text)
         strategies = parse_strategies(raw_text)
         response_summary = build_response_summary(strategies)
         memory.save_context({"input": chat_message.message}, {"output": response_summary})
-        charts = generate_plotly_charts(strategies)
-        return {
+        charts = render_charts(strategies)
+        return FastJSONResponse({
             "response": response_summary.strip(),
             "strategies": strategies,
-            "charts": {k: fig.to_dict() for k, fig in charts.items()},
+            "charts": charts,
             "sector_view_summary": sector_summary
-        }
+        })
+    except LLMUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
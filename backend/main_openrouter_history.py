@@ -1,61 +1,57 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from uuid import uuid4
-from langchain.memory import ConversationBufferMemory
-from utils.charts import generate_plotly_charts
-from utils.parsing import (
-    extract_sector_summary,
-    parse_strategies,
-    build_response_summary,
-)
-from utils.llm_client import call_openrouter, detect_intent
-from utils.prompts import view_follow_up_prompt, strategy_prompt
-
-app = FastAPI()
-session_states = {}
-
-class SessionState:
-    def __init__(self):
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            input_key="input",
-            output_key="output",
-            return_messages=True
-        )
-        self.last_view = ""
-        self.awaiting_confirmation = False
+from fastapi.responses import StreamingResponse
+from utils import api
+from utils.api import install, router as shared_routes
+from utils.charts import render_charts
+from utils.metrics import TOO_FEW_STRATEGIES
+from utils.responses import FastJSONResponse
+from utils.parsing import build_response_summary
+from utils.providers import call_llm
+from utils.prompts import view_follow_up_prompt
+from utils.speculative import speculate_intent
+from utils.strategy_cache import strategy_cache
+from utils.intent_fast import classifier as intent_classifier
+from utils.pipeline import get_strategies, strategy_request
+from utils.streaming import sse, stream_strategies, stream_reply
+from utils.session_store import session_store_from_env
+
+app = install(FastAPI(default_response_class=FastJSONResponse))
+app.include_router(shared_routes)     # /strategies/batch, /sweep, /risk, /debug/*
+
+# SESSION_BACKEND: in-process LRU (default), or SQLite / Redis shared by every worker
+sessions = session_store_from_env()
 
-class ChatMessage(BaseModel):
-    message: str
+class ChatMessage(api.ChatMessage):
     session_id: str = None  # Add session ID in request
 
 @app.post("/chat")
 async def chat(chat_message: ChatMessage):
+    # Get or create session; saved back (shared backends) once the reply is ready
+    async with sessions.session(chat_message.session_id) as (session_id, state):
+        # returned as a Response so FastAPI skips jsonable_encoder
+        return FastJSONResponse(await _chat(chat_message, session_id, state))
+
+async def _chat(chat_message: ChatMessage, session_id: str, state):
     user_text = chat_message.message.strip()
-    
-    # Get or create session
-    session_id = chat_message.session_id or str(uuid4())
-    if session_id not in session_states:
-        session_states[session_id] = SessionState()
-    
-    state = session_states[session_id]
-    mem = state.memory.load_memory_variables({})
 
     # 1) Handle strategy confirmation flow
     if state.awaiting_confirmation:
-        intent = detect_intent(user_text)
+        view = state.last_view
+        prompt, fmt = (None, None) if strategy_cache.contains(view) else strategy_request(view)
+        history = state.memory.history()
+        intent, spec = await speculate_intent(
+            user_text, {"VIEW_WITH_STRATEGY": prompt, "OTHER": user_text},
+            awaiting_confirmation=True, histories={"OTHER": history},
+            response_formats={"VIEW_WITH_STRATEGY": fmt},
+        )
         if intent == "VIEW_WITH_STRATEGY":
-            prompt = strategy_prompt(state.last_view)
-            raw = call_openrouter(prompt)
-            
-            sector_summary = extract_sector_summary(raw)
-            strategies = parse_strategies(raw)
+            sector_summary, strategies = await get_strategies(view, raw=spec, metrics=chat_message.metrics)
             if len(strategies) < 3:
+                TOO_FEW_STRATEGIES.inc(endpoint="/chat")
                 raise HTTPException(500, "LLM returned fewer than 3 strategies.")
 
             summary_md = build_response_summary(strategies)
-            charts = generate_plotly_charts(strategies)
-            charts_dict = {k: v.to_dict() for k, v in charts.items()}  # Fixed variable name
+            charts_dict = render_charts(strategies, chat_message.chart_format)
             
             # Reset flag and save context
             state.awaiting_confirmation = False
@@ -72,8 +68,8 @@ async def chat(chat_message: ChatMessage):
                 "charts": charts_dict  # Use correct variable
             }
 
-        # Handle non-confirmation
-        normal_reply = call_openrouter(user_text)
+        # Handle non-confirmation: plain chat with the conversation so far
+        normal_reply = spec if spec is not None else await call_llm(user_text, history=history)
         state.memory.save_context(
             {"input": user_text}, 
             {"output": normal_reply}
@@ -87,19 +83,23 @@ async def chat(chat_message: ChatMessage):
         }
 
     # 2) Handle fresh messages
-    intent = detect_intent(user_text)
+    prompt, fmt = (None, None) if strategy_cache.contains(user_text) else strategy_request(user_text)
+    follow_up_prompt = view_follow_up_prompt(user_text)
+    history = state.memory.history()
+    intent, spec = await speculate_intent(user_text, {
+        "VIEW_WITH_STRATEGY": prompt,
+        "VIEW_NO_STRATEGY": follow_up_prompt,
+        "OTHER": user_text,
+    }, histories={"OTHER": history}, response_formats={"VIEW_WITH_STRATEGY": fmt})
     
     if intent == "VIEW_WITH_STRATEGY":
-        prompt = strategy_prompt(user_text)
-        raw = call_openrouter(prompt)
-        sector_summary = extract_sector_summary(raw)
-        strategies = parse_strategies(raw)
+        sector_summary, strategies = await get_strategies(user_text, raw=spec, metrics=chat_message.metrics)
         if len(strategies) < 3:
+            TOO_FEW_STRATEGIES.inc(endpoint="/chat")
             raise HTTPException(500, "LLM returned fewer than 3 strategies.")
 
         summary_md = build_response_summary(strategies)
-        charts = generate_plotly_charts(strategies)
-        charts_dict = {k: v.to_dict() for k, v in charts.items()}
+        charts_dict = render_charts(strategies, chat_message.chart_format)
 
         state.memory.save_context(
             {"input": user_text},
@@ -116,7 +116,7 @@ async def chat(chat_message: ChatMessage):
     elif intent == "VIEW_NO_STRATEGY":
         state.last_view = user_text
         state.awaiting_confirmation = True
-        follow_up = call_openrouter(view_follow_up_prompt(user_text))
+        follow_up = spec if spec is not None else await call_llm(follow_up_prompt)
         
         state.memory.save_context(
             {"input": user_text},
@@ -131,7 +131,7 @@ async def chat(chat_message: ChatMessage):
         }
     else:
         # Simple conversation
-        normal_reply = call_openrouter(user_text)
+        normal_reply = spec if spec is not None else await call_llm(user_text, history=history)
         state.memory.save_context(  # Use session memory instead of global
             {"input": user_text},
             {"output": normal_reply}
@@ -143,6 +143,60 @@ async def chat(chat_message: ChatMessage):
             "charts": {}
         }
 
+@app.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage):
+    """Same flow as /chat, streamed as Server-Sent Events."""
+    user_text = chat_message.message.strip()
+
+    session_id, state = await sessions.load(chat_message.session_id)
+
+    awaiting = state.awaiting_confirmation
+    intent = await intent_classifier.classify(user_text, awaiting_confirmation=awaiting)
+
+    async def events():
+        yield sse("session", {"session_id": session_id})
+        try:
+            if intent == "VIEW_WITH_STRATEGY":
+                view = state.last_view if awaiting else user_text
+                ok = False
+                async for event, data in stream_strategies(view, chat_message.chart_format):
+                    ok = ok or event == "charts"
+                    yield sse(event, data)
+                if ok:
+                    state.awaiting_confirmation = False
+                    state.memory.save_context(
+                        {"input": user_text},
+                        {"output": "Generated trading strategies" if awaiting else "Provided strategies"}
+                    )
+
+            elif intent == "VIEW_NO_STRATEGY" and not awaiting:
+                state.last_view = user_text
+                state.awaiting_confirmation = True
+                follow_up = ""
+                async for event, data in stream_reply(view_follow_up_prompt(user_text)):
+                    follow_up += data
+                    yield sse(event, data)
+                state.memory.save_context({"input": user_text}, {"output": follow_up})
+
+            else:
+                normal_reply = ""
+                async for event, data in stream_reply(user_text, state.memory.history()):
+                    normal_reply += data
+                    yield sse(event, data)
+                state.memory.save_context({"input": user_text}, {"output": normal_reply})
+                state.awaiting_confirmation = False
+            await sessions.save(session_id, state)
+        except Exception as e:
+            yield sse("error", str(e))
+        yield sse("done", {"intent": intent})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/debug/sessions")
+def session_stats():
+    return sessions.stats()
+
 @app.get("/")
 def read_root():
     return {"message": "Trading Chatbot Backend (Session-aware)"}
\ No newline at end of file
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def synthetic_bars(n=600, seed=0, drift=0.0003, vol=0.012, start="2018-01-01"):
+    """Deterministic random-walk daily ``Bars`` (imported lazily: numpy is optional for other tests)."""
+    import numpy as np
+
+    from utils.marketdata import Bars
+
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(drift, vol, n)))
+    spread = close * rng.uniform(0.002, 0.01, n)
+    dates = np.datetime64(start, "D") + np.arange(n)
+    return Bars(dates, close, close + spread, close - spread, close, np.full(n, 1e6))
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A market data store with SPY and three synthetic tickers."""
+    from utils.marketdata import MarketDataStore
+
+    path = str(tmp_path / "store")
+    s = MarketDataStore(path)
+    for i, ticker in enumerate(("SPY", "AAA", "BBB", "CCC")):
+        s.append(ticker, synthetic_bars(seed=i, drift=0.0002 * (i - 1)))
+    return path
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from utils import backtest as bt
+from utils.marketdata import Bars
+
+
+def bars(close, high=None, low=None, start="2020-01-01"):
+    close = np.asarray(close, dtype=np.float64)
+    high = close if high is None else np.asarray(high, dtype=np.float64)
+    low = close if low is None else np.asarray(low, dtype=np.float64)
+    dates = np.datetime64(start, "D") + np.arange(len(close))
+    return Bars(dates, close, high, low, close, np.ones(len(close)))
+
+
+def test_momentum_follows_the_sign_of_the_lookback_return():
+    b = bars([100, 101, 102, 103, 102, 101, 100])
+    position, asset = bt.momentum(b, lookback=2)
+    assert position.tolist() == [0, 0, 1, 1, 0, 0, 0]
+    position, _ = bt.momentum(b, lookback=2, long_only=False)
+    assert position.tolist() == [0, 0, 1, 1, 0, -1, -1]
+    assert asset[0] == 0 and asset[3] == pytest.approx(103 / 102 - 1)
+
+
+def test_mean_reversion_buys_oversold_and_holds_until_exit():
+    # RSI(2): 0 while falling, 50 on the first up bar (between lower and exit: hold), then 100
+    position, _ = bt.mean_reversion(bars([100, 99, 98, 97, 98, 99, 100]), period=2, lower=30, exit=55)
+    assert position.tolist() == [0, 1, 1, 1, 1, 0, 0]
+
+
+def test_breakout_enters_above_the_prior_high_and_exits_below_the_prior_low():
+    position, _ = bt.breakout(bars([10, 10, 10, 11, 12, 11, 9, 9]), entry=3, exit=2)
+    assert position.tolist() == [0, 0, 0, 1, 1, 1, 0, 0]
+
+
+def test_pairs_fades_the_spread_on_common_dates():
+    a = bars([100, 101, 100, 101, 100, 110, 104, 100, 101, 100, 90, 96, 100])
+    benchmark = bars([100] * 14, start="2019-12-31")      # one extra leading day
+    position, asset = bt.pairs(a, benchmark, window=3, entry=1.2, exit=0.5)
+    assert position.tolist() == [0, 0, 0, 0, 0, -1, 0, 0, 0, 0, 1, 0, 0]
+    assert asset[5] == pytest.approx(0.1)
+    with pytest.raises(ValueError):
+        bt.pairs(a)
+
+
+def test_covered_call_caps_the_stock_at_the_strike():
+    # too short for realised vol, so no premium: the return is the capped stock's
+    position, returns = bt.covered_call(bars([100, 100, 120, 120, 120, 120, 130]), days=5, otm=0.05)
+    assert position.tolist() == [1] * 7
+    assert returns == pytest.approx([0, 0, 0.05, 0, 0, 0, 0.05])    # rolled at bar 5: strike 126
+
+
+def test_covered_call_premium_is_credited_the_bar_after_each_sale():
+    from conftest import synthetic_bars
+
+    b = synthetic_bars(n=100)
+    _, returns = bt.covered_call(b, days=21, otm=0.05)
+    _, uncovered = bt.covered_call(b, days=21, otm=0.05, vol_window=len(b.close) + 1)   # no vol: no premium
+    credit = returns - uncovered
+    # bar 0 has no realised vol yet; later sales at 21, 42, ...
+    assert np.flatnonzero(credit).tolist() == [22, 43, 64, 85]
+    assert ((credit[credit != 0] > 0) & (credit[credit != 0] < 0.05)).all()
+
+
+def test_run_holds_the_previous_position_and_charges_costs():
+    b = bars([100, 101, 102, 103, 102, 101, 100])
+    returns, held = bt.run("momentum", b, {"lookback": 2}, cost_bps=10)
+    assert held.tolist() == [0, 0, 0, 1, 1, 0, 0]
+    assert returns == pytest.approx([0, 0, 0, 103 / 102 - 1 - 0.001, 102 / 103 - 1, -0.001, 0])
+
+
+def test_trade_returns_compound_each_run_of_constant_position():
+    held = np.array([1, 1, -1, 0, 1.0])
+    returns = np.array([0.1, 0.1, -0.1, 0.0, 0.2])
+    assert bt.trade_returns(returns, held) == pytest.approx([0.21, -0.1, 0.2])
+    assert len(bt.trade_returns(returns, np.zeros(5))) == 0
+
+
+def test_compute_metrics_of_one_known_trade():
+    m = bt.compute_metrics(np.array([0, 0.1, -0.05, 0]), np.array([0, 1, 1, 0.0]))
+    assert m["win_rate"] == 100.0
+    assert m["expectancy"] == 4.5
+    assert m["profit_factor"] is None
+    assert m["max_drawdown"] == -5.0
+    assert m["trade_frequency"] == 5.25
+    assert bt.compute_metrics(np.array([0.01]), np.array([1.0])) == dict.fromkeys(bt.BACKTEST_FIELDS)
+
+
+def test_check_params_names_the_accepted_parameters():
+    bt.check_params("breakout", {"entry": 20, "exit": 10})
+    with pytest.raises(ValueError, match="accepted: window, entry, exit"):
+        bt.check_params("pairs", ["lookback"])
+    with pytest.raises(ValueError, match="unknown template"):
+        bt.check_params("martingale", [])
+
+
+def test_backtest_tickers_same_result_in_one_or_many_processes(store):
+    tickers = ["AAA", "BBB", "CCC", "MISSING"]
+    serial = bt.backtest_tickers("momentum", tickers, {"lookback": 20}, processes=1, data_dir=store)
+    assert serial["MISSING"] is None and all(serial[t] for t in tickers[:3])
+    assert bt.backtest_tickers("momentum", tickers, {"lookback": 20}, processes=2, data_dir=store) == serial
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from utils import batch
+from utils.batch import BatchStore, run_batch
+
+VIEWS = [f"view {i}" for i in range(6)]
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    calls = []
+
+    async def fake_get_strategies(view, priority):
+        calls.append(view)
+        await asyncio.sleep(0.01 * (int(view.split()[1]) + 1))
+        return f"summary of {view}", [{"name": f"{view} {i}"} for i in range(3)]
+
+    monkeypatch.setattr(batch, "get_strategies", fake_get_strategies)
+    return calls
+
+
+async def _collect(views, store, job_id, stop_after=None, concurrency=2):
+    results = []
+    gen = run_batch(views, concurrency, job_id, store)
+    try:
+        async for result in gen:
+            results.append(result)
+            if stop_after is not None and len(results) == stop_after:
+                break
+    finally:
+        await gen.aclose()
+    return results
+
+
+def test_interrupted_batch_resumes_without_repeating_finished_views(generated, tmp_path):
+    store = BatchStore(str(tmp_path / "jobs.sqlite3"))
+    first = asyncio.run(_collect(VIEWS, store, "job", stop_after=2))
+    finished = {r["view"] for r in first}
+    assert len(finished) == 2
+    started = len(generated)
+
+    generated.clear()
+    second = asyncio.run(_collect(VIEWS, store, "job"))
+    assert sorted(r["index"] for r in second) == list(range(len(VIEWS)))
+    assert {r["view"] for r in second if r.get("resumed")} == finished
+    assert finished.isdisjoint(generated)
+    assert sorted(generated) == sorted(set(VIEWS) - finished)
+    assert started <= 4      # at most *concurrency* views were in flight when we stopped
+    assert all(r["status"] == "ok" for r in second)
+
+
+def test_stopping_early_waits_for_cancelled_workers(generated, tmp_path):
+    store = BatchStore(str(tmp_path / "jobs.sqlite3"))
+
+    async def stop_then_check():
+        await _collect(VIEWS, store, "job", stop_after=1)
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    assert asyncio.run(stop_then_check()) == []
+    assert len(store.done("job")) == 1
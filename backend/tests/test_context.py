@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from utils import context
+from utils.context import ConversationContext, estimate_tokens
+
+
+def words(n, tag):
+    return f"{tag} " + "x" * (4 * n - len(tag) - 5)     # ~n tokens
+
+
+def test_history_keeps_the_newest_turns_within_the_budget():
+    ctx = ConversationContext(budget=100)
+    for i in range(6):
+        ctx._append("user", words(30, f"m{i}"))
+    history = ctx.history()
+    assert [m["content"][:2] for m in history] == ["m3", "m4", "m5"]
+    assert sum(estimate_tokens(m["content"]) for m in history) <= 100
+    assert len(ctx.history(budget=1000)) == 6
+
+
+def test_summary_counts_against_the_budget_and_comes_first():
+    ctx = ConversationContext(budget=100)
+    ctx.load_dict({"summary": words(40, "sum"), "turns": [("user", words(30, f"m{i}"), 30) for i in range(4)]})
+    history = ctx.history()
+    assert history[0]["role"] == "system" and "sum" in history[0]["content"]
+    assert [m["content"][:2] for m in history[1:]] == ["m2", "m3"]
+
+
+def test_hard_cap_on_unsummarised_turns():
+    ctx = ConversationContext(max_turns=4)
+    for i in range(10):
+        ctx._append("user", f"m{i}")
+    assert [t.content for t in ctx.turns] == ["m6", "m7", "m8", "m9"]
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    prompts = []
+
+    async def fake_call_llm(prompt, **kwargs):
+        prompts.append(prompt)
+        return " rolled-up summary "
+
+    monkeypatch.setattr(context, "CONTEXT_SUMMARIZE", True)
+    monkeypatch.setattr(context, "CONTEXT_SUMMARIZE_AFTER", 50)
+    monkeypatch.setattr(context, "call_llm", fake_call_llm)
+    return prompts
+
+
+def test_out_of_window_turns_fold_into_the_summary(summarizer):
+    ctx = ConversationContext(budget=100)
+    folds = []
+    ctx.on_fold = folds.append
+
+    async def main():
+        for i in range(6):
+            ctx.add("user", words(30, f"m{i}"))
+            if ctx._fold is not None:
+                await ctx._fold
+
+    asyncio.run(main())
+    assert ctx.summary == "rolled-up summary"
+    assert len(summarizer) == 1 and "m0" in summarizer[0] and "m1" in summarizer[0]
+    assert [t.content[:2] for t in ctx.turns] == ["m2", "m3", "m4", "m5"]
+    assert folds and folds[0][0] == "fold"
+
+
+def test_a_failed_fold_keeps_the_turns(summarizer, monkeypatch):
+    async def failing(prompt, **kwargs):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(context, "call_llm", failing)
+    ctx = ConversationContext(budget=100)
+
+    async def main():
+        for i in range(5):
+            ctx.add("user", words(30, f"m{i}"))
+        await ctx._fold
+
+    asyncio.run(main())
+    assert ctx.summary == "" and ctx._fold is None and len(ctx.turns) == 5
+
+
+def test_a_fold_based_on_an_old_summary_is_dropped():
+    ctx = ConversationContext()
+    ctx.load_dict({"summary": "newer", "turns": [("user", "a", 1), ("user", "b", 1)]})
+    ctx.apply(("fold", "", "stale", [("user", "a")]))
+    assert ctx.summary == "newer" and len(ctx.turns) == 2
+    ctx.apply(("fold", "newer", "newest", [("user", "a")]))
+    assert ctx.summary == "newest" and [t.content for t in ctx.turns] == ["b"]
@@ -0,0 +1,72 @@
+import pytest
+
+from utils.intent_fast import _rules
+
+
+@pytest.mark.parametrize("text", [
+    "I'm bullish on NVDA, what strategies would you suggest?",
+    "bearish on $tsla -- any trade ideas?",
+    "I expect energy stocks to rise, give me a strategy",
+])
+def test_directional_view_on_ticker_or_sector_wants_strategies(text):
+    assert _rules(text, False) == "VIEW_WITH_STRATEGY"
+
+
+@pytest.mark.parametrize("text", [
+    "what strategies work when the market is closed?",
+    "explain long and short trades",
+    "how do rates affect stocks? any strategy?",
+    "I'm bullish, what strategies?",
+    "I'm bullish on AI, what strategies?",
+    "bearish on US CEO pay, any trades?",
+])
+def test_generic_words_go_to_the_next_tier(text):
+    assert _rules(text, False) is None
+
+
+@pytest.mark.parametrize("text, label", [
+    ("yes", "VIEW_WITH_STRATEGY"),
+    ("Sure, go ahead!", "VIEW_WITH_STRATEGY"),
+    ("no thanks", "OTHER"),
+    ("ok", None),
+    ("please explain what a covered call is", None),
+    ("yes but what about the strategies' risk?", None),
+])
+def test_confirmation_only_on_short_affirmatives(text, label):
+    assert _rules(text, True) == label
+
+
+def test_an_upper_case_word_counts_only_if_it_is_a_known_ticker(store, monkeypatch):
+    from utils import marketdata
+
+    text = "bullish on BBB, what strategies?"
+    assert _rules(text, False) is None
+    monkeypatch.setattr(marketdata, "MARKET_DATA_DIR", store)      # BBB has local data there
+    assert _rules(text, False) == "VIEW_WITH_STRATEGY"
+
+
+def test_llm_labels_are_logged_off_the_event_loop(tmp_path):
+    import asyncio
+    import json
+    import threading
+
+    from utils.intent_fast import TieredIntentClassifier
+
+    path = tmp_path / "intent_log.jsonl"
+    classifier = TieredIntentClassifier(log_path=str(path), shadow_rate=0)
+    threads = []
+    write = classifier._write_log
+    classifier._write_log = lambda lines: threads.append(threading.get_ident()) or write(lines)
+
+    async def main():
+        for i in range(50):
+            classifier._log(f"message {i}", False, "OTHER")
+            if i % 10 == 0:
+                await asyncio.sleep(0.001)
+        await classifier.flush()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert threads and loop_thread not in threads and len(threads) < 50      # batched
+    assert [json.loads(line)["text"] for line in path.read_text().splitlines()] == \
+        [f"message {i}" for i in range(50)]
@@ -0,0 +1,40 @@
+import numpy as np
+
+from utils.marketdata import MarketDataStore
+
+
+def write_csv(path, rows):
+    with open(path, "w") as f:
+        f.write("Date,Open,High,Low,Close,Volume\n")
+        for date, close in rows:
+            f.write(f"{date},{close},{close + 1},{close - 1},{close},1000\n")
+    return str(path)
+
+
+def test_ingest_two_files_of_one_ticker_in_one_call(tmp_path):
+    first = write_csv(tmp_path / "a.csv", [("2024-01-02", 10.0), ("2024-01-03", 11.0)])
+    second = write_csv(tmp_path / "b.csv", [("2024-01-03", 12.0), ("2024-01-04", 13.0)])
+    store = MarketDataStore(str(tmp_path / "store"))
+
+    added = store.ingest(first, second, ticker="abc")
+
+    assert added == {"ABC": 3}
+    bars = MarketDataStore(str(tmp_path / "store")).bars("ABC")
+    assert bars.dates.astype(str).tolist() == ["2024-01-02", "2024-01-03", "2024-01-04"]
+    assert bars.close.tolist() == [10.0, 12.0, 13.0]      # the later file wins a date
+
+
+def test_ingest_grows_a_ticker_past_its_capacity(tmp_path):
+    days = np.datetime64("2020-01-01") + np.arange(400)
+    store = MarketDataStore(str(tmp_path / "store"))
+    store.ingest(write_csv(tmp_path / "a.csv", [(d, 1.0) for d in days[:10]]), ticker="A")
+    store.ingest(write_csv(tmp_path / "b.csv", [(d, 2.0) for d in days[:5]]), ticker="B")
+
+    parts = [write_csv(tmp_path / f"a{i}.csv", [(d, 3.0 + i) for d in days[10 + 100 * i:110 + 100 * i]])
+             for i in range(3)]
+    store.ingest(*parts, ticker="A")
+
+    a, b = store.bars("A"), store.bars("B")
+    assert len(a.close) == 310 and np.all(np.diff(a.dates.astype(np.int64)) == 1)
+    assert a.close[:10].tolist() == [1.0] * 10 and a.close[-1] == 5.0
+    assert b.close.tolist() == [2.0] * 5
@@ -0,0 +1,57 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from utils import montecarlo as mc
+
+
+def returns(n=500, seed=0):
+    return np.random.default_rng(seed).normal(0.0004, 0.012, n)
+
+
+def peak_mb(fn):
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def test_same_seed_same_numbers_and_bounded_memory_for_any_chunk_size(monkeypatch):
+    results = {}
+    for chunk_mb in (0.5, 4, 64):
+        monkeypatch.setattr(mc, "MC_CHUNK_MB", chunk_mb)
+        results[chunk_mb] = peak_mb(lambda: mc.simulate(returns(), paths=60_000, horizon=252, seed=3))
+    (small, small_peak), (_, mid_peak), (big, _) = results[0.5], results[4], results[64]
+    for key in ("var", "cvar", "max_drawdown", "fan", "distributions", "expected_return", "prob_loss"):
+        assert small[key] == big[key]
+    # a 1024-path chunk is ~4 MB; a fan over every path alone would be 60k x 64 points x 4 bytes = 15 MB
+    assert small_peak < 16 and mid_peak < 16
+
+
+def test_fan_memory_does_not_grow_with_paths(monkeypatch):
+    monkeypatch.setattr(mc, "MC_CHUNK_MB", 1)
+    _, few = peak_mb(lambda: mc.simulate(returns(), paths=20_000, horizon=252))
+    _, many = peak_mb(lambda: mc.simulate(returns(), paths=120_000, horizon=252))
+    # per-path state is 16 bytes (final, drawdown) plus percentile scratch, not 4 bytes x fan points
+    assert many - few < 100_000 * 64 * 4 / 2 ** 20 / 2
+
+
+def test_var_and_cvar_are_ordered():
+    result = mc.simulate(returns(), paths=5_000, horizon=21, seed=1)
+    assert result["cvar"]["95"] <= result["var"]["95"] and result["cvar"]["99"] <= result["var"]["99"]
+    assert result["var"]["99"] <= result["var"]["95"]
+
+
+@pytest.mark.parametrize("kwargs", [{"paths": 0}, {"paths": mc.MC_MAX_PATHS + 1},
+                                    {"horizon": mc.MC_MAX_HORIZON + 1}, {"block": 501}])
+def test_out_of_range_requests_are_value_errors(kwargs):
+    with pytest.raises(ValueError):
+        mc.simulate(returns(), **kwargs)
+
+
+def test_unknown_strategy_parameter_is_a_value_error(store):
+    with pytest.raises(ValueError, match="accepted: period, lower, exit"):
+        mc.risk(template="mean_reversion", tickers=["AAA"], params={"perod": 10}, data_dir=store, paths=100)
@@ -0,0 +1,94 @@
+import glob
+import json
+import os
+import random
+
+import pytest
+
+from utils.parsing import (IncrementalStrategyParser, extract_sector_summary, parse_metrics_json,
+                           parse_strategies, parse_strategies_json)
+
+CORPUS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "bench", "parser_corpus", "*.md")))
+
+
+def chunkings(text):
+    for size in (1, 2, 3, 5, 17, 64, len(text)):
+        yield [text[i:i + size] for i in range(0, len(text), size)]
+    rng = random.Random(0)
+    for _ in range(5):
+        cuts = sorted(rng.sample(range(1, len(text)), 20))
+        yield [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize("path", CORPUS, ids=os.path.basename)
+def test_any_chunking_parses_like_the_whole_text(path):
+    with open(path) as f:
+        text = f.read()
+    for chunks in chunkings(text):
+        parser = IncrementalStrategyParser()
+        events = [e for chunk in chunks for e in parser.feed(chunk)] + parser.close()
+        assert parser.strategies == parse_strategies(text)
+        assert [d for e, d in events if e == "strategy"] == parser.strategies
+        assert [d for e, d in events if e == "sector_summary"] == [extract_sector_summary(text)]
+        assert parser.text == text
+
+
+def test_summary_is_emitted_once_its_separator_arrives():
+    parser = IncrementalStrategyParser()
+    assert parser.feed("**1. Sector & View ") == []
+    assert parser.feed("Summary:**\nTelecom looks strong.\n") == []
+    assert parser.feed("--") == []
+    assert parser.feed("-\n") == [("sector_summary", "Telecom looks strong.")]
+    assert parser.feed("more text\n---\n") == []
+
+
+# ── JSON mode ────────────────────────────────────────────────────────────
+def strategy_json(n=3, **overrides):
+    item = {"name": "Momentum", "explanation": "Buy strength.", "popularity": 30, "avg_return": 8.5,
+            "sharpe_ratio": 1.2, "win_rate": 55, "max_drawdown": -12, "profit_factor": 1.6,
+            "volatility": 18, "expectancy": 0.4, "trade_frequency": 3}
+    item.update(overrides)
+    strategies = [dict(item, name=f"{item['name']} {i}") for i in range(n)]
+    return json.dumps({"sector_view_summary": "Telecom looks strong.", "strategies": strategies})
+
+
+def test_json_answer():
+    summary, strategies = parse_strategies_json(strategy_json())
+    assert summary == "Telecom looks strong." and len(strategies) == 3
+    assert strategies[0]["max_drawdown"] == -12.0 and strategies[0]["missing_fields"] == []
+
+
+def test_json_inside_code_fences_and_prose():
+    fenced = "Here you go:\n```json\n" + strategy_json() + "\n```\nGood luck!"
+    assert parse_strategies_json(fenced) == parse_strategies_json(strategy_json())
+
+
+def test_missing_metrics_are_none_and_listed():
+    raw = json.loads(strategy_json(1))
+    item = raw["strategies"][0]
+    del item["popularity"]
+    item["sharpe_ratio"] = None
+    item["Win Rate"] = item.pop("win_rate")      # alternative spelling still maps
+    item["avg_return"] = "about 7.5%"
+    _, [s] = parse_strategies_json(json.dumps(raw))
+    assert s["popularity"] is None and s["sharpe_ratio"] is None
+    assert s["missing_fields"] == ["popularity", "sharpe_ratio"]
+    assert s["win_rate"] == 55.0 and s["avg_return"] == 7.5
+
+
+@pytest.mark.parametrize("raw", ['{"sector_view_summary": "x", "strategies": [', "no json here", '{"foo": 1}'])
+def test_malformed_json_falls_back_to_the_markdown_parser(raw, monkeypatch):
+    from utils import pipeline
+
+    monkeypatch.setattr(pipeline, "STRATEGY_OUTPUT", "json")
+    with open(CORPUS[0]) as f:
+        markdown = f.read()
+    assert parse_strategies_json(raw) is None
+    assert pipeline.parse_answer(raw + "\n" + markdown) == (extract_sector_summary(markdown),
+                                                            parse_strategies(markdown))
+
+
+def test_metrics_json():
+    raw = '```json\n{"Momentum": {"Sharpe Ratio": "1.4", "winRate": 52, "bogus": 1}, "Broken": 3}\n```'
+    assert parse_metrics_json(raw) == {"Momentum": {"sharpe_ratio": 1.4, "win_rate": 52.0}}
+    assert parse_metrics_json("{not json") == {}
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+from utils import repair
+from utils.parsing import parse_strategies
+from utils.providers import FAKE_STRATEGY_ANSWER, FakeProvider
+
+
+def strategies(n=1, missing=()):
+    out = []
+    for s in parse_strategies(FAKE_STRATEGY_ANSWER)[:n]:
+        s = dict(s, name=s["name"] + " (original)", **dict.fromkeys(missing))
+        s["missing_fields"] = list(missing)
+        out.append(s)
+    return out
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    monkeypatch.setattr(repair, "STRATEGY_REPAIR_ATTEMPTS", 2)
+    monkeypatch.setattr(repair, "STRATEGY_REPAIR_SECS", 5.0)
+    monkeypatch.setattr(repair, "STRATEGY_REPAIR_TOKENS", 5000)
+    return monkeypatch
+
+
+def test_missing_strategies_are_added_after_the_originals(budgets):
+    llm = FakeProvider(latency=0, jitter=0)
+    given = strategies(1)
+    fixed = run(repair.repair_strategies("bullish on telecom", given, llm=llm))
+    assert len(fixed) >= 3 and fixed[0] is given[0] and llm.calls == 1
+    assert len({s["name"] for s in fixed}) == len(fixed)
+
+
+def test_stops_after_the_attempt_limit(budgets):
+    llm = FakeProvider(latency=0, jitter=0, reply=lambda messages: "sorry, no idea")
+    run(repair.repair_strategies("bullish on telecom", strategies(1), llm=llm))
+    assert llm.calls == 2
+
+
+def test_stops_at_the_deadline(budgets):
+    budgets.setattr(repair, "STRATEGY_REPAIR_SECS", 0.1)
+    llm = FakeProvider(latency=1.0, jitter=0)
+    start = time.monotonic()
+    given = strategies(1)
+    assert run(repair.repair_strategies("bullish on telecom", given, llm=llm)) == given
+    assert time.monotonic() - start < 0.5 and llm.calls == 1
+
+
+def test_no_call_over_the_token_budget(budgets):
+    budgets.setattr(repair, "STRATEGY_REPAIR_TOKENS", 100)
+    llm = FakeProvider(latency=0, jitter=0)
+    given = strategies(1)
+    assert run(repair.repair_strategies("bullish on telecom", given, llm=llm)) == given
+    assert llm.calls == 0
+
+
+def test_missing_metrics_cost_no_call_by_default(budgets):
+    complete = strategies(3, missing=("sharpe_ratio",))
+    budgets.setattr(repair, "STRATEGY_REPAIR_METRICS", False)
+    assert not repair.needs_repair(complete)
+    budgets.setattr(repair, "STRATEGY_REPAIR_METRICS", True)
+    assert repair.needs_repair(complete)
+
+
+def test_metric_repair_fills_fields_when_enabled(budgets):
+    budgets.setattr(repair, "STRATEGY_REPAIR_METRICS", True)
+    llm = FakeProvider(latency=0, jitter=0)
+    given = strategies(3, missing=("sharpe_ratio", "win_rate"))
+    fixed = run(repair.repair_strategies("bullish on telecom", given, llm=llm))
+    assert all(s["sharpe_ratio"] is not None and not s["missing_fields"] for s in fixed)
+    assert given[0]["sharpe_ratio"] is None           # inputs are not modified
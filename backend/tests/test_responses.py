@@ -0,0 +1,67 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.responses import CompressionMiddleware, FastJSONResponse
+
+app = FastAPI(default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+calls = []
+
+
+@app.get("/resource")
+def resource(big: bool = False):
+    return {"data": "x" * (500 if big else 10)}
+
+
+@app.post("/chat")
+def chat():
+    calls.append(1)
+    return {"data": "x" * 500}
+
+
+client = TestClient(app)
+
+
+def test_get_answers_matching_etag_with_304():
+    first = client.get("/resource", headers={"Accept-Encoding": "gzip"})
+    again = client.get("/resource", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_post_never_answers_304():
+    first = client.post("/chat", headers={"Accept-Encoding": "gzip"})
+    assert "etag" not in first.headers
+    again = client.post("/chat", headers={"Accept-Encoding": "gzip", "If-None-Match": "*"})
+    assert again.status_code == 200 and again.json()["data"] == "x" * 500
+    assert len(calls) == 2
+
+
+def test_vary_on_every_compressible_response():
+    small = client.get("/resource", headers={"Accept-Encoding": "identity"})
+    big = client.get("/resource", params={"big": True}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers and small.headers["vary"] == "Accept-Encoding"
+    assert big.headers["content-encoding"] == "gzip" and big.headers["vary"] == "Accept-Encoding"
+
+
+def test_cached_strategies_get_a_304_on_repeat(monkeypatch):
+    from utils import api
+    from utils.strategy_cache import StrategyCache
+
+    cache = StrategyCache(path=None)
+    monkeypatch.setattr(api, "strategy_cache", cache)
+    shared = FastAPI(default_response_class=FastJSONResponse)
+    shared.add_middleware(CompressionMiddleware)
+    shared.include_router(api.router)
+    shared_client = TestClient(shared)
+
+    assert shared_client.get("/strategies/cached", params={"view": "bullish on tech"}).status_code == 404
+    fields = ("popularity", "avg_return", "sharpe_ratio", "win_rate", "max_drawdown",
+              "profit_factor", "volatility", "expectancy", "trade_frequency")
+    strategies = [{"name": f"S{i}", "explanation": "...", **dict.fromkeys(fields, 1.0)} for i in range(3)]
+    cache.put("Bullish on the tech sector!", "Tech looks strong.", strategies)
+    first = shared_client.get("/strategies/cached", params={"view": "bullish on tech"})
+    assert first.status_code == 200 and first.json()["strategies"] == strategies
+    again = shared_client.get("/strategies/cached", params={"view": "bullish on tech"},
+                              headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304 and again.content == b""
+    assert cache.stats()["hits"] == 0
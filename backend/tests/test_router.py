@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from utils import providers
+from utils.providers import FakeProvider, LLMRouter
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class Tracked(FakeProvider):
+    """Fixed-latency fake that answers with its name and notes being cancelled."""
+
+    def __init__(self, name, latency, **kwargs):
+        super().__init__(name, latency=latency, jitter=0, reply=lambda messages: name, **kwargs)
+        self.cancelled = False
+
+    async def complete(self, *args, **kwargs):
+        try:
+            return await super().complete(*args, **kwargs)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+@pytest.fixture(autouse=True)
+def hedge_delay(monkeypatch):
+    monkeypatch.setattr(providers, "LLM_HEDGE_DELAY", 0.05)
+    monkeypatch.setattr(providers, "LLM_HEDGE_TTFT", 0.05)
+
+
+def test_hedges_after_the_delay_and_cancels_the_loser():
+    slow, fast = Tracked("slow", 2.0), Tracked("fast", 0.01)
+    router = LLMRouter([slow, fast], hedge=True)
+
+    async def main():
+        start = time.monotonic()
+        text = await router.complete(MESSAGES)
+        return text, time.monotonic() - start
+
+    text, elapsed = asyncio.run(main())
+    assert text == "fast" and 0.05 <= elapsed < 0.5
+    assert router.counts["hedged"] == 1 and router.counts["hedge_won:fast"] == 1
+    assert slow.cancelled and router.health["slow"].samples == 1       # censored at ~the hedge delay
+
+
+def test_no_hedge_when_the_first_provider_is_quick():
+    quick, spare = Tracked("quick", 0.01), Tracked("spare", 0.01)
+    router = LLMRouter([quick, spare], hedge=True)
+    assert asyncio.run(router.complete(MESSAGES)) == "quick"
+    assert spare.calls == 0 and router.counts["hedged"] == 0
+
+
+def test_a_failing_provider_falls_through_to_the_next():
+    bad, good = Tracked("bad", 0.01, error_rate=1.0), Tracked("good", 0.01)
+    router = LLMRouter([bad, good], hedge=False)
+    assert asyncio.run(router.complete(MESSAGES)) == "good"
+    assert router.counts["failover"] == 1 and router.counts["error:bad"] == 1
+    assert router.health["bad"].error_rate == 1.0
+
+
+def test_every_provider_failing_raises_the_last_error():
+    router = LLMRouter([Tracked("a", 0.01, error_rate=1.0), Tracked("b", 0.01, error_rate=1.0)], hedge=False)
+    with pytest.raises(providers.httpx.HTTPStatusError):
+        asyncio.run(router.complete(MESSAGES))
+    assert router.counts["error:a"] == router.counts["error:b"] == 1
+
+
+def test_stream_fails_over_to_the_next_provider():
+    router = LLMRouter([Tracked("bad", 0.01, error_rate=1.0), Tracked("good", 0.01)], hedge=False)
+
+    async def main():
+        return "".join([delta async for delta in router.stream(MESSAGES)])
+
+    assert asyncio.run(main()) == "good" and router.counts["failover"] == 1
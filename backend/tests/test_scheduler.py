@@ -0,0 +1,28 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils.scheduler import CircuitBreaker, LLMScheduler, RateLimited
+
+
+def test_429_on_half_open_probe_does_not_wedge_breaker():
+    breaker = CircuitBreaker(failures=2, reset_after=0.0)
+    scheduler = LLMScheduler("test", ["k"], rpm=6000, burst=100, max_retries=0, breaker=breaker)
+    request = httpx.Request("POST", "http://llm.test")
+    statuses = iter([500, 500, 429, 200])
+
+    async def send(key):
+        return httpx.Response(next(statuses), request=request)
+
+    async def main():
+        for _ in range(2):                      # two 5xx: the breaker opens
+            assert (await scheduler.request(send)).status_code == 500
+        assert breaker.opened_at is not None
+        with pytest.raises(RateLimited):        # half-open probe answered by a 429
+            await scheduler.request(send)
+        assert not breaker._probing
+        assert (await scheduler.request(send)).status_code == 200   # next request gets through
+        assert breaker.state == "closed"
+
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+from utils.session_store import SharedSessionStore, SQLiteSessionBackend
+
+
+def sqlite_stores(tmp_path, n=2):
+    """*n* stores on separate connections to one file, like *n* workers."""
+    path = str(tmp_path / "sessions.sqlite3")
+    return [SharedSessionStore(SQLiteSessionBackend(path)) for _ in range(n)]
+
+
+def test_sqlite_cas_across_connections(tmp_path):
+    a, b = (s.backend for s in sqlite_stores(tmp_path))
+
+    async def main():
+        assert await a.cas("s", 0, {"n": 1})
+        assert not await b.cas("s", 0, {"n": 2})         # already created by a
+        assert await b.get("s") == (1, {"n": 1})
+        assert await b.cas("s", 1, {"n": 2})
+        assert not await a.cas("s", 1, {"n": 3})         # a's copy is stale
+        return await a.get("s")
+
+    assert asyncio.run(main()) == (2, {"n": 2})
+
+
+def test_sqlite_queries_run_off_the_event_loop(tmp_path):
+    backend = sqlite_stores(tmp_path, 1)[0].backend
+    threads = []
+    get = backend._get
+    backend._get = lambda sid: threads.append(threading.get_ident()) or get(sid)
+
+    async def main():
+        await backend.get("s")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert threads and threads[0] != loop_thread
+
+
+def test_cas_conflict_replays_the_journal_onto_the_newer_copy(tmp_path):
+    one, two = sqlite_stores(tmp_path)
+
+    async def main():
+        _, first = await one.load("s")
+        _, second = await two.load("s")
+        first.memory.add("user", "bullish on energy")
+        first.last_view = "bullish on energy"
+        second.memory.add("user", "what about gold?")
+        second.awaiting_confirmation = True
+        await one.save("s", first)
+        await two.save("s", second)          # stale: replayed onto one's save
+        return await one.load("s")
+
+    _, state = asyncio.run(main())
+    assert [(t.role, t.content) for t in state.memory.turns] == [
+        ("user", "bullish on energy"), ("user", "what about gold?")]
+    assert state.last_view == "bullish on energy" and state.awaiting_confirmation is True
+    assert one.counts["saves"] == 1 and two.counts["merged_saves"] == 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def memory_store(monkeypatch, **kwargs):
+    from utils import session_store
+
+    clock = Clock()
+    monkeypatch.setattr(session_store, "time", clock)
+    return session_store.SessionStore(**kwargs), clock
+
+
+def test_memory_store_evicts_least_recently_used(monkeypatch):
+    store, clock = memory_store(monkeypatch, max_sessions=2)
+    _, a = store.get("a")
+    _, b = store.get("b")
+    clock.now += 1
+    assert store.get("a")[1] is a           # touching a makes b the oldest
+    store.get("c")
+    assert len(store) == 2 and store.evicted_lru == 1
+    assert store.get("a")[1] is a
+    assert store.get("b")[1] is not b and store.created == 4     # b was evicted: a fresh one
+
+
+def test_memory_store_expires_idle_sessions(monkeypatch):
+    store, clock = memory_store(monkeypatch, idle_ttl=60)
+    _, a = store.get("a")
+    clock.now += 30
+    _, b = store.get("b")
+    clock.now += 45                         # a idle 75 s, b 45 s
+    assert store.stats()["sessions"] == 1 and store.expired == 1
+    assert store.get("b")[1] is b and store.get("a")[1] is not a
@@ -0,0 +1,39 @@
+import asyncio
+
+from utils import providers
+
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = []
+
+    async def complete(self, messages, timeout, priority, response_format=None):
+        self.calls.append(response_format)
+        await asyncio.sleep(0.01)
+        return "json" if response_format else "text"
+
+
+def test_response_format_and_history_split_single_flight():
+    llm = CountingLLM()
+    history = [{"role": "assistant", "content": "earlier"}]
+
+    async def main():
+        return await asyncio.gather(
+            providers.call_llm("same prompt", llm=llm),
+            providers.call_llm("same prompt", llm=llm, response_format={"type": "json_object"}),
+            providers.call_llm("same prompt", llm=llm, history=history),
+            providers.call_llm("same prompt", llm=llm),
+        )
+
+    assert asyncio.run(main()) == ["text", "json", "text", "text"]
+    assert len(llm.calls) == 3          # only the two identical plain calls share one completion
+
+
+def test_flight_key_collapses_whitespace_but_keeps_case():
+    from utils.llm_client import _flight_key
+
+    def key(text):
+        return _flight_key("m", [{"role": "user", "content": text}])
+
+    assert key("Buy  AAPL\n") == key("Buy AAPL")
+    assert key("Buy AAPL") != key("buy aapl")
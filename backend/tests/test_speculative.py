@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from utils import speculative
+from utils.scheduler import PRIORITY_CHAT, PRIORITY_STRATEGY
+from utils.speculative import SpeculationPolicy, speculate_intent
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    calls = []
+
+    async def fake_call_llm(prompt, priority, history=(), response_format=None):
+        calls.append((prompt, priority))
+        await asyncio.sleep(0.01)
+        return f"answer to {prompt}"
+
+    def classify_as(intent):
+        async def slow(text, awaiting_confirmation=False):
+            if isinstance(intent, Exception):
+                raise intent
+            return intent
+        monkeypatch.setattr(speculative.classifier, "slow", slow)
+
+    policy = SpeculationPolicy(enabled=True)
+    monkeypatch.setattr(speculative, "policy", policy)
+    monkeypatch.setattr(speculative, "call_llm", fake_call_llm)
+    monkeypatch.setattr(speculative.classifier, "fast", lambda text, awaiting_confirmation=False: None)
+    return calls, classify_as, policy
+
+
+def test_speculative_calls_queue_at_their_branch_priority(setup):
+    calls, classify_as, policy = setup
+    classify_as("OTHER")
+    policy.branch_counts["OTHER"] += 5      # chat is now the likeliest branch
+    assert asyncio.run(speculate_intent("hi", {"VIEW_WITH_STRATEGY": "strategies", "OTHER": "hi"})) == \
+        ("OTHER", "answer to hi")
+    policy.branch_counts["VIEW_WITH_STRATEGY"] += 10
+    classify_as("VIEW_WITH_STRATEGY")
+    asyncio.run(speculate_intent("hi", {"VIEW_WITH_STRATEGY": "strategies", "OTHER": "hi"}))
+    assert calls == [("hi", PRIORITY_CHAT), ("strategies", PRIORITY_STRATEGY)]
+
+
+def test_every_speculative_call_is_counted(setup):
+    _, classify_as, policy = setup
+    branches = {"VIEW_WITH_STRATEGY": "strategies", "OTHER": "hi"}
+    classify_as("VIEW_WITH_STRATEGY")
+    asyncio.run(speculate_intent("x", branches))               # hit
+    classify_as("OTHER")
+    assert asyncio.run(speculate_intent("x", branches)) == ("OTHER", None)     # miss
+    classify_as(RuntimeError("classifier down"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(speculate_intent("x", branches))           # abandoned
+    stats = policy.stats()
+    cost = policy.cost("strategies")
+    assert (stats["speculated"], stats["hits"], stats["misses"], stats["abandoned"]) == (3, 1, 1, 1)
+    assert stats["speculated_tokens"] == 3 * cost and stats["wasted_tokens_in_window"] == 2 * cost
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
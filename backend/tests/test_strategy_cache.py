@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils import strategy_cache as sc
+from utils.strategy_cache import StrategyCache, cache_key, normalize_view
+
+STRATEGIES = [{"name": "Momentum", "explanation": "Buy strength."}]
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Bullish on the telecom sector!", "bullish on telecom"),
+    ("I'm  VERY bullish on tech stocks.", "bullish on tech"),
+    ("Bearish, on oil?", "bearish on oil"),
+])
+def test_equivalent_views_share_a_key(a, b):
+    assert normalize_view(a) == normalize_view(b)
+    assert cache_key(a, "m") == cache_key(b, "m")
+
+
+def test_prompt_version_parser_version_and_model_are_part_of_the_key(monkeypatch):
+    base = cache_key("bullish on telecom", "model-a")
+    assert cache_key("bullish on telecom", "model-b") != base
+    assert cache_key("bullish on telecom", "model-a", version="old") != base
+    monkeypatch.setattr(sc, "PARSER_VERSION", "old")
+    assert cache_key("bullish on telecom", "model-a") != base
+    assert cache_key("bearish on telecom", "model-a") != base
+
+
+def test_a_changed_version_misses(tmp_path, monkeypatch):
+    cache = StrategyCache(str(tmp_path / "cache.sqlite3"))
+    cache.put("bullish on telecom", "summary", STRATEGIES, "m")
+    assert cache.get("Bullish on the telecom sector", "m")["strategies"] == STRATEGIES
+    assert cache.get("bullish on telecom", "other-model") is None
+    monkeypatch.setattr(sc, "PARSER_VERSION", "old")
+    assert cache.get("bullish on telecom", "m") is None
+
+
+def test_entries_expire_in_memory_and_on_disk(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(sc.time, "time", lambda: clock[0])
+    path = str(tmp_path / "cache.sqlite3")
+    cache = StrategyCache(path, ttl=60)
+    cache.put("bullish on telecom", "summary", STRATEGIES, "m")
+    clock[0] += 59
+    assert cache.get("bullish on telecom", "m") is not None
+    assert StrategyCache(path, ttl=60).get("bullish on telecom", "m") is not None     # another worker
+    clock[0] += 2
+    assert cache.get("bullish on telecom", "m") is None
+    assert StrategyCache(path, ttl=60).get("bullish on telecom", "m") is None
+
+
+def test_put_on_the_loop_writes_in_the_executor(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = StrategyCache(path)
+    threads = []
+    write = cache._write
+    cache._write = lambda *args: threads.append(threading.get_ident()) or write(*args)
+
+    async def main():
+        cache.put("bullish on telecom", "summary", STRATEGIES, "m")
+        assert cache.get("bullish on telecom", "m") is not None     # served from memory meanwhile
+        await cache.flush()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert threads and threads[0] != loop_thread
+    assert StrategyCache(path).get("bullish on telecom", "m")["sector_view_summary"] == "summary"
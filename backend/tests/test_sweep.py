@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from utils import sweep as sw
+
+
+def test_unknown_parameter_is_a_value_error_naming_the_accepted_ones(store):
+    with pytest.raises(ValueError, match="lookbak.*accepted: lookback, long_only"):
+        sw.sweep("momentum", ["AAA"], space={"lookbak": [10, 20]}, processes=1, data_dir=store)
+
+
+@pytest.mark.parametrize("search", ["grid", "random", "tpe"])
+def test_same_seed_same_ranking(store, search):
+    space = {"lookback": {"low": 5, "high": 120, "int": True}, "long_only": [True, False]}
+    runs = [sw.sweep("momentum", ["AAA", "BBB", "CCC"], space=space, search=search, trials=12,
+                     processes=1, seed=7, data_dir=store) for _ in range(2)]
+    (first, stats), (second, _) = runs
+    assert [s["params"] for s in first] == [s["params"] for s in second]
+    assert [s["sharpe_ratio"] for s in first] == [s["sharpe_ratio"] for s in second]
+    assert first and stats["candidates"] <= 12
+
+
+def test_tpe_start_up_never_exceeds_trials(store, monkeypatch):
+    drawn = []
+    sample = sw.sample
+    monkeypatch.setattr(sw, "sample", lambda space, n, rng: drawn.append(n) or sample(space, n, rng))
+    _, stats = sw.sweep("momentum", ["AAA"], search="tpe", trials=3, processes=8, seed=0, data_dir=store)
+    assert drawn == [3] and stats["candidates"] <= 3
+
+
+def test_grid_expands_ranges():
+    points = sw.grid({"a": {"low": 1, "high": 100, "int": True, "log": True}, "b": [True, False]}, num=3)
+    assert points == [{"a": a, "b": b} for a in (1, 10, 100) for b in (True, False)]
+    assert np.isclose(sw.grid({"x": {"low": 0.0, "high": 1.0}}, num=3)[1]["x"], 0.5)
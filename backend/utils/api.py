@@ -0,0 +1,159 @@
+"""What every backend's FastAPI app shares.
+
+``install(app)`` adds the middleware, the 503 for ``LLMUnavailable``, the
+HTTP client shutdown and ``/metrics``. ``router`` holds the endpoints that
+do not depend on a backend's conversation state -- batch strategies,
+parameter sweeps, risk simulation and the ``/debug`` views of the shared
+LLM router, caches and classifiers -- for the OpenRouter backends to include.
+"""
+import math
+from typing import Dict, List
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from utils import metrics
+from utils.batch import BATCH_CONCURRENCY, ndjson_batch
+from utils.charts import render_charts, render_risk_charts
+from utils.intent_fast import classifier as intent_classifier
+from utils.llm_client import close_client, coalesce_stats, scheduler_stats
+from utils.metrics import MetricsMiddleware
+from utils.parsing import build_response_summary
+from utils.providers import router as llm_router
+from utils.responses import CompressionMiddleware, FastJSONResponse
+from utils.scheduler import LLMUnavailable
+from utils.speculative import policy as spec_policy
+from utils.strategy_cache import strategy_cache
+
+
+class ChatMessage(BaseModel):
+    message: str
+    chart_format: str = None  # "compact" (default) or "plotly" for full figures
+    metrics: str = None       # "llm" (default) or "backtest" for metrics computed on local price history
+
+class BatchRequest(BaseModel):
+    views: List[str]
+    concurrency: int = BATCH_CONCURRENCY
+    job_id: str = None
+
+class SweepRequest(BaseModel):
+    template: str                 # momentum, mean_reversion, breakout, pairs or covered_call
+    tickers: List[str] = None     # default: the tickers / sector named in view
+    view: str = None
+    space: dict = None            # {param: [values]} or {param: {"low", "high", "int", "log"}}
+    search: str = "grid"          # grid, random or tpe
+    trials: int = 100
+    objective: str = "sharpe_ratio"
+    top: int = 10
+    seed: int = 0
+    chart_format: str = None
+
+class RiskRequest(BaseModel):
+    # exactly one of: a return series, a position, or a backtest template
+    returns: List[float] = None   # simple per-bar returns, 0.01 = 1%
+    position: Dict[str, float] = None   # ticker -> fraction of capital
+    template: str = None          # with tickers (default: those named in view) and params, e.g. from /sweep
+    tickers: List[str] = None
+    view: str = None
+    params: dict = None
+    years: float = None           # history to resample (default BACKTEST_YEARS)
+    paths: int = None             # default MC_PATHS, at most MC_MAX_PATHS
+    horizon: int = None           # bars per path, default MC_HORIZON, at most MC_MAX_HORIZON
+    block: int = None             # bootstrap block length, 1..len(returns); 1 = i.i.d., default n ** (1/3)
+    seed: int = 0
+    confidence: List[float] = [0.95, 0.99]
+    chart_format: str = None
+
+# ─────────────────────────────────────────────────────────────────────────
+async def _llm_unavailable(request, exc):
+    # rate limited on every key / circuit open: tell the client when to come back
+    headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after not in (None, math.inf) else None
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+def install(app):
+    """Middleware, error handling, shutdown and ``/metrics`` for *app*."""
+    app.add_middleware(CompressionMiddleware)   # inner: metrics time the compression too
+    app.add_middleware(MetricsMiddleware)
+    app.add_exception_handler(LLMUnavailable, _llm_unavailable)
+    app.on_event("shutdown")(close_client)
+    app.on_event("shutdown")(strategy_cache.flush)
+    app.on_event("shutdown")(intent_classifier.flush)
+    app.add_api_route("/metrics", prometheus_metrics, methods=["GET"])
+    return app
+
+# ─────────────────────────────────────────────────────────────────────────
+router = APIRouter()
+
+@router.post("/strategies/batch")
+async def strategies_batch(req: BatchRequest):
+    """Strategies for many views at once, streamed back as NDJSON as they finish.
+
+    Pass the returned ``job_id`` again to resume: finished views are not regenerated.
+    """
+    return StreamingResponse(ndjson_batch(req.views, req.concurrency, req.job_id),
+                             media_type="application/x-ndjson")
+
+@router.get("/strategies/cached")
+def cached_strategies(view: str, chart_format: str = None):
+    """Strategies already generated for *view*, without calling the LLM (404 if there are none).
+
+    A GET, unlike ``/chat``, so clients that re-ask a popular view get an
+    ``ETag`` and, with ``If-None-Match``, an empty 304 while the entry lasts.
+    """
+    hit = strategy_cache.peek(view)
+    if hit is None:
+        raise HTTPException(status_code=404, detail="No cached strategies for this view.")
+    strategies = hit["strategies"]
+    return FastJSONResponse({
+        "sector_view_summary": hit["sector_view_summary"],
+        "response": build_response_summary(strategies),
+        "strategies": strategies,
+        "charts": render_charts(strategies, chart_format),
+    })
+
+@router.post("/sweep")
+async def parameter_sweep(req: SweepRequest):
+    """Best parameters of a backtest template, ranked and rendered like LLM strategies."""
+    from utils.sweep import sweep_view      # numpy and a process pool, only when asked for
+    try:
+        strategies, stats = await sweep_view(req.template, req.tickers, req.view, space=req.space,
+                                             search=req.search, trials=req.trials, objective=req.objective,
+                                             top=req.top, seed=req.seed)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"strategies": strategies, "response": build_response_summary(strategies),
+            "charts": render_charts(strategies, req.chart_format), "stats": stats}
+
+@router.post("/risk")
+async def risk_simulation(req: RiskRequest):
+    """Monte Carlo VaR, CVaR and drawdown percentiles of a return series, position or strategy."""
+    from utils.montecarlo import risk_async     # numpy, only when asked for
+    try:
+        risk = await risk_async(returns=req.returns, position=req.position, template=req.template,
+                                tickers=req.tickers, view=req.view, params=req.params, years=req.years,
+                                paths=req.paths, horizon=req.horizon, block=req.block, seed=req.seed,
+                                confidence=req.confidence)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    risk["charts"] = render_risk_charts(risk, req.chart_format)
+    return risk
+
+@router.get("/debug/llm")
+def llm_stats():
+    return {"coalescing": coalesce_stats(), "scheduler": scheduler_stats(), "router": llm_router.stats()}
+
+@router.get("/debug/cache")
+def cache_stats():
+    return strategy_cache.stats()
+
+@router.get("/debug/intent")
+def intent_stats():
+    return intent_classifier.report()
+
+@router.get("/debug/speculation")
+def speculation_stats():
+    return spec_policy.stats()
@@ -0,0 +1,385 @@
+"""Vectorised backtests of common strategy templates over local daily bars.
+
+A template turns a ticker's ``Bars`` into ``(position, asset_returns)``:
+the position decided at each bar's close (-1, 0 or 1, held over the next
+bar) and the per-bar return of what is held. ``run`` turns that into
+strategy returns net of costs and ``compute_metrics`` into the same metric
+keys the LLM is asked for. Everything is whole-array NumPy; stateful rules
+("long from entry until exit") use a forward fill of entry/exit events
+rather than a per-bar loop, and per-trade results come from ``bincount``
+over trade ids.
+
+Templates:
+
+    momentum        long (or short) while the ``lookback``-bar return is positive (negative)
+    mean_reversion  long when RSI(``period``) drops below ``lower``, flat once it is back above ``exit``
+    breakout        long on a close above the prior ``entry``-bar high, flat below the prior ``exit``-bar low
+    pairs           long/short the log spread to ``BACKTEST_BENCHMARK`` at +-``entry`` z-scores, flat inside ``exit``
+    covered_call    long the stock, short an ``otm`` call rolled every ``days`` bars (premium from realised vol)
+
+``popularity`` cannot be backtested and is left to the LLM. Many tickers are
+spread over a process pool (``BACKTEST_PROCESSES``); workers map the bars
+from the market data store themselves, so no arrays are pickled.
+"""
+import asyncio
+import inspect
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.marketdata import MARKET_DATA_DIR, Bars, available_tickers, load_bars
+
+BACKTEST_PROCESSES = int(os.getenv("BACKTEST_PROCESSES", str(os.cpu_count() or 1)))
+BACKTEST_COST_BPS  = float(os.getenv("BACKTEST_COST_BPS", "5"))      # per unit of position change
+BACKTEST_YEARS     = float(os.getenv("BACKTEST_YEARS", "5"))         # history used by backtest_strategies
+BACKTEST_BENCHMARK = os.getenv("BACKTEST_BENCHMARK", "SPY")          # pairs leg / default universe
+BACKTEST_MAX_TICKERS = int(os.getenv("BACKTEST_MAX_TICKERS", "20"))
+
+BARS_PER_YEAR = 252
+BARS_PER_MONTH = 21
+BACKTEST_FIELDS = ("avg_return", "sharpe_ratio", "win_rate", "max_drawdown", "profit_factor",
+                   "volatility", "expectancy", "trade_frequency")
+
+
+# ── array helpers ───────────────────────────────────────────────────────
+def _rolling_mean(x, n):
+    out = np.full(x.shape, np.nan)
+    if len(x) >= n:
+        c = np.cumsum(np.insert(x, 0, 0.0))
+        out[n - 1:] = (c[n:] - c[:-n]) / n
+    return out
+
+
+def _rolling_std(x, n):
+    mean = _rolling_mean(x, n)
+    return np.sqrt(np.maximum(_rolling_mean(x * x, n) - mean * mean, 0.0))
+
+
+def _rolling(x, n, fn):
+    out = np.full(x.shape, np.nan)
+    if len(x) >= n:
+        out[n - 1:] = fn(sliding_window_view(x, n), axis=-1)
+    return out
+
+
+def _shift(x, k=1, fill=np.nan):
+    out = np.empty_like(x, dtype=np.float64)
+    out[:k] = fill
+    out[k:] = x[:-k]
+    return out
+
+
+def _hold(state):
+    """Forward-fill *state* over NaNs (NaN = keep the previous position); leading NaNs become 0."""
+    idx = np.where(np.isnan(state), 0, np.arange(len(state)))
+    np.maximum.accumulate(idx, out=idx)
+    out = state[idx]
+    return np.nan_to_num(out, nan=0.0)
+
+
+def _pct_change(close):
+    r = np.zeros_like(close)
+    r[1:] = close[1:] / close[:-1] - 1.0
+    return r
+
+
+def _norm_cdf(x):
+    # Abramowitz & Stegun 7.1.26, |error| < 1.5e-7; avoids a scipy dependency
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def rsi(close, period=14):
+    """RSI from simple averages of gains and losses (Cutler's variant, which needs no recursion)."""
+    delta = np.diff(close, prepend=close[0])
+    gain = _rolling_mean(np.maximum(delta, 0.0), period)
+    loss = _rolling_mean(np.maximum(-delta, 0.0), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+
+
+# ── templates ───────────────────────────────────────────────────────────
+def momentum(bars: Bars, lookback=63, long_only=True):
+    close = bars.close
+    past = _shift(close, lookback)
+    signal = np.sign(np.nan_to_num(close / past - 1.0))
+    if long_only:
+        signal = np.maximum(signal, 0.0)
+    return signal, _pct_change(close)
+
+
+def mean_reversion(bars: Bars, period=14, lower=30.0, exit=55.0):
+    r = rsi(bars.close, period)
+    state = np.where(r < lower, 1.0, np.where(r > exit, 0.0, np.nan))
+    return _hold(state), _pct_change(bars.close)
+
+
+def breakout(bars: Bars, entry=20, exit=10):
+    high = _shift(_rolling(bars.high, entry, np.max), 1)
+    low = _shift(_rolling(bars.low, exit, np.min), 1)
+    state = np.where(bars.close > high, 1.0, np.where(bars.close < low, 0.0, np.nan))
+    return _hold(state), _pct_change(bars.close)
+
+
+def pairs(bars: Bars, benchmark: Bars = None, window=60, entry=2.0, exit=0.5):
+    if benchmark is None:
+        raise ValueError("pairs needs benchmark bars")
+    _, ia, ib = np.intersect1d(bars.dates, benchmark.dates, assume_unique=True, return_indices=True)
+    a, b = bars.close[ia], benchmark.close[ib]
+    spread = np.log(a) - np.log(b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (spread - _rolling_mean(spread, window)) / _rolling_std(spread, window)
+    state = np.where(z > entry, -1.0, np.where(z < -entry, 1.0, np.where(np.abs(z) < exit, 0.0, np.nan)))
+    return _hold(state), _pct_change(a) - _pct_change(b)
+
+
+def covered_call(bars: Bars, days=21, otm=0.05, vol_window=21):
+    """Proxy: stock capped at the strike over each roll, plus a Black-Scholes premium on realised vol."""
+    close = bars.close
+    n = len(close)
+    t = np.arange(n)
+    anchor = np.maximum(t - 1, 0) // days * days            # bar the covering call was sold at
+    strike = close[anchor] * (1.0 + otm)
+    capped = np.minimum(close, strike)
+    prev = np.minimum(_shift(close, 1, close[0]), strike)
+    returns = capped / prev - 1.0
+
+    log_ret = np.diff(np.log(close), prepend=np.log(close[0]))
+    sigma = np.nan_to_num(_rolling_std(log_ret, vol_window)) * np.sqrt(BARS_PER_YEAR)
+    tau = days / BARS_PER_YEAR
+    sell = (t % days == 0) & (sigma > 0)
+    s_t = sigma[sell] * np.sqrt(tau)
+    d1 = (np.log(1.0 / (1.0 + otm)) + 0.5 * s_t ** 2) / s_t
+    premium = _norm_cdf(d1) - (1.0 + otm) * _norm_cdf(d1 - s_t)   # per unit of spot, zero rates
+    credit = np.zeros(n)
+    paid = np.flatnonzero(sell) + 1                          # credited over the bar after the sale
+    credit[paid[paid < n]] = premium[paid < n]
+    return np.ones(n), returns + credit
+
+
+TEMPLATES = {
+    "momentum": momentum,
+    "mean_reversion": mean_reversion,
+    "breakout": breakout,
+    "pairs": pairs,
+    "covered_call": covered_call,
+}
+
+
+def check_params(template: str, names):
+    """``ValueError`` unless *template* exists and takes every parameter in *names*."""
+    if template not in TEMPLATES:
+        raise ValueError(f"unknown template {template!r}; one of {', '.join(TEMPLATES)}")
+    accepted = [p for p in list(inspect.signature(TEMPLATES[template]).parameters)[1:] if p != "benchmark"]
+    unknown = [n for n in names if n not in accepted]
+    if unknown:
+        raise ValueError(f"unknown {template} parameter(s) {', '.join(map(str, unknown))}; "
+                         f"accepted: {', '.join(accepted)}")
+
+
+# strategy name / explanation keywords -> template, first match wins
+_KEYWORDS = [
+    (re.compile(r"covered[ -]call|buy[ -]write|call[ -]writing|overwrit", re.I), "covered_call"),
+    (re.compile(r"\bpairs?\b|spread trade|relative value|long[/ -]short", re.I), "pairs"),
+    (re.compile(r"break ?out|donchian|channel|new highs?|\d+-day highs?", re.I), "breakout"),
+    (re.compile(r"mean[ -]revers|\brsi\b|oversold|pull ?back|bollinger|dip", re.I), "mean_reversion"),
+    (re.compile(r"momentum|trend|moving average cross|relative strength|rotation", re.I), "momentum"),
+]
+
+
+def match_template(name: str, explanation: str = ""):
+    """Template for an LLM-suggested strategy, judged by its name first, or ``None``."""
+    for text in (name, explanation):
+        for pattern, template in _KEYWORDS:
+            if pattern.search(text):
+                return template
+    return None
+
+
+# ── engine ──────────────────────────────────────────────────────────────
+def run(template: str, bars: Bars, params: dict = None, benchmark: Bars = None, cost_bps=BACKTEST_COST_BPS):
+    """Strategy returns and positions for one ticker: ``(returns, held)``.
+
+    ``returns[t]`` is earned over bar *t* by ``held[t]``, the position taken
+    at the previous close; costs are charged on every change of it.
+    """
+    params = dict(params or {})
+    if template == "pairs":
+        params["benchmark"] = benchmark
+    position, asset = TEMPLATES[template](bars, **params)
+    held = _shift(position, 1, 0.0)
+    turnover = np.abs(np.diff(held, prepend=0.0))
+    return held * asset - turnover * cost_bps / 1e4, held
+
+
+def trade_returns(returns, held):
+    """Compounded return of each trade (run of constant non-zero position)."""
+    active = held != 0
+    starts = active & (held != _shift(held, 1, 0.0))
+    ids = np.cumsum(starts) - 1
+    if not starts.any():
+        return np.empty(0)
+    log_pnl = np.bincount(ids[active], weights=np.log1p(returns[active]), minlength=ids[-1] + 1)
+    return np.expm1(log_pnl)
+
+
+def compute_metrics(returns, held) -> dict:
+    """``BACKTEST_FIELDS`` for one return series, in the units the LLM is asked for."""
+    n = len(returns)
+    if n < 2:
+        return dict.fromkeys(BACKTEST_FIELDS)
+    equity = np.cumprod(1.0 + returns)
+    drawdown = equity / np.maximum.accumulate(equity) - 1.0
+    std = returns.std()
+    trades = trade_returns(returns, held)
+    gains, losses = trades[trades > 0].sum(), -trades[trades < 0].sum()
+    return {
+        "avg_return": round((equity[-1] ** (BARS_PER_YEAR / n) - 1.0) * 100, 2),
+        "sharpe_ratio": round(returns.mean() / std * np.sqrt(BARS_PER_YEAR), 2) if std > 0 else 0.0,
+        "win_rate": round((trades > 0).mean() * 100, 2) if len(trades) else None,
+        "max_drawdown": round(drawdown.min() * 100, 2),
+        "profit_factor": round(gains / losses, 2) if losses > 0 else None,
+        "volatility": round(std * np.sqrt(BARS_PER_YEAR) * 100, 2),
+        "expectancy": round(trades.mean() * 100, 2) if len(trades) else None,
+        "trade_frequency": round(len(trades) / (n / BARS_PER_MONTH), 2),
+    }
+
+
+def backtest(template: str, ticker: str, params: dict = None, start=None, end=None, data_dir=None) -> dict:
+    bars = load_bars(ticker, data_dir, start, end)
+    benchmark = None
+    if template == "pairs":
+        benchmark = load_bars(BACKTEST_BENCHMARK, data_dir, start, end)
+    return compute_metrics(*run(template, bars, params, benchmark))
+
+
+def _run_chunk(template, tickers, params, start, end, data_dir):
+    out = {}
+    for ticker in tickers:
+        try:
+            out[ticker] = backtest(template, ticker, params, start, end, data_dir)
+        except (KeyError, ValueError):
+            out[ticker] = None
+    return out
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(BACKTEST_PROCESSES)
+    return _pool
+
+
+def backtest_tickers(template: str, tickers, params: dict = None, start=None, end=None,
+                     processes: int = None, data_dir: str = None) -> dict:
+    """``{ticker: metrics or None}`` for one template over many tickers.
+
+    With more than one process the tickers are split into one chunk per
+    process; tickers without data (or too short for the template) map to ``None``.
+    """
+    tickers = list(tickers)
+    processes = min(processes or BACKTEST_PROCESSES, len(tickers))
+    data_dir = data_dir or MARKET_DATA_DIR
+    if processes <= 1:
+        return _run_chunk(template, tickers, params, start, end, data_dir)
+    pool = _get_pool() if processes == BACKTEST_PROCESSES else ProcessPoolExecutor(processes)
+    try:
+        futures = [pool.submit(_run_chunk, template, tickers[i::processes], params, start, end, data_dir)
+                   for i in range(processes)]
+        results = {}
+        for f in futures:
+            results.update(f.result())
+        return {t: results[t] for t in tickers}
+    finally:
+        if pool is not _pool:
+            pool.shutdown()
+
+
+def aggregate(results: dict) -> dict:
+    """Median of each metric over the tickers that produced one."""
+    rows = [m for m in results.values() if m]
+    out = {}
+    for field in BACKTEST_FIELDS:
+        values = [m[field] for m in rows if m[field] is not None]
+        out[field] = round(float(np.median(values)), 2) if values else None
+    return out
+
+
+# ── strategies from the LLM ─────────────────────────────────────────────
+# sector words -> liquid proxies; only tickers present locally are used
+SECTOR_TICKERS = {
+    "tech": ("XLK", "QQQ", "AAPL", "MSFT", "NVDA"),
+    "semiconductor": ("SMH", "NVDA", "AMD", "INTC"),
+    "telecom": ("XLC", "VZ", "T", "TMUS"),
+    "energy": ("XLE", "XOM", "CVX"),
+    "oil": ("XLE", "USO", "XOM", "CVX"),
+    "bank": ("XLF", "KBE", "JPM", "BAC"),
+    "financ": ("XLF", "JPM", "BAC", "GS"),
+    "health": ("XLV", "JNJ", "UNH", "PFE"),
+    "pharma": ("XLV", "PFE", "MRK", "LLY"),
+    "consumer": ("XLY", "XLP", "AMZN", "WMT"),
+    "retail": ("XRT", "AMZN", "WMT", "TGT"),
+    "industrial": ("XLI", "CAT", "GE"),
+    "utilit": ("XLU", "NEE", "DUK"),
+    "real estate": ("XLRE", "VNQ"),
+    "gold": ("GLD", "GDX"),
+    "crypto": ("BITO", "COIN"),
+}
+_TICKER = re.compile(r"\$?\b([A-Z]{1,5})\b")
+
+
+def tickers_for_view(view: str, data_dir: str = None) -> list:
+    """Locally available tickers the view names or whose sector it mentions (else the benchmark)."""
+    have = set(available_tickers(data_dir))
+    lowered = view.lower()
+    wanted = [t for t in _TICKER.findall(view) if t in have]
+    for word, tickers in SECTOR_TICKERS.items():
+        if word in lowered:
+            wanted += [t for t in tickers if t in have]
+    if not wanted and BACKTEST_BENCHMARK in have:
+        wanted = [BACKTEST_BENCHMARK]
+    return list(dict.fromkeys(wanted))[:BACKTEST_MAX_TICKERS]
+
+
+def _backtest_strategies(view, strategies, data_dir=None):
+    tickers = tickers_for_view(view, data_dir)
+    if not tickers:
+        return strategies
+    end = max(load_bars(t, data_dir).dates[-1] for t in tickers)
+    start = end - np.timedelta64(int(BACKTEST_YEARS * 365), "D")
+    out = []
+    for s in strategies:
+        template = match_template(s["name"], s.get("explanation", ""))
+        if template is None:
+            out.append(s)
+            continue
+        metrics = aggregate(backtest_tickers(template, tickers, start=start, end=end, data_dir=data_dir))
+        if all(v is None for v in metrics.values()):
+            out.append(s)
+            continue
+        s = {**s, **{k: v for k, v in metrics.items() if v is not None}}
+        s["missing_fields"] = [f for f in s["missing_fields"] if s[f] is None]
+        s["backtest"] = {"template": template, "tickers": tickers,
+                         "start": str(start), "end": str(end)}
+        out.append(s)
+    return out
+
+
+async def backtest_strategies(view: str, strategies):
+    """Copies of *strategies* with backtested metrics where a template matches.
+
+    Strategies that match no template, or for which there is no local data,
+    keep the LLM's numbers; replaced ones carry a ``backtest`` entry naming
+    the template, tickers and date range used.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _backtest_strategies, view, strategies)
@@ -0,0 +1,171 @@
+"""Bulk strategy generation for lists of market views.
+
+No intent detection and no chat state: every view goes straight to
+``get_strategies`` (so the strategy cache applies), with at most
+*concurrency* generations in flight. Results are yielded as they finish and
+recorded per job in SQLite; rerunning a job skips views that already have a
+successful result and retries the ones that failed.
+
+    python -m utils.batch views.txt --concurrency 16 --job-id overnight > results.jsonl
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from uuid import uuid4
+
+from utils.llm_client import close_client
+from utils.pipeline import get_strategies
+from utils.scheduler import PRIORITY_BATCH
+
+BATCH_DB_PATH       = os.getenv("BATCH_DB_PATH", "batch_jobs.sqlite3")
+BATCH_CONCURRENCY   = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+
+
+def _item_key(view: str) -> str:
+    return hashlib.sha1(view.strip().encode()).hexdigest()
+
+
+class BatchStore:
+    """Per-job results, so an interrupted job can be resumed."""
+
+    def __init__(self, path=BATCH_DB_PATH):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS batch_results ("
+            " job_id TEXT, item_key TEXT, status TEXT, result TEXT, finished_at REAL,"
+            " PRIMARY KEY (job_id, item_key))"
+        )
+        self._lock = threading.Lock()
+
+    def done(self, job_id: str) -> dict:
+        """item_key -> stored result, for items that completed successfully."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT item_key, result FROM batch_results WHERE job_id = ? AND status = 'ok'", (job_id,)
+            ).fetchall()
+        return {key: json.loads(result) for key, result in rows}
+
+    def save(self, job_id: str, result: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO batch_results VALUES (?, ?, ?, ?, ?)",
+                (job_id, _item_key(result["view"]), result["status"], json.dumps(result), time.time()),
+            )
+
+
+async def _run_one(index: int, view: str) -> dict:
+    result = {"index": index, "view": view}
+    try:
+        sector_summary, strategies = await get_strategies(view, priority=PRIORITY_BATCH)
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+        return result
+    result.update(sector_view_summary=sector_summary, strategies=strategies)
+    if len(strategies) < 3:
+        result.update(status="parse_error", error="LLM returned fewer than 3 strategies.")
+    else:
+        result["status"] = "ok"
+    return result
+
+
+async def run_batch(views, concurrency=BATCH_CONCURRENCY, job_id=None, store=None):
+    """Yield one result dict per view, in completion order.
+
+    Each result has ``index``, ``view``, ``status`` (``ok`` / ``parse_error`` /
+    ``error``) and either ``strategies`` + ``sector_view_summary`` or ``error``.
+    Items already completed under *job_id* are yielded first with
+    ``resumed: True`` and are not regenerated.
+    """
+    concurrency = max(1, min(int(concurrency), BATCH_MAX_CONCURRENCY))
+    done = store.done(job_id) if store is not None and job_id else {}
+
+    queue = asyncio.Queue()
+    for index, view in enumerate(views):
+        prior = done.get(_item_key(view))
+        if prior is not None:
+            yield {**prior, "index": index, "resumed": True}
+        else:
+            queue.put_nowait((index, view))
+
+    results = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                index, view = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await _run_one(index, view)
+            if store is not None and job_id:
+                try:
+                    store.save(job_id, result)
+                except sqlite3.Error as e:
+                    result["store_error"] = str(e)
+            await results.put(result)
+
+    pending = queue.qsize()
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, pending))]
+    try:
+        for _ in range(pending):
+            yield await results.get()
+    finally:
+        # client went away / caller stopped iterating: don't leave generations running
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def new_job_id() -> str:
+    return uuid4().hex
+
+
+_store = None
+
+def default_store() -> BatchStore:
+    global _store
+    if _store is None:
+        _store = BatchStore()
+    return _store
+
+
+async def ndjson_batch(views, concurrency=BATCH_CONCURRENCY, job_id=None):
+    """NDJSON lines for the /strategies/batch endpoint: job header, then results."""
+    job_id = job_id or new_job_id()
+    yield json.dumps({"job_id": job_id, "total": len(views)}) + "\n"
+    async for result in run_batch(views, concurrency, job_id, default_store()):
+        yield json.dumps(result) + "\n"
+
+
+async def _main(args):
+    with open(args.views) as f:
+        views = [line.strip() for line in f if line.strip()]
+    store = BatchStore(args.db)
+    counts = {}
+    start = time.perf_counter()
+    try:
+        async for result in run_batch(views, args.concurrency, args.job_id, store):
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            print(json.dumps(result), flush=True)
+    finally:
+        await close_client()
+    elapsed = time.perf_counter() - start
+    print(f"job {args.job_id}: {len(views)} views in {elapsed:.1f}s {counts}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Generate strategies for many market views.")
+    ap.add_argument("views", help="text file, one market view per line")
+    ap.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    ap.add_argument("--job-id", default=None, help="reuse to resume an interrupted job")
+    ap.add_argument("--db", default=BATCH_DB_PATH)
+    args = ap.parse_args()
+    args.job_id = args.job_id or new_job_id()
+    asyncio.run(_main(args))
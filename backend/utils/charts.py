@@ -1,6 +1,26 @@
-import plotly.graph_objs as go
+import os
+
+from utils.metrics import span
+
+# "compact": one columnar table + a small spec, expanded into figures by the client.
+# "plotly":  nine full go.Figure dicts (old format, ~10x bigger).
+CHART_FORMAT = os.getenv("CHART_FORMAT", "compact")
+
+CHART_METRICS = {
+    "popularity": "Strategy Popularity (%)",
+    "avg_return": "Average Return (%)",
+    "sharpe_ratio": "Sharpe Ratio",
+    "win_rate": "Win Rate (%)",
+    "max_drawdown": "Max Drawdown (%)",
+    "profit_factor": "Profit Factor",
+    "volatility": "Volatility (%)",
+    "expectancy": "Risk-Reward Ratio",
+    "trade_frequency": "Trade Frequency (trades/month)"
+}
+
+def generate_plotly_charts(strategies, metrics=CHART_METRICS):
+    import plotly.graph_objs as go      # only the "plotly" format needs it; keeps cold start fast
 
-def generate_plotly_charts(strategies):
     charts = {}
 
     def make_chart(metric, title, yaxis):
@@ -8,19 +28,69 @@ def generate_plotly_charts(strategies):
         fig.update_layout(title=title, xaxis_title='Strategy', yaxis_title=yaxis)
         return fig
 
-    metrics = {
-        "popularity": "Strategy Popularity (%)",
-        "avg_return": "Average Return (%)",
-        "sharpe_ratio": "Sharpe Ratio",
-        "win_rate": "Win Rate (%)",
-        "max_drawdown": "Max Drawdown (%)",
-        "profit_factor": "Profit Factor",
-        "volatility": "Volatility (%)",
-        "expectancy": "Risk-Reward Ratio",
-        "trade_frequency": "Trade Frequency (trades/month)"
-    }
-
     for key, title in metrics.items():
         charts[key] = make_chart(key, title, title.split(" (")[0])
 
-    return charts 
\ No newline at end of file
+    return charts
+
+def compact_charts(strategies, metrics=CHART_METRICS):
+    """Columnar form of generate_plotly_charts: names once, one vector per metric."""
+    return {
+        "format": "compact",
+        "type": "bar",
+        "x": [s['name'] for s in strategies],
+        "xaxis_title": "Strategy",
+        "series": {key: [s[key] for s in strategies] for key in metrics},
+        "spec": {key: {"title": title, "yaxis_title": title.split(" (")[0]} for key, title in metrics.items()},
+    }
+
+def render_charts(strategies, chart_format=None, metrics=CHART_METRICS):
+    """Chart payload for an API response in the requested format."""
+    with span("charts"):
+        if (chart_format or CHART_FORMAT) != "plotly":
+            return compact_charts(strategies, metrics)
+        figures = generate_plotly_charts(strategies, metrics)
+    with span("chart_serialize"):
+        return {k: f.to_dict() for k, f in figures.items()}
+
+def compact_risk_charts(risk):
+    """Monte Carlo result (utils.montecarlo) as a fan chart and two histograms, columnar."""
+    def histogram(key, title, markers):
+        edges = risk["distributions"][key]["edges"]
+        return {"type": "bar", "x": [round((a + b) / 2, 2) for a, b in zip(edges, edges[1:])],
+                "y": risk["distributions"][key]["counts"], "title": title,
+                "xaxis_title": title.split(" (")[0] + " (%)", "yaxis_title": "Paths", "markers": markers}
+
+    return {
+        "format": "compact",
+        "fan": {"type": "line", "x": risk["fan"]["x"], "series": risk["fan"]["percentiles"],
+                "title": f"Simulated Return over {risk['horizon']} Bars (percentiles)",
+                "xaxis_title": "Bars Ahead", "yaxis_title": "Return (%)"},
+        "return": histogram("return", f"Return after {risk['horizon']} Bars",
+                            {**{f"VaR {c}%": v for c, v in risk["var"].items()},
+                             **{f"CVaR {c}%": v for c, v in risk["cvar"].items()}}),
+        "max_drawdown": histogram("max_drawdown", "Max Drawdown", dict(risk["max_drawdown"])),
+    }
+
+def render_risk_charts(risk, chart_format=None):
+    """Chart payload for a Monte Carlo result in the requested format."""
+    with span("charts"):
+        compact = compact_risk_charts(risk)
+        if (chart_format or CHART_FORMAT) != "plotly":
+            return compact
+        import plotly.graph_objs as go
+        figures = {}
+        fan = compact["fan"]
+        figures["fan"] = go.Figure([go.Scatter(x=fan["x"], y=y, mode="lines", name=p)
+                                    for p, y in fan["series"].items()])
+        figures["fan"].update_layout(title=fan["title"], xaxis_title=fan["xaxis_title"],
+                                     yaxis_title=fan["yaxis_title"])
+        for key in ("return", "max_drawdown"):
+            h = compact[key]
+            fig = go.Figure([go.Bar(x=h["x"], y=h["y"])])
+            for name, value in h["markers"].items():
+                fig.add_vline(x=value, line_dash="dash", annotation_text=name)
+            fig.update_layout(title=h["title"], xaxis_title=h["xaxis_title"], yaxis_title=h["yaxis_title"])
+            figures[key] = fig
+    with span("chart_serialize"):
+        return {k: f.to_dict() for k, f in figures.items()}
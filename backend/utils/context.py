@@ -0,0 +1,177 @@
+"""Token-budgeted conversation context with a rolling summary.
+
+Drop-in for ``ConversationBufferMemory`` (``save_context`` /
+``load_memory_variables``), but ``history()`` only returns the newest turns
+that fit in ``CONTEXT_TOKEN_BUDGET`` tokens, preceded by a system message
+summarising everything older. Token counts are estimated once per message
+when it is saved, so building a prompt is a walk over cached integers.
+
+Once enough tokens have fallen out of the window, they are folded into the
+summary by a background LLM call at batch priority. Only one fold per
+conversation runs at a time and a failed fold just leaves the turns in place;
+``CONTEXT_MAX_TURNS`` bounds memory either way.
+
+For shared session backends a context can also be serialised
+(``to_dict`` / ``load_dict``) and keep a ``journal`` of the operations
+applied since it was loaded, so ``apply`` can replay them onto a newer copy.
+"""
+import asyncio
+import contextvars
+import os
+from collections import deque
+from itertools import islice
+
+from utils.metrics import CONTEXT_SUMMARIES, CONTEXT_TOKENS, span
+from utils.prompts import summary_prompt
+from utils.providers import call_llm
+from utils.scheduler import PRIORITY_BATCH
+
+CONTEXT_TOKEN_BUDGET    = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))     # history tokens per prompt
+CONTEXT_SUMMARIZE_AFTER = int(os.getenv("CONTEXT_SUMMARIZE_AFTER", "600"))   # out-of-window tokens before a fold
+CONTEXT_SUMMARY_TOKENS  = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "300"))    # asked-for summary length
+CONTEXT_MAX_TURNS       = int(os.getenv("CONTEXT_MAX_TURNS", "40"))          # hard cap on unsummarised messages
+CONTEXT_SUMMARIZE       = os.getenv("CONTEXT_SUMMARIZE", "1") == "1"
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token is close enough for budgeting
+    return len(text) // 4 + 1
+
+
+class Turn:
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role, content, tokens=None):
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content) if tokens is None else tokens
+
+
+class ConversationContext:
+    """One conversation: recent turns verbatim, older ones as a summary."""
+    __slots__ = ("turns", "summary", "summary_tokens", "budget", "max_turns", "memory_key", "_fold",
+                 "journal", "on_fold", "version")
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, max_turns=CONTEXT_MAX_TURNS, memory_key="chat_history"):
+        self.turns = deque()
+        self.summary = ""
+        self.summary_tokens = 0
+        self.budget = budget
+        self.max_turns = max_turns
+        self.memory_key = memory_key
+        self._fold = None
+        self.journal = None         # list of ops while a shared session store tracks changes
+        self.on_fold = None         # called with the "fold" op once a background fold lands
+        self.version = 0            # shared-store version this copy was loaded at
+
+    # ── ConversationBufferMemory contract ──────────────────────────────
+    def save_context(self, inputs, outputs):
+        with span("memory_save"):
+            if "input" in inputs:
+                self.add("user", inputs["input"])
+            if "output" in outputs:
+                self.add("assistant", outputs["output"])
+
+    def load_memory_variables(self, _inputs):
+        with span("memory_load"):
+            return {self.memory_key: self.history()}
+
+    def clear(self):
+        self.turns.clear()
+        self.summary, self.summary_tokens = "", 0
+
+    # ── prompt building ────────────────────────────────────────────────
+    def add(self, role: str, content: str):
+        self._append(role, content)
+        if self.journal is not None:
+            self.journal.append(("add", role, content))
+        self._maybe_fold()
+
+    def _append(self, role, content, tokens=None):
+        self.turns.append(Turn(role, content, tokens))
+        while len(self.turns) > self.max_turns:
+            self.turns.popleft()
+            CONTEXT_SUMMARIES.inc(status="dropped")
+
+    def _window(self, budget) -> int:
+        """Index of the oldest turn that still fits in *budget* with the summary."""
+        left = budget - self.summary_tokens
+        i = len(self.turns)
+        while i and self.turns[i - 1].tokens <= left:
+            i -= 1
+            left -= self.turns[i].tokens
+        return i
+
+    def history(self, budget: int = None) -> list:
+        """Messages to put in front of the next user prompt."""
+        budget = self.budget if budget is None else budget
+        start = self._window(budget)
+        messages = []
+        if self.summary:
+            messages.append({"role": "system",
+                             "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        tokens = self.summary_tokens
+        for t in islice(self.turns, start, None):
+            messages.append({"role": t.role, "content": t.content})
+            tokens += t.tokens
+        CONTEXT_TOKENS.observe(tokens)
+        return messages
+
+    # ── rolling summary ────────────────────────────────────────────────
+    def _maybe_fold(self):
+        if not CONTEXT_SUMMARIZE or self._fold is not None:
+            return
+        stale = list(islice(self.turns, self._window(self.budget)))
+        if sum(t.tokens for t in stale) < CONTEXT_SUMMARIZE_AFTER:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return                  # sync caller: the hard cap still applies
+        # fresh context: the fold outlives the request that triggered it
+        self._fold = contextvars.Context().run(loop.create_task, self._summarize(stale))
+
+    async def _summarize(self, stale):
+        previous = self.summary
+        transcript = "\n".join(f"{t.role}: {t.content}" for t in stale)
+        try:
+            with span("context_summary"):
+                summary = await call_llm(summary_prompt(previous, transcript, CONTEXT_SUMMARY_TOKENS),
+                                         priority=PRIORITY_BATCH)
+        except Exception:
+            CONTEXT_SUMMARIES.inc(status="error")
+            return
+        finally:
+            self._fold = None
+        op = ("fold", previous, summary.strip(), [(t.role, t.content) for t in stale])
+        self.apply(op)
+        CONTEXT_SUMMARIES.inc(status="ok")
+        if self.on_fold is not None:
+            self.on_fold(op)
+
+    # ── persistence ────────────────────────────────────────────────────
+    def to_dict(self) -> dict:
+        return {"summary": self.summary, "turns": [(t.role, t.content, t.tokens) for t in self.turns]}
+
+    def load_dict(self, data: dict):
+        self.summary = data["summary"]
+        self.summary_tokens = estimate_tokens(self.summary) if self.summary else 0
+        self.turns.clear()
+        for role, content, tokens in data["turns"]:
+            self._append(role, content, tokens)
+        return self
+
+    def apply(self, op):
+        """Replay one journaled operation (no journaling, no fold)."""
+        if op[0] == "add":
+            self._append(op[1], op[2])
+        elif op[0] == "fold":
+            _, previous, summary, folded = op
+            if self.summary != previous:
+                return              # someone else folded first; theirs stands
+            self.summary = summary
+            self.summary_tokens = estimate_tokens(summary)
+            # turns saved meanwhile went on the right; the cap may already have dropped some folded ones
+            folded = set(map(tuple, folded))
+            while self.turns and (self.turns[0].role, self.turns[0].content) in folded:
+                self.turns.popleft()
@@ -0,0 +1,336 @@
+"""Tiered intent classification: rules -> hashed n-gram model -> LLM.
+
+Only messages neither cheap tier is sure about pay for a ``detect_intent``
+round-trip. Every LLM label is appended to ``INTENT_LOG_PATH`` so the model
+can be retrained from real traffic::
+
+    python -m utils.intent_fast train intent_log.jsonl
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import sys
+import zlib
+from collections import Counter, OrderedDict
+
+from utils.metrics import span, tag
+from utils.providers import detect_intent
+
+LABELS = ("VIEW_WITH_STRATEGY", "VIEW_NO_STRATEGY", "OTHER")
+
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "intent_model.json")
+INTENT_LOG_PATH   = os.getenv("INTENT_LOG_PATH", "intent_log.jsonl")
+INTENT_THRESHOLD  = float(os.getenv("INTENT_FAST_THRESHOLD", "0.9"))
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "4096"))
+INTENT_SHADOW_RATE = float(os.getenv("INTENT_SHADOW_RATE", "0.05"))  # fast answers re-checked by the LLM
+
+_DIM = 1 << 18
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+# ── rules ───────────────────────────────────────────────────────────────
+_CHITCHAT = re.compile(
+    r"^(hi+|hello|hey+|yo|hiya|good (morning|afternoon|evening)|thanks?( you)?|thank u|thx|ty|"
+    r"cheers|bye|goodbye|see you|ok(ay)?|cool|nice|great|lol|how are you)\W*$"
+)
+# the whole message, not its first word: "ok" or "please explain ..." is not a yes
+_YES = re.compile(
+    r"^(y|yes|yeah|yep|yup|sure|go ahead|do it|sounds good|absolutely|definitely)"
+    r"(,? (please|pls|go ahead|do it|thanks?|thank you))?\W*$"
+)
+_NO = re.compile(r"^(no|nope|nah|not now|no thanks|just chat(ting)?|maybe later)\b")
+_ASKS = re.compile(r"\b(strateg(y|ies)|trade ideas?|trades?|setups?|how (should|can|do) i (trade|play|position))\b")
+_DIRECTION = re.compile(
+    r"\b(bull(ish)?|bear(ish)?|outperform|underperform|(expect|think|believe|see)\b.{0,40}?\bto "
+    r"(rise|fall|rally|drop|climb|decline|crash|surge|recover|go (up|down)))\b"
+)
+# the sector words of backtest.SECTOR_TICKERS (not imported: it pulls in numpy)
+_SECTOR = re.compile(
+    r"\b(tech|semiconductors?|semis|telecom|energy|oil|banks?|financials?|health ?care|pharma|"
+    r"consumer|retail|industrials?|utilities|real estate|reits?|gold|crypto|bitcoin)\b"
+)
+_CASHTAG = re.compile(r"\$[A-Za-z]{1,5}\b")
+_UPPER = re.compile(r"\b[A-Z]{2,5}\b")           # on the original case: AI, US, ETF, CEO... as well as tickers
+
+
+def _known_tickers() -> set:
+    # imported here: numpy is only loaded once a message gets this far
+    from utils.backtest import SECTOR_TICKERS
+    from utils.marketdata import available_tickers
+
+    return {t for tickers in SECTOR_TICKERS.values() for t in tickers} | set(available_tickers())
+
+
+def _names_ticker(text: str) -> bool:
+    """A $cashtag, or an upper-case word that is a ticker we know (not just any acronym)."""
+    if _CASHTAG.search(text):
+        return True
+    words = set(_UPPER.findall(text))
+    return bool(words) and not words.isdisjoint(_known_tickers())
+
+
+def _rules(text: str, awaiting_confirmation: bool):
+    """Label only what is unambiguous; ``None`` sends the message to the next tier."""
+    lowered = text.lower()
+    if awaiting_confirmation:
+        if _NO.match(lowered):
+            return "OTHER"
+        if _YES.match(lowered):
+            return "VIEW_WITH_STRATEGY"
+    elif _CHITCHAT.match(lowered):      # "ok" / "thanks" after an offer could be either
+        return "OTHER"
+    if (_ASKS.search(lowered) and _DIRECTION.search(lowered)
+            and (_SECTOR.search(lowered) or _names_ticker(text))):
+        return "VIEW_WITH_STRATEGY"
+    return None
+
+
+# ── hashed n-gram logistic model ────────────────────────────────────────
+def _features(text: str, awaiting_confirmation: bool):
+    words = _TOKEN.findall(text)
+    feats = ["w:" + w for w in words]
+    feats += ["b:" + a + "_" + b for a, b in zip(words, words[1:])]
+    padded = " " + " ".join(words) + " "
+    feats += ["c:" + padded[i:i + 3] for i in range(len(padded) - 2)]
+    feats.append("ctx:confirm" if awaiting_confirmation else "ctx:fresh")
+    # crc32, not hash(): must be stable across processes for saved weights
+    return [zlib.crc32(f.encode()) & (_DIM - 1) for f in feats]
+
+
+class HashedLogisticModel:
+    """Multinomial logistic regression over hashed word/bigram/char-3gram features."""
+
+    def __init__(self, weights=None, bias=None):
+        self.weights = weights or {label: {} for label in LABELS}   # sparse: idx -> w
+        self.bias = bias or {label: 0.0 for label in LABELS}
+
+    @property
+    def trained(self) -> bool:
+        return any(self.weights[label] for label in LABELS)
+
+    def _probs(self, idx):
+        scores = {}
+        for label in LABELS:
+            w = self.weights[label]
+            scores[label] = self.bias[label] + sum(w.get(i, 0.0) for i in idx)
+        top = max(scores.values())
+        exps = {label: math.exp(s - top) for label, s in scores.items()}
+        total = sum(exps.values())
+        return {label: e / total for label, e in exps.items()}
+
+    def predict(self, text: str, awaiting_confirmation=False):
+        probs = self._probs(_features(text, awaiting_confirmation))
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+    def fit(self, examples, epochs=8, lr=0.2, l2=1e-5, seed=0):
+        """*examples*: iterable of ``(text, awaiting_confirmation, label)``."""
+        data = [(_features(_norm(t), c), y) for t, c, y in examples if y in LABELS]
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for idx, y in data:
+                probs = self._probs(idx)
+                for label in LABELS:
+                    grad = probs[label] - (1.0 if label == y else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    w = self.weights[label]
+                    for i in idx:
+                        w[i] = w.get(i, 0.0) * (1 - lr * l2) - lr * grad
+                    self.bias[label] -= lr * grad
+        return self
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"weights": self.weights, "bias": self.bias}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        weights = {label: {int(i): w for i, w in data["weights"][label].items()} for label in LABELS}
+        return cls(weights, data["bias"])
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _squash(text: str) -> str:
+    # cache key and rules input: case kept, tickers are upper-case
+    return " ".join(text.split())
+
+
+# ── tiered classifier ───────────────────────────────────────────────────
+class TieredIntentClassifier:
+
+    def __init__(self, model=None, threshold=INTENT_THRESHOLD, cache_size=INTENT_CACHE_SIZE,
+                 log_path=INTENT_LOG_PATH, shadow_rate=INTENT_SHADOW_RATE):
+        self.model = model or HashedLogisticModel()
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.log_path = log_path
+        self.shadow_rate = shadow_rate
+        self._cache = OrderedDict()
+        self._shadow_tasks = set()
+        self._log_lines = []        # labelled examples not written yet
+        self._log_writer = None     # the executor write in flight
+        self.counts = Counter()
+
+    def fast(self, user_msg: str, awaiting_confirmation=False):
+        """Cheap tiers only. Returns a label, or ``None`` if the LLM is needed."""
+        with span("intent_fast"):
+            return self._fast(user_msg, awaiting_confirmation)
+
+    def _fast(self, user_msg, awaiting_confirmation):
+        text = _squash(user_msg)
+        key = (text, awaiting_confirmation)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.counts["cache"] += 1
+            tag(intent=self._cache[key])
+            return self._cache[key]
+
+        label, tier = _rules(text, awaiting_confirmation), "rules"
+        if label is None and self.model.trained:
+            guess, p = self.model.predict(text.lower(), awaiting_confirmation)
+            if p >= self.threshold:
+                label, tier = guess, "model"
+        if label is None:
+            return None
+
+        self.counts[tier] += 1
+        tag(intent=label)
+        self._remember(key, label)
+        if self.shadow_rate and random.random() < self.shadow_rate:
+            self._shadow(user_msg, label)
+        return label
+
+    async def classify(self, user_msg: str, awaiting_confirmation=False) -> str:
+        label = self.fast(user_msg, awaiting_confirmation)
+        if label is not None:
+            return label
+        return await self.slow(user_msg, awaiting_confirmation)
+
+    async def slow(self, user_msg: str, awaiting_confirmation=False) -> str:
+        """LLM tier; the answer is cached and logged as a training example.
+
+        If the LLM is unavailable (rate limited, circuit open, timeout) the
+        model's best guess is used instead, or ``OTHER`` without a model, and
+        that guess is neither cached nor logged.
+        """
+        try:
+            with span("intent_llm"):
+                label = await detect_intent(user_msg, fallback=None)
+        except Exception:
+            self.counts["llm_errors"] += 1
+            label = self.model.predict(_norm(user_msg), awaiting_confirmation)[0] if self.model.trained else "OTHER"
+            tag(intent=label)
+            return label
+        self.counts["llm"] += 1
+        tag(intent=label)
+        self._remember((_squash(user_msg), awaiting_confirmation), label)
+        self._log(user_msg, awaiting_confirmation, label)
+        return label
+
+    def _remember(self, key, label):
+        self._cache[key] = label
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _log(self, text, awaiting_confirmation, label):
+        if not self.log_path:
+            return
+        self._log_lines.append(json.dumps({"text": text, "awaiting_confirmation": awaiting_confirmation,
+                                           "label": label}) + "\n")
+        if self._log_writer is None:
+            self._flush_log()
+
+    def _flush_log(self, _done=None):
+        # on the loop the file is written in the executor; lines logged meanwhile go in the next write
+        self._log_writer = None
+        if not self._log_lines:
+            return
+        lines, self._log_lines = self._log_lines, []
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._write_log(lines)
+        self._log_writer = loop.run_in_executor(None, self._write_log, lines)
+        self._log_writer.add_done_callback(self._flush_log)
+
+    def _write_log(self, lines):
+        try:
+            with open(self.log_path, "a") as f:
+                f.writelines(lines)
+        except OSError:
+            pass
+
+    async def flush(self):
+        """Wait until every logged example is written."""
+        while self._log_writer is not None:
+            await asyncio.shield(self._log_writer)
+            await asyncio.sleep(0)      # let the done callback start the next write
+
+    def _shadow(self, user_msg, fast_label):
+        # compare against the LLM in the background; never on the request path
+        async def check():
+            try:
+                llm_label = await detect_intent(user_msg, fallback=None)
+            except Exception:
+                return
+            self.counts["shadow_checks"] += 1
+            self.counts["shadow_agree"] += llm_label == fast_label
+        try:
+            task = asyncio.get_running_loop().create_task(check())
+        except RuntimeError:
+            return
+        self._shadow_tasks.add(task)
+        task.add_done_callback(self._shadow_tasks.discard)
+
+    def report(self) -> dict:
+        c = self.counts
+        fast = c["cache"] + c["rules"] + c["model"]
+        total = fast + c["llm"]
+        return {
+            "total": total,
+            "fast_path": fast,
+            "fast_path_fraction": fast / total if total else 0.0,
+            "by_tier": {t: c[t] for t in ("cache", "rules", "model", "llm")},
+            "model_trained": self.model.trained,
+            "threshold": self.threshold,
+            "llm_errors": c["llm_errors"],
+            "shadow_checks": c["shadow_checks"],
+            "agreement_with_llm": c["shadow_agree"] / c["shadow_checks"] if c["shadow_checks"] else None,
+        }
+
+
+def _load_model():
+    if INTENT_MODEL_PATH and os.path.exists(INTENT_MODEL_PATH):
+        return HashedLogisticModel.load(INTENT_MODEL_PATH)
+    return None
+
+
+classifier = TieredIntentClassifier(model=_load_model())
+
+
+def train_from_log(log_path=INTENT_LOG_PATH, model_path=INTENT_MODEL_PATH, **fit_kwargs):
+    with open(log_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    examples = [(r["text"], r.get("awaiting_confirmation", False), r["label"]) for r in rows]
+    model = HashedLogisticModel().fit(examples, **fit_kwargs)
+    model.save(model_path)
+    correct = sum(model.predict(_norm(t), c)[0] == y for t, c, y in examples)
+    return len(examples), correct / len(examples) if examples else 0.0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "train":
+        log = sys.argv[2] if len(sys.argv) > 2 else INTENT_LOG_PATH
+        n, acc = train_from_log(log)
+        print(f"trained on {n} examples, train accuracy {acc:.3f} -> {INTENT_MODEL_PATH}")
+    else:
+        print("usage: python -m utils.intent_fast train [intent_log.jsonl]")
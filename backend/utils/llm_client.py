@@ -1,70 +1,226 @@
-import requests
+import asyncio
 import json
 import os
+from collections import Counter
+
+import httpx
 from dotenv import load_dotenv
-from time import time
 load_dotenv()
 
+from utils.metrics import UPSTREAM_BYTES, UPSTREAM_TOKENS
+from utils.scheduler import LLMScheduler, keys_from_env, PRIORITY_CHAT
+
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY_INTENT")
 OPENROUTER_MODEL = "deepseek/deepseek-chat-v3-0324:free" #
 
-_API = "https://openrouter.ai/api/v1/chat/completions"
-
-_SYSTEM = (
-    "You are an intent classifier for a trading chatbot. "
-    "Return exactly one label from this set:\n"
-    "VIEW_WITH_STRATEGY   - user shares a market/sector view AND explicitly wants trade ideas / strategies\n"
-    "VIEW_NO_STRATEGY     - user shares a market/sector view but does NOT ask for strategies (might just discuss)\n"
-    "OTHER                - any other chit-chat, greeting, question, etc.\n\n"
-    "Output ONLY the label."
-)
-
-def call_openrouter(prompt):
-    response = requests.post(
-        url="https://openrouter.ai/api/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://your-site.com",
-            "X-Title": "TradingStrategyBot"
-        },
-        data=json.dumps({
-            "model": OPENROUTER_MODEL,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        })
+HUGGING_FACE_API_URL = os.getenv("HUGGING_FACE_API_URL", "https://api-inference.huggingface.co/models/mistralai/Mixtral-8x7B-Instruct-v0.1")
+HUGGING_FACE_API_TOKEN = os.getenv("HUGGING_FACE_API_TOKEN")
+
+# overridable so benchmarks/tests can point at a local stand-in (bench/fake_openrouter.py)
+_API = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+_HEADERS = {
+    "Content-Type": "application/json",
+    "HTTP-Referer": "https://your-site.com",
+    "X-Title": "TradingStrategyBot"
+}
+
+# ── connection pool / deadlines ─────────────────────────────────────────
+# connect: TCP+TLS handshake, read: gap between bytes from the provider.
+# Generations are long, intent calls are short, so they get separate read deadlines.
+CONNECT_TIMEOUT  = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT     = float(os.getenv("LLM_READ_TIMEOUT", "90"))
+INTENT_TIMEOUT   = float(os.getenv("LLM_INTENT_TIMEOUT", "15"))
+MAX_CONNECTIONS  = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE    = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+
+try:
+    import h2  # noqa: F401  (httpx only speaks HTTP/2 when h2 is installed)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# identical concurrent requests (same model + normalized messages) share one upstream call
+COALESCE         = os.getenv("LLM_COALESCE", "1") == "1"
+
+# every outbound call goes through its provider's scheduler (key pool, rate
+# limits, Retry-After, circuit breaker, intent-before-generation priority).
+# OPENROUTER_API_KEYS / HUGGING_FACE_API_TOKENS take comma-separated pools.
+openrouter_scheduler  = LLMScheduler("openrouter", keys_from_env("OPENROUTER_API_KEYS", "OPENROUTER_API_KEY_INTENT"))
+huggingface_scheduler = LLMScheduler("huggingface", keys_from_env("HUGGING_FACE_API_TOKENS", "HUGGING_FACE_API_TOKEN"))
+
+_client = None
+_inflight = {}              # key -> [task, waiters]
+_coalesce_counts = Counter()
+
+
+def _timeout(read: float) -> httpx.Timeout:
+    return httpx.Timeout(connect=CONNECT_TIMEOUT, read=read, write=CONNECT_TIMEOUT, pool=CONNECT_TIMEOUT)
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared keep-alive client; created lazily inside the running event loop."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2,
+            timeout=_timeout(READ_TIMEOUT),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_KEEPALIVE),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def _flight_key(model, messages, response_format=None):
+    """Identical requests: same model, output format and conversation (history included)."""
+    fmt = json.dumps(response_format, sort_keys=True) if response_format else None
+    # whitespace only: case matters in these prompts (tickers, code)
+    return (model, fmt) + tuple((m["role"], " ".join(m["content"].split())) for m in messages)
+
+
+def _settle(key, task):
+    if _inflight.get(key, [None])[0] is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()            # retrieved even if every waiter has gone
+
+
+async def _single_flight(key, factory):
+    """Run ``factory()`` once per *key* at a time; concurrent callers share it.
+
+    Errors reach every waiter. A waiter that is cancelled only stops waiting;
+    the upstream call is cancelled once nobody is waiting for it any more.
+    """
+    if not COALESCE:
+        return await factory()
+    entry = _inflight.get(key)
+    if entry is None:
+        task = asyncio.ensure_future(factory())
+        entry = _inflight[key] = [task, 0]
+        task.add_done_callback(lambda t: _settle(key, t))
+        _coalesce_counts["upstream"] += 1
+    else:
+        _coalesce_counts["coalesced"] += 1
+    task = entry[0]
+    entry[1] += 1
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if entry[1] == 1 and not task.done():
+            task.cancel()
+        raise
+    finally:
+        entry[1] -= 1
+
+
+def coalesce_stats() -> dict:
+    total = _coalesce_counts["upstream"] + _coalesce_counts["coalesced"]
+    return {
+        "enabled": COALESCE,
+        "upstream_calls": _coalesce_counts["upstream"],
+        "coalesced_calls": _coalesce_counts["coalesced"],
+        "coalesced_fraction": _coalesce_counts["coalesced"] / total if total else 0.0,
+        "in_flight": len(_inflight),
+    }
+
+
+def scheduler_stats() -> dict:
+    return {s.name: s.stats() for s in (openrouter_scheduler, huggingface_scheduler)}
+
+
+def _auth(key):
+    return {**_HEADERS, "Authorization": f"Bearer {key}"}
+
+
+def _count_upstream(provider, response, received=None, usage=None):
+    UPSTREAM_BYTES.inc(len(response.request.content), provider=provider, direction="sent")
+    UPSTREAM_BYTES.inc(len(response.content) if received is None else received,
+                       provider=provider, direction="received")
+    if usage:
+        UPSTREAM_TOKENS.inc(usage.get("prompt_tokens") or 0, provider=provider, kind="prompt")
+        UPSTREAM_TOKENS.inc(usage.get("completion_tokens") or 0, provider=provider, kind="completion")
+
+
+async def _post_openrouter(messages, timeout, priority=PRIORITY_CHAT, model=OPENROUTER_MODEL, response_format=None):
+    client = get_client()
+    payload = {"model": model, "messages": messages}
+    if response_format is not None:
+        payload["response_format"] = response_format
+    response = await openrouter_scheduler.request(
+        lambda key: client.post(
+            _API,
+            headers=_auth(key),
+            json=payload,
+            timeout=_timeout(timeout),
+        ),
+        priority,
     )
-    # time.sleep(2)
     response.raise_for_status()
     llm_response = response.json()
-    return llm_response["choices"][0]["message"]["content"] 
+    _count_upstream("openrouter", response, usage=llm_response.get("usage"))
+    return llm_response["choices"][0]["message"]["content"]
 
 
-def detect_intent(user_msg: str) -> str:
+async def _stream_openrouter(messages, timeout, priority=PRIORITY_CHAT, model=OPENROUTER_MODEL):
+    """Yield content deltas from a streamed (SSE) chat completion."""
+    client = get_client()
+    response = await openrouter_scheduler.request(
+        lambda key: client.send(
+            client.build_request(
+                "POST",
+                _API,
+                headers=_auth(key),
+                json={
+                    "model": model,
+                    "messages": messages,
+                    "stream": True,
+                },
+                timeout=_timeout(timeout),
+            ),
+            stream=True,
+        ),
+        priority,
+    )
+    received, usage = 0, None
     try:
-        # time.sleep(2)
-        response = requests.post(
-            url=_API,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://your-site.com",
-                "X-Title": "TradingStrategyBot"
-            },
-            data=json.dumps({
-                "model": OPENROUTER_MODEL,
-                "messages": [
-                    {"role": "system", "content": _SYSTEM},
-                    {"role": "user", "content": user_msg}
-                ]
-            })
-        )
         response.raise_for_status()
-        llm_response = response.json()
-        label = llm_response["choices"][0]["message"]["content"].strip().upper()
-        if label not in {"VIEW_WITH_STRATEGY", "VIEW_NO_STRATEGY", "OTHER"}:
-            label = "OTHER"
-        return label
-    except Exception:
-        return "OTHER"
+        async for line in response.aiter_lines():
+            received += len(line) + 1
+            # skip blank keep-alives and ": OPENROUTER PROCESSING" comments
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or usage
+            delta = chunk["choices"][0].get("delta", {}).get("content") if chunk.get("choices") else None
+            if delta:
+                yield delta
+    finally:
+        await response.aclose()
+        _count_upstream("openrouter", response, received, usage)
+
+
+async def _post_huggingface(prompt, timeout, priority=PRIORITY_CHAT, url=HUGGING_FACE_API_URL):
+    client = get_client()
+    response = await huggingface_scheduler.request(
+        lambda key: client.post(
+            url,
+            headers={"Authorization": f"Bearer {key}"},
+            # completion only; by default the prompt (and its format template) is echoed back
+            json={"inputs": prompt, "parameters": {"return_full_text": False}},
+            timeout=_timeout(timeout),
+        ),
+        priority,
+    )
+    response.raise_for_status()
+    _count_upstream("huggingface", response)
+    return response.json()[0]["generated_text"]
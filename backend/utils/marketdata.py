@@ -0,0 +1,340 @@
+"""Local daily OHLCV price history in a memory-mapped columnar store.
+
+Layout of ``MARKET_DATA_DIR``::
+
+    index.json                tickers -> [offset, length, capacity], plus rows / generation
+    dates.<gen>.bin           int64 days since 1970-01-01
+    open.<gen>.bin ...        float64, one file per field (open, high, low, close, volume)
+
+Every column file holds all tickers; a ticker owns the contiguous rows
+``offset .. offset + capacity`` in each of them, oldest bar first, the
+first ``length`` of which are filled. Readers ``np.memmap`` the files
+read-only, so ``bars()`` returns zero-copy views and every worker process
+on the machine shares the same page-cache pages instead of parsing and
+holding its own copy. Dates within a ticker are sorted, which makes
+``searchsorted`` on the dates view the date-to-row index for range slices.
+
+A new ticker gets 25% spare capacity. Appending bars writes them into it in
+place; when that runs out, the ticker's rows move to the end of the files
+with double the capacity (nothing else is rewritten). ``compact()`` reclaims the space
+left behind, writing a new generation of files. Writers take an exclusive
+``flock``; ``index.json`` is replaced atomically after the data is on disk,
+and readers pick up a new index on their next call.
+
+Fill it from vendor CSV / Parquet files (``Date, Open, High, Low, Close,
+Volume`` columns in any order and case, optionally a ``Ticker``/``Symbol``
+column; otherwise the file name is the ticker)::
+
+    cd backend && python -m utils.marketdata ingest ~/downloads/*.csv
+    cd backend && python -m utils.marketdata info
+"""
+import argparse
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import numpy as np
+
+MARKET_DATA_DIR = os.getenv("MARKET_DATA_DIR", "market_data")
+
+FIELDS = ("open", "high", "low", "close", "volume")
+COLUMNS = ("dates",) + FIELDS
+_DTYPES = {"dates": np.int64, **dict.fromkeys(FIELDS, np.float64)}
+_ITEMSIZE = 8
+_MIN_CAPACITY = 256
+
+
+class Bars(NamedTuple):
+    """Aligned arrays for one ticker; ``dates`` is ``datetime64[D]``, the rest float64."""
+    dates: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def between(self, start=None, end=None) -> "Bars":
+        """Bars with ``start <= date <= end`` (either bound optional); views, not copies."""
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(start, "D"), "left")
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(end, "D"), "right")
+        return Bars(*(a[lo:hi] for a in self))
+
+
+class MarketDataStore:
+    """Readers and the (single, locked) writer of one store directory."""
+
+    def __init__(self, path: str = None):
+        self.path = path or MARKET_DATA_DIR
+        self._index = {}            # ticker -> (offset, length, capacity)
+        self._rows = 0
+        self._generation = 0
+        self._columns = {}
+        self._mapped = (0, 0)       # (rows, generation) the column maps cover
+        self._stamp = None
+
+    # ── reading ─────────────────────────────────────────────────────────
+    def _file(self, column, generation=None):
+        return os.path.join(self.path, f"{column}.{self._generation if generation is None else generation}.bin")
+
+    def _refresh(self):
+        """Reload the index (and remap the columns) if another process changed it."""
+        try:
+            st = os.stat(os.path.join(self.path, "index.json"))
+        except FileNotFoundError:
+            self._index, self._rows, self._columns, self._mapped, self._stamp = {}, 0, {}, (0, 0), None
+            return
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+        with open(os.path.join(self.path, "index.json")) as f:
+            data = json.load(f)
+        self._index = {t: tuple(v) for t, v in data["tickers"].items()}
+        self._rows, self._generation = data["rows"], data["generation"]
+        if (self._rows, self._generation) != self._mapped:
+            self._columns = {c: np.memmap(self._file(c), dtype=_DTYPES[c], mode="r", shape=(self._rows,))
+                             for c in COLUMNS} if self._rows else {}
+            self._mapped = (self._rows, self._generation)
+        self._stamp = stamp
+
+    def tickers(self) -> list:
+        self._refresh()
+        return sorted(t for t, (_, length, _) in self._index.items() if length)
+
+    def __contains__(self, ticker) -> bool:
+        self._refresh()
+        return ticker.upper() in self._index
+
+    def bars(self, ticker: str, start=None, end=None) -> Bars:
+        """Zero-copy views of *ticker*'s bars, optionally limited to ``start..end``; ``KeyError`` if unknown."""
+        self._refresh()
+        offset, length, _ = self._index[ticker.upper()]
+        rows = slice(offset, offset + length)
+        bars = Bars(self._columns["dates"][rows].view("datetime64[D]").view(np.ndarray),
+                    *(self._columns[f][rows].view(np.ndarray) for f in FIELDS))
+        return bars if start is None and end is None else bars.between(start, end)
+
+    def stats(self) -> dict:
+        self._refresh()
+        used = sum(length for _, length, _ in self._index.values())
+        return {"tickers": len(self._index), "bars": used, "rows": self._rows,
+                "bytes": self._rows * _ITEMSIZE * len(COLUMNS), "generation": self._generation}
+
+    # ── writing ─────────────────────────────────────────────────────────
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._stamp = None          # always start from the index on disk
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_index(self):
+        tmp = os.path.join(self.path, "index.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"rows": self._rows, "generation": self._generation,
+                       "tickers": {t: list(v) for t, v in sorted(self._index.items())}}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, "index.json"))
+        self._stamp = None
+
+    @staticmethod
+    def _write(handles, row, values):
+        for column, f in handles.items():
+            f.seek(row * _ITEMSIZE)
+            f.write(np.ascontiguousarray(values[column], dtype=_DTYPES[column]).tobytes())
+
+    @contextmanager
+    def _open_columns(self, generation=None):
+        handles = {}
+        try:
+            for c in COLUMNS:
+                path = self._file(c, generation)
+                handles[c] = open(path, "r+b" if os.path.exists(path) else "w+b")
+            yield handles
+            for f in handles.values():
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def append(self, ticker: str, bars: Bars) -> int:
+        """Add *bars* (any order) after *ticker*'s last date; returns how many were new."""
+        ticker = ticker.upper()
+        with self._locked():
+            with self._open_columns() as handles:         # data is fsynced before the index names it
+                added = self._append(handles, ticker, bars)
+            if added:
+                self._write_index()
+        return added
+
+    def _append(self, handles, ticker, bars):
+        days = np.asarray(bars.dates, dtype="datetime64[D]").astype(np.int64)
+        order = np.argsort(days, kind="stable")
+        offset, length, capacity = self._index.get(ticker, (self._rows, 0, 0))
+        new = days[order]
+        keep = np.r_[new[1:] != new[:-1], True] if len(new) else np.zeros(0, bool)   # last bar per day wins
+        if length:
+            keep &= new > self._columns["dates"][offset + length - 1]
+        order = order[keep]
+        if not len(order):
+            return 0
+        values = {"dates": days[order], **{f: np.asarray(getattr(bars, f), np.float64)[order] for f in FIELDS}}
+
+        if length + len(order) > capacity:
+            # move the ticker to the end of the files with room to grow; old rows become free space
+            old = {c: np.array(self._columns[c][offset:offset + length]) for c in COLUMNS} if length else None
+            wanted = length + len(order)
+            capacity = max(_MIN_CAPACITY, 2 * wanted if length else wanted + wanted // 4)
+            offset, self._rows = self._rows, self._rows + capacity
+            for f in handles.values():
+                f.truncate(self._rows * _ITEMSIZE)
+            if old is not None:
+                self._write(handles, offset, old)
+        self._write(handles, offset + length, values)
+        self._index[ticker] = (offset, length + len(order), capacity)
+        return len(order)
+
+    def compact(self, headroom: float = 0.25):
+        """Rewrite every ticker contiguously (with *headroom* spare capacity) into a new generation."""
+        with self._locked():
+            generation = self._generation + 1
+            index, row = {}, 0
+            with self._open_columns(generation) as handles:
+                for ticker, (offset, length, _) in sorted(self._index.items()):
+                    capacity = max(_MIN_CAPACITY, int(length * (1 + headroom)))
+                    for f in handles.values():
+                        f.truncate((row + capacity) * _ITEMSIZE)
+                    self._write(handles, row, {c: self._columns[c][offset:offset + length] for c in COLUMNS})
+                    index[ticker] = (row, length, capacity)
+                    row += capacity
+            previous = self._generation
+            self._index, self._rows, self._generation = index, row, generation
+            self._write_index()
+            for c in COLUMNS:           # open maps of the old files stay valid until unmapped
+                try:
+                    os.remove(self._file(c, previous))
+                except FileNotFoundError:
+                    pass
+
+    # ── ingestion ───────────────────────────────────────────────────────
+    def ingest(self, *paths: str, ticker: str = None) -> dict:
+        """Append CSV / Parquet files under one lock; returns ``{ticker: bars added}``.
+
+        The files are read first and each ticker's rows merged (later files win
+        a date), so every ticker is written once: ``_append`` reads existing
+        rows through maps taken when the lock was, which a second write of the
+        same ticker would have outdated.
+        """
+        batches = {}
+        for path in paths:
+            for name, bars in read_file(path, ticker):
+                batches.setdefault(name.upper(), []).append(bars)
+        added = {}
+        with self._locked():
+            with self._open_columns() as handles:
+                for name, parts in batches.items():
+                    bars = parts[0] if len(parts) == 1 else Bars(*(np.concatenate(c) for c in zip(*parts)))
+                    added[name] = self._append(handles, name, bars)
+            if any(added.values()):
+                self._write_index()
+        return added
+
+
+# ── file readers ────────────────────────────────────────────────────────
+def _split(columns: dict, path: str, ticker: str = None):
+    """``(ticker, Bars)`` per ticker in a table of lower-cased column name -> array."""
+    missing = [c for c in ("date",) + FIELDS if c not in columns]
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+    dates = np.asarray(columns["date"]).astype("datetime64[D]")
+    values = [np.asarray(columns[f], dtype=np.float64) for f in FIELDS]
+    names = columns.get("ticker", columns.get("symbol"))
+    if names is None or ticker is not None:
+        name = ticker or os.path.splitext(os.path.basename(path))[0]
+        yield name, Bars(dates, *values)
+        return
+    names = np.asarray(names).astype(str)
+    for name in np.unique(names):
+        rows = names == name
+        yield str(name), Bars(dates[rows], *(v[rows] for v in values))
+
+
+def read_file(path: str, ticker: str = None):
+    if path.lower().endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("reading Parquet needs pyarrow: pip install pyarrow") from None
+        table = pq.read_table(path)
+        columns = {name.strip().lower(): table.column(name).to_numpy() for name in table.column_names}
+        return _split(columns, path, ticker)
+    with open(path) as f:
+        header = [h.strip().lower() for h in f.readline().split(",")]
+    columns = {}
+    numeric = [i for i, h in enumerate(header) if h in FIELDS]
+    if numeric:
+        table = np.loadtxt(path, delimiter=",", skiprows=1, usecols=numeric, dtype=np.float64, ndmin=2)
+        columns.update((header[i], table[:, j]) for j, i in enumerate(numeric))
+    for i, h in enumerate(header):
+        if h in ("date", "ticker", "symbol"):
+            columns[h] = np.loadtxt(path, delimiter=",", skiprows=1, usecols=i, ndmin=1,
+                                    dtype="datetime64[D]" if h == "date" else str)
+    return _split(columns, path, ticker)
+
+
+# ── module API ──────────────────────────────────────────────────────────
+_stores = {}
+
+
+def open_store(path: str = None) -> MarketDataStore:
+    """The process-wide store for *path* (default ``MARKET_DATA_DIR``)."""
+    path = os.path.abspath(path or MARKET_DATA_DIR)
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = MarketDataStore(path)
+    return store
+
+
+def available_tickers(data_dir: str = None) -> list:
+    return open_store(data_dir).tickers()
+
+
+def load_bars(ticker: str, data_dir: str = None, start=None, end=None) -> Bars:
+    """Bars of *ticker* (zero-copy views), optionally ``start..end``; ``KeyError`` if unknown."""
+    return open_store(data_dir).bars(ticker, start, end)
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="python -m utils.marketdata")
+    ap.add_argument("--data-dir", default=MARKET_DATA_DIR)
+    sub = ap.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="append CSV / Parquet files (or directories of them)")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--ticker", help="ticker for a single file without a ticker column")
+    sub.add_parser("compact", help="reclaim space left by relocated tickers")
+    sub.add_parser("info")
+    args = ap.parse_args()
+
+    store = open_store(args.data_dir)
+    if args.command == "ingest":
+        files = []
+        for p in args.paths:
+            files += sorted(os.path.join(p, f) for f in os.listdir(p)) if os.path.isdir(p) else [p]
+        files = [f for f in files if f.lower().endswith((".csv", ".parquet", ".pq"))]
+        added = store.ingest(*files, ticker=args.ticker)
+        print(", ".join(f"{t} +{n}" for t, n in added.items()))
+    elif args.command == "compact":
+        store.compact()
+    print(json.dumps(store.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,74 @@
-from langchain.memory import ConversationBufferMemory
-from langchain.memory.chat_message_histories import ChatMessageHistory
+"""Conversation memory for the single-conversation backends.
 
-# memory = ConversationBufferMemory(
-#     return_messages=True,
-#     chat_memory=ChatMessageHistory()
-# ) 
-# utils/memory.py
+Same calls as LangChain's ``ConversationBufferMemory`` (``save_context`` /
+``load_memory_variables``) without importing LangChain, which alone cost
+seconds of worker start-up. Turns are kept in a token-budgeted
+``ConversationContext``; any other keys saved in *outputs* (e.g.
+``awaiting_strategy_confirmation`` / ``last_view``) are kept as-is and come
+back from ``load_memory_variables`` next to the history.
+"""
+from utils.context import ConversationContext
+from utils.metrics import span
 
-memory = ConversationBufferMemory(
+_PREFIXES = {"user": "Human", "assistant": "AI", "system": "System"}
+
+
+def format_history(messages) -> str:
+    """``Human: ...`` / ``AI: ...`` transcript, as with ``return_messages=False``."""
+    return "\n".join(f"{_PREFIXES.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+
+class ConversationMemory(ConversationContext):
+    __slots__ = ("input_key", "output_key", "return_messages", "variables")
+
+    def __init__(self, memory_key="chat_history", input_key="input", output_key="output",
+                 return_messages=False, **context):
+        super().__init__(memory_key=memory_key, **context)
+        self.input_key = input_key
+        self.output_key = output_key
+        self.return_messages = return_messages
+        self.variables = {}
+
+    def save_context(self, inputs, outputs):
+        with span("memory_save"):
+            if self.input_key in inputs:
+                self.add("user", inputs[self.input_key])
+            if self.output_key in outputs:
+                self.add("assistant", outputs[self.output_key])
+            for k, v in outputs.items():
+                if k != self.output_key:
+                    self.variables[k] = v
+                    if self.journal is not None:
+                        self.journal.append(("var", k, v))
+
+    def load_memory_variables(self, _inputs):
+        with span("memory_load"):
+            history = self.history()
+            return {**self.variables,
+                    self.memory_key: history if self.return_messages else format_history(history)}
+
+    def clear(self):
+        super().clear()
+        self.variables.clear()
+
+    def to_dict(self) -> dict:
+        return {**super().to_dict(), "variables": self.variables}
+
+    def load_dict(self, data: dict):
+        super().load_dict(data)
+        self.variables = dict(data["variables"])
+        return self
+
+    def apply(self, op):
+        if op[0] == "var":
+            self.variables[op[1]] = op[2]
+        else:
+            super().apply(op)
+
+
+memory = ConversationMemory(
     memory_key="chat_history",
     input_key="input",
     output_key="output",
     return_messages=True
-)
\ No newline at end of file
+)
@@ -0,0 +1,221 @@
+"""Per-stage timing, counters and a Prometheus text endpoint.
+
+Wrap a stage in ``with span("parse"):``. Inside a request (see
+``MetricsMiddleware``) stage timings are buffered and flushed at the end of
+the request with its intent branch as a label (``tag(intent=...)``); outside
+one they are recorded straight away. Hot-path cost is two ``perf_counter``
+calls and a list append.
+
+Set ``METRICS_OTEL=1`` to also emit each request and stage as OpenTelemetry
+spans through the globally configured tracer provider (``opentelemetry-api``;
+install the SDK and an exporter to ship them anywhere).
+"""
+import bisect
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+METRICS_OTEL = os.getenv("METRICS_OTEL", "0") == "1"
+
+_tracer = None
+if METRICS_OTEL:
+    try:
+        from opentelemetry import trace as _otel_trace
+        _tracer = _otel_trace.get_tracer("tradegpt")
+    except ImportError:
+        pass
+
+_REGISTRY = []
+
+_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self._values = {}
+        _REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, v in self._values.items():
+            yield f"{self.name}{_fmt_labels(self.labelnames, key)} {v}"
+
+
+class Histogram:
+
+    def __init__(self, name, help, labels=(), buckets=_LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}           # key -> [bucket counts..., sum, count]
+        _REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        row = self._values.get(key)
+        if row is None:
+            row = self._values[key] = [0] * (len(self.buckets) + 2)
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, row in self._values.items():
+            labels = _fmt_labels(self.labelnames, key)
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = _fmt_labels(self.labelnames, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _fmt_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{le} {row[-1]}"
+            yield f"{self.name}_sum{labels} {row[-2]}"
+            yield f"{self.name}_count{labels} {row[-1]}"
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format (0.0.4)."""
+    return "\n".join(line for metric in _REGISTRY for line in metric.render()) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_SECONDS   = Histogram("tradegpt_request_seconds", "End-to-end request latency.",
+                              ("endpoint", "intent", "status"))
+STAGE_SECONDS     = Histogram("tradegpt_stage_seconds", "Time spent per pipeline stage.",
+                              ("stage", "intent"))
+PARSE_FAILURES    = Counter("tradegpt_parse_failures_total",
+                            "LLM answers that parsed into fewer than 3 strategies.", ("source",))
+STRATEGY_PARSES   = Counter("tradegpt_strategy_parses_total",
+                            "Strategy answers by model, parser (json/regex) and result (ok/short).",
+                            ("model", "format", "result"))
+STRATEGY_REPAIRS  = Counter("tradegpt_strategy_repairs_total",
+                            "Repair calls for short answers / missing metrics, by outcome.", ("kind", "result"))
+MISSING_FIELDS    = Counter("tradegpt_missing_metric_fields_total",
+                            "Strategy metrics the LLM left out or that did not parse.", ("field",))
+TOO_FEW_STRATEGIES = Counter("tradegpt_fewer_than_3_strategies_errors_total",
+                             "Requests answered with the 'fewer than 3 strategies' error.", ("endpoint",))
+UPSTREAM_TOKENS   = Counter("tradegpt_upstream_tokens_total", "Tokens reported by the LLM provider.",
+                            ("provider", "kind"))
+CONTEXT_TOKENS    = Histogram("tradegpt_context_tokens", "Conversation history tokens sent with a prompt.",
+                              buckets=(0, 50, 100, 250, 500, 1000, 1500, 2000, 3000, 5000, 10000))
+CONTEXT_SUMMARIES = Counter("tradegpt_context_summaries_total",
+                            "Rolling-summary folds (ok/error) and turns dropped by the hard cap.", ("status",))
+UPSTREAM_BYTES    = Counter("tradegpt_upstream_bytes_total", "Bytes exchanged with the LLM provider.",
+                            ("provider", "direction"))
+
+
+# ── request scope / spans ───────────────────────────────────────────────
+_request = contextvars.ContextVar("tradegpt_request", default=None)
+
+
+class _RequestState:
+    __slots__ = ("tags", "stages")
+
+    def __init__(self):
+        self.tags = {}
+        self.stages = []            # (stage, seconds, start_ns)
+
+
+def tag(**tags):
+    """Attach labels (e.g. ``intent``) to the current request's metrics."""
+    state = _request.get()
+    if state is not None:
+        state.tags.update(tags)
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    start_ns = time.time_ns() if _tracer is not None else 0
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        state = _request.get()
+        if state is None:
+            STAGE_SECONDS.observe(elapsed, stage=stage, intent="")
+            if _tracer is not None:
+                _tracer.start_span(stage, start_time=start_ns).end()
+        else:
+            state.stages.append((stage, elapsed, start_ns))
+
+
+def record_strategies(strategies, source):
+    """Count parse failures and missing metric fields for one parsed answer."""
+    if len(strategies) < 3:
+        PARSE_FAILURES.inc(source=source)
+    for s in strategies:
+        for field in s.get("missing_fields", ()):
+            MISSING_FIELDS.inc(field=field)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency by endpoint/intent/status, then the buffered stages.
+
+    Pure ASGI rather than ``BaseHTTPMiddleware`` so streamed responses are
+    timed until their last byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        root = _tracer.start_span(f"{scope['method']} {scope['path']}") if _tracer is not None else None
+        state = _RequestState()
+        token = _request.set(state)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request.reset(token)
+            # route template, not the raw path, so label cardinality stays bounded
+            endpoint = getattr(scope.get("route"), "path", "unmatched")
+            intent = state.tags.get("intent", "")
+            REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                    endpoint=endpoint, intent=intent, status=status[0])
+            for stage, elapsed, _ in state.stages:
+                STAGE_SECONDS.observe(elapsed, stage=stage, intent=intent)
+            if root is not None:
+                parent = _otel_trace.set_span_in_context(root)
+                for stage, elapsed, start_ns in state.stages:
+                    child = _tracer.start_span(stage, context=parent, start_time=start_ns)
+                    child.end(end_time=start_ns + int(elapsed * 1e9))
+                root.set_attribute("tradegpt.intent", intent)
+                root.set_attribute("http.status_code", status[0])
+                root.end()
@@ -0,0 +1,208 @@
+"""Monte Carlo tail risk of a daily return series: VaR, CVaR and drawdowns.
+
+``simulate()`` resamples a return series into ``paths`` paths of ``horizon``
+bars and reports, over the path outcomes,
+
+    var            the return at the (1 - confidence) quantile, e.g. 95% VaR
+                   -4.1 = a 5% chance of losing 4.1% or more over the horizon
+    cvar           the mean return of the paths at or below that quantile
+    max_drawdown   percentiles of the worst peak-to-trough fall along a path
+    fan            return percentiles at points along the horizon
+    distributions  histograms of the final return and of the max drawdown
+
+all in percent, like ``compute_metrics``. Resampling is a circular block
+bootstrap: each path is stitched from blocks of ``block`` consecutive bars
+(``block=1`` is the plain i.i.d. bootstrap), which keeps the volatility
+clustering and autocorrelation a shuffled series would lose. The default
+block length is ``n ** (1/3)`` for ``n`` observations.
+
+Paths are generated in chunks of whole-matrix NumPy sized to
+``MC_CHUNK_MB`` of working memory: one gather of whole blocks from a
+sliding-window view of the (wrapped) log returns, then ``cumsum`` and
+``maximum.accumulate`` along each path. Only the final return and the max
+drawdown of every path are kept; the fan comes from the first
+``MC_FAN_PATHS`` paths, which are as random a sample as any. Each run of
+``_UNIT`` paths draws from its own stream spawned from ``seed``, so the same
+seed gives the same numbers whatever the chunk size.
+
+Return series come from ``position_returns`` (fixed weights in local
+tickers) or ``strategy_returns`` (a backtest template, see backtest.py).
+"""
+import asyncio
+import functools
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils import backtest as bt
+from utils.marketdata import Bars, available_tickers, load_bars
+
+MC_PATHS     = int(os.getenv("MC_PATHS", "10000"))
+MC_MAX_PATHS = int(os.getenv("MC_MAX_PATHS", "200000"))
+MC_HORIZON   = int(os.getenv("MC_HORIZON", str(bt.BARS_PER_MONTH)))     # bars per path
+MC_MAX_HORIZON = int(os.getenv("MC_MAX_HORIZON", str(10 * bt.BARS_PER_YEAR)))
+MC_CHUNK_MB  = float(os.getenv("MC_CHUNK_MB", "64"))                     # working memory per chunk
+MC_FAN_PATHS = int(os.getenv("MC_FAN_PATHS", "10000"))                   # paths behind the fan chart
+
+CONFIDENCE = (0.95, 0.99)
+DRAWDOWN_PERCENTILES = (50, 90, 95, 99)
+FAN_PERCENTILES = (5, 25, 50, 75, 95)
+FAN_POINTS = 64
+_UNIT = 1024                    # paths per random stream
+
+
+def _pct(x):
+    return round(float(x) * 100, 2)
+
+
+def _histogram(values, bins):
+    counts, edges = np.histogram(values, bins=bins)
+    return {"edges": [_pct(e) for e in edges], "counts": counts.tolist()}
+
+
+def simulate(returns, paths: int = None, horizon: int = None, block: int = None, seed: int = 0,
+             confidence=CONFIDENCE, bins: int = 50) -> dict:
+    """VaR, CVaR, drawdown percentiles and chart data for *paths* block-bootstrapped paths.
+
+    *returns* are simple per-bar returns (0.01 = 1%). ``ValueError`` if there
+    are fewer than two of them or one is -100% or worse, or if *paths*,
+    *horizon* or *block* is out of range (``MC_MAX_PATHS``, ``MC_MAX_HORIZON``,
+    the number of returns).
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    r = r[np.isfinite(r)]
+    if len(r) < 2:
+        raise ValueError("need at least two returns to resample")
+    if (r <= -1).any():
+        raise ValueError("returns must be above -100%")
+    if not all(0 < c < 1 for c in confidence):
+        raise ValueError("confidence levels must be between 0 and 1")
+    n = len(r)
+    paths = MC_PATHS if paths is None else paths
+    horizon = MC_HORIZON if horizon is None else horizon
+    if not 1 <= paths <= MC_MAX_PATHS:
+        raise ValueError(f"paths must be between 1 and {MC_MAX_PATHS}")
+    if not 1 <= horizon <= MC_MAX_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {MC_MAX_HORIZON} bars")
+    if block is not None and not 1 <= block <= n:
+        raise ValueError(f"block must be between 1 and {n} (the number of returns)")
+    block = max(1, min(block or int(round(n ** (1 / 3))), horizon))
+    log_r = np.log1p(r)
+    windows = sliding_window_view(np.concatenate([log_r, log_r[:block - 1]]), block)   # circular
+    blocks = -(-horizon // block)
+    steps = np.unique(np.linspace(0, horizon - 1, min(horizon, FAN_POINTS)).round().astype(np.int64))
+
+    final = np.empty(paths)
+    drawdown = np.empty(paths)
+    fan_paths = min(paths, MC_FAN_PATHS)
+    fan = np.empty((len(steps), fan_paths), np.float32)     # one contiguous row per point, for the percentiles
+    units = -(-paths // _UNIT)
+    streams = np.random.SeedSequence(seed).spawn(units)
+    # path + running peak, 8 bytes each per bar
+    chunk = max(1, int(MC_CHUNK_MB * 2 ** 20 // (16 * blocks * block * _UNIT))) * _UNIT
+
+    for lo in range(0, paths, chunk):
+        hi = min(lo + chunk, paths)
+        starts = np.concatenate([np.random.default_rng(streams[u]).integers(0, n, (_UNIT, blocks))
+                                 for u in range(lo // _UNIT, -(-hi // _UNIT))])[:hi - lo]
+        path = windows[starts].reshape(hi - lo, -1)
+        if path.shape[1] != horizon:
+            path = np.ascontiguousarray(path[:, :horizon])
+        np.cumsum(path, axis=1, out=path)
+        peak = np.maximum.accumulate(path, axis=1)
+        np.maximum(peak, 0.0, out=peak)             # the starting value is a peak too
+        np.subtract(path, peak, out=peak)
+        drawdown[lo:hi] = peak.min(axis=1)
+        final[lo:hi] = path[:, -1]
+        if lo < fan_paths:
+            fan[:, lo:min(hi, fan_paths)] = path[:fan_paths - lo, steps].T
+
+    final, drawdown = np.expm1(final), np.expm1(drawdown)
+    var, cvar = {}, {}
+    for c in confidence:
+        cut = np.quantile(final, 1 - c)
+        key = f"{c * 100:g}"
+        var[key] = _pct(cut)
+        cvar[key] = _pct(final[final <= cut].mean())
+    fan_q = np.expm1(np.percentile(fan, FAN_PERCENTILES, axis=1))
+    return {
+        "paths": paths, "horizon": horizon, "block": block, "seed": seed, "observations": n,
+        "expected_return": _pct(final.mean()),
+        "prob_loss": _pct((final < 0).mean()),
+        "var": var,
+        "cvar": cvar,
+        "max_drawdown": {f"p{p}": _pct(np.percentile(drawdown, 100 - p)) for p in DRAWDOWN_PERCENTILES},
+        "fan": {"x": (steps + 1).tolist(),
+                "percentiles": {f"p{p}": [_pct(v) for v in row] for p, row in zip(FAN_PERCENTILES, fan_q)}},
+        "distributions": {"return": _histogram(final, bins), "max_drawdown": _histogram(drawdown, bins)},
+    }
+
+
+# ── return series ───────────────────────────────────────────────────────
+def _aligned(tickers, start, end, data_dir):
+    """Bars of *tickers* on the dates they all have."""
+    bars = {t: load_bars(t, data_dir, start, end) for t in tickers}
+    dates = functools.reduce(np.intersect1d, (b.dates for b in bars.values()))
+    return {t: Bars(*(a[np.isin(b.dates, dates)] for a in b)) for t, b in bars.items()}
+
+
+def position_returns(weights: dict, start=None, end=None, data_dir: str = None):
+    """Daily returns of holding *weights* (ticker -> fraction of capital, rebalanced daily)."""
+    weights = {t.upper(): float(w) for t, w in weights.items()}
+    bars = _aligned(weights, start, end, data_dir)
+    return sum(w * bt._pct_change(bars[t].close)[1:] for t, w in weights.items())
+
+
+def strategy_returns(template: str, tickers, params: dict = None, start=None, end=None, data_dir: str = None):
+    """Daily returns of *template* run on each of *tickers*, equally weighted, from its first position on."""
+    bt.check_params(template, params or {})
+    tickers = [t.upper() for t in tickers]
+    names = tickers + ([bt.BACKTEST_BENCHMARK] if template == "pairs" else [])
+    bars = _aligned(dict.fromkeys(names), start, end, data_dir)
+    benchmark = bars.get(bt.BACKTEST_BENCHMARK)
+    runs = [bt.run(template, bars[t], params, benchmark) for t in tickers]
+    returns = np.mean([r for r, _ in runs], axis=0)
+    active = np.flatnonzero(np.any([held != 0 for _, held in runs], axis=0))
+    if not len(active):
+        raise ValueError(f"{template} never took a position on {', '.join(tickers)}")
+    return returns[active[0]:]
+
+
+def risk(returns=None, position: dict = None, template: str = None, tickers=None, view: str = None,
+         params: dict = None, years: float = None, data_dir: str = None, **kwargs) -> dict:
+    """``simulate()`` on *returns*, on a *position*, or on *template* over *tickers* (or the view's).
+
+    Positions and templates use the last *years* (default ``BACKTEST_YEARS``)
+    of local history. ``ValueError`` for a bad request or missing data.
+    """
+    if sum(x is not None for x in (returns, position, template)) != 1:
+        raise ValueError("give exactly one of returns, position or template")
+    source = {"kind": "returns"}
+    if returns is None:
+        have = set(available_tickers(data_dir))
+        if position is not None:
+            tickers = list(position)
+        elif not tickers:
+            tickers = bt.tickers_for_view(view or "", data_dir)
+        unknown = [t for t in tickers if t.upper() not in have]
+        if unknown or not tickers:
+            raise ValueError(f"no market data for {', '.join(unknown)}" if unknown else "no market data for this view")
+        end = max(load_bars(t, data_dir).dates[-1] for t in tickers)
+        start = end - np.timedelta64(int((years or bt.BACKTEST_YEARS) * 365), "D")
+        if position is not None:
+            returns = position_returns(position, start, end, data_dir)
+            source = {"kind": "position", "weights": {t.upper(): w for t, w in position.items()}}
+        else:
+            returns = strategy_returns(template, tickers, params, start, end, data_dir)
+            source = {"kind": "strategy", "template": template, "params": params or {}}
+        source.update(tickers=[t.upper() for t in tickers], start=str(start), end=str(end))
+    result = simulate(returns, **kwargs)
+    result["source"] = source
+    return result
+
+
+async def risk_async(**kwargs) -> dict:
+    """``risk()`` off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(risk, **kwargs))
@@ -1,60 +1,340 @@
+import json
 import re
 
+# part of the strategy cache key: bump when the parsed output shape changes
+PARSER_VERSION = "2"
+
+_SUMMARY = re.compile(r"\*\*1\. Sector & View Summary:\*\*[\s\n]*(.+?)\n---", re.DOTALL)
+_SUMMARY_HEADER = "**1. Sector & View Summary:**"
+
+# field label (as the prompt spells it, plus common LLM variants) -> strategy key
+_LABELS = {
+    "strategy": "name",
+    "explanation": "explanation",
+    "popularity": "popularity",
+    "average return": "avg_return",
+    "avg return": "avg_return",
+    "avg. return": "avg_return",
+    "sharpe ratio": "sharpe_ratio",
+    "win rate": "win_rate",
+    "max drawdown": "max_drawdown",
+    "maximum drawdown": "max_drawdown",
+    "profit factor": "profit_factor",
+    "volatility": "volatility",
+    "expectancy": "expectancy",
+    "risk-reward ratio": "expectancy",
+    "risk reward ratio": "expectancy",
+    "risk/reward": "expectancy",
+    "trade frequency": "trade_frequency",
+}
+METRIC_FIELDS = (
+    "popularity", "avg_return", "sharpe_ratio", "win_rate", "max_drawdown",
+    "profit_factor", "volatility", "expectancy", "trade_frequency",
+)
+
+# One pattern for the whole completion: either a "Label: value" line (with any
+# bullet / heading / bold noise around the label) or a --- separator line.
+# Only [ \t] inside a line, so matches never cross newlines and scanning the
+# text in newline-aligned pieces gives the same result as scanning it whole.
+# The common "12.5%" value is captured as <num> in the same match; anything
+# else (ratios, thousands separators, prose) falls back to parse_number().
+# The value is taken greedily and trimmed afterwards; a lazy value followed by
+# a trailing-whitespace group costs more than the rest of the pattern.
+_LINE = re.compile(
+    r"^(?:[ \t]*-{3,}[ \t]*$"
+    r"|[ \t>#•*\-]*(?:\d+[.)][ \t]*)?\**[ \t]*"
+    r"(?P<label>" + "|".join(re.escape(l) for l in sorted(_LABELS, key=len, reverse=True)) + r")"
+    r"[ \t]*\**[ \t]*[:：][ \t*~≈]*"
+    r"(?P<num>[-+]?\d+(?:\.\d+)?(?![\d,:]))?(?P<value>[^\n]*))",
+    re.I | re.M,
+)
+_RATIO = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*:\s*(\d+(?:\.\d+)?)")
+_NUMBER = re.compile(r"[-+−–]?\s?(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d*\.?\d+)")
+
+
+def parse_number(value):
+    """Signed float from a metric value ("-12.5%", "~1.8", "1:2.5"); ``None`` if absent."""
+    ratio = _RATIO.match(value)
+    if ratio:
+        risk, reward = float(ratio.group(1)), float(ratio.group(2))
+        return reward / risk if risk else None
+    m = _NUMBER.search(value)
+    if not m:
+        return None
+    num = m.group().replace(",", "").replace(" ", "").replace("−", "-").replace("–", "-")
+    return float(num)
+
+
+# JSON Schema of a strategy_json_prompt answer, sent as the provider's response_format
+STRATEGY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sector_view_summary": {"type": "string"},
+        "strategies": {
+            "type": "array",
+            "minItems": 3,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "explanation": {"type": "string"},
+                    **{field: {"type": ["number", "null"]} for field in METRIC_FIELDS},
+                },
+                "required": ["name", "explanation", *METRIC_FIELDS],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["sector_view_summary", "strategies"],
+    "additionalProperties": False,
+}
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.I)
+
+
+def _json_key(key):
+    """Strategy key for a JSON field: ``avg_return``, ``"Average Return"``, ``"sharpeRatio"``..."""
+    key = str(key).strip()
+    if key in METRIC_FIELDS or key in ("name", "explanation"):
+        return key
+    spaced = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", key).replace("_", " ").lower()
+    return _LABELS.get(spaced)
+
+
+def _json_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return parse_number(value)
+    return None
+
+
+def parse_strategies_json(raw_text):
+    """``(sector_summary, strategies)`` from a JSON answer, or ``None`` if it is not one.
+
+    Tolerates code fences and prose around the object, alternative key
+    spellings and metrics given as strings ("12.5%"). Strategies come out in
+    the same shape as ``parse_strategies``: entries without a name or
+    explanation are dropped, missing metrics are ``None`` and listed in
+    ``missing_fields``.
+    """
+    text = _FENCE.sub("", raw_text)
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("strategies"), list):
+        return None
+
+    strategies = []
+    for item in data["strategies"]:
+        if not isinstance(item, dict):
+            continue
+        rec = {}
+        for k, v in item.items():
+            key = _json_key(k)
+            if key is not None and key not in rec:
+                rec[key] = v
+        name = str(rec.get("name") or "").strip(" \t*[]")
+        explanation = str(rec.get("explanation") or "").strip(" \t*")
+        if not name or not explanation:
+            continue
+        strategy = {"name": name, "explanation": explanation}
+        missing = []
+        for field in METRIC_FIELDS:
+            value = _json_number(rec.get(field))
+            if value is None:
+                missing.append(field)
+            strategy[field] = value
+        strategy["missing_fields"] = missing
+        strategies.append(strategy)
+
+    summary = data.get("sector_view_summary")
+    summary = summary.strip() if isinstance(summary, str) and summary.strip() else "Sector summary not found."
+    return summary, strategies
+
+
+def parse_metrics_json(raw_text):
+    """``{name: {metric: float}}`` from a ``strategy_metrics_prompt`` answer (``{}`` if unusable)."""
+    text = _FENCE.sub("", raw_text)
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        data = json.loads(text[start:end + 1]) if 0 <= start < end else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return {}
+    metrics = {}
+    for name, values in data.items():
+        if not isinstance(values, dict):
+            continue
+        found = {}
+        for k, v in values.items():
+            key, value = _json_key(k), _json_number(v)
+            if key in METRIC_FIELDS and value is not None:
+                found[key] = value
+        metrics[str(name).strip(" \t*[]")] = found
+    return metrics
+
+
 def extract_sector_summary(raw_text):
-    summary_match = re.search(r"\*\*1\. Sector & View Summary:\*\*[\s\n]*(.+?)\n---", raw_text, re.DOTALL)
+    summary_match = _SUMMARY.search(raw_text)
     return summary_match.group(1).strip() if summary_match else "Sector summary not found."
 
+
+class _StrategyScanner:
+    """Line-by-line state machine over ``_LINE`` matches.
+
+    A ``Strategy:`` label opens a record; the next ``Strategy:``, a ``---`` line
+    or ``finish()`` closes it. Records without a name or explanation are dropped;
+    metrics that are missing or unparseable become ``None`` and are listed in
+    the strategy's ``missing_fields``.
+    """
+
+    def __init__(self):
+        self._current = None
+
+    def scan(self, text):
+        done = []
+        for m in _LINE.finditer(text):
+            label = m.group("label")
+            if label is None:                      # --- separator
+                self._close(done)
+                continue
+            key = _LABELS[label.lower()]
+            rec = self._current
+            if key == "name":
+                self._close(done)
+                self._current = {"name": (m.group("num") or "") + m.group("value")}
+            elif rec is None or key in rec:
+                continue
+            elif key == "explanation":
+                rec[key] = (m.group("num") or "") + m.group("value")
+            else:
+                num = m.group("num")
+                rec[key] = float(num) if num is not None else parse_number(m.group("value"))
+        return done
+
+    def finish(self):
+        done = []
+        self._close(done)
+        return done
+
+    def _close(self, done):
+        rec, self._current = self._current, None
+        if rec is None:
+            return
+        name = rec["name"].strip(" \t*[]")
+        explanation = rec.get("explanation", "").strip(" \t*")
+        if not name or not explanation:
+            return
+        strategy = {"name": name, "explanation": explanation}
+        missing = []
+        for field in METRIC_FIELDS:
+            value = rec.get(field)
+            if value is None:
+                missing.append(field)
+            strategy[field] = value
+        strategy["missing_fields"] = missing
+        done.append(strategy)
+
+
 def parse_strategies(raw_text):
-    strategies = []
-    number_pat = re.compile(r"[-+]?\d*\.?\d+")
+    scanner = _StrategyScanner()
+    return scanner.scan(raw_text) + scanner.finish()
+
 
-    def extract_value(text, key, pct=False):
-        m = re.search(rf"{key}\s*[:：]\s*([\d.:]+)", text, flags=re.I)
+class IncrementalStrategyParser:
+    """Streaming counterpart of extract_sector_summary + parse_strategies.
+
+    ``feed()`` text chunks as they arrive; it returns ``(event, data)`` pairs as
+    soon as they are known: ``("sector_summary", str)`` once, and
+    ``("strategy", dict)`` per strategy when its closing ``---`` (or the next
+    ``Strategy:``) arrives. ``close()`` flushes the tail. Only complete lines
+    are scanned, so the result is identical to ``parse_strategies(text)``.
+    Each chunk is searched once (plus a few characters carried over from the
+    previous one), so a long answer costs linear time, not quadratic.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._scanner = _StrategyScanner()
+        self._chunks = []
+        self._carry = ""            # tail of the text a header / separator may continue from
+        self._head = None           # chunks from the summary header on, until the summary closes
+        self.sector_summary = None
+        self.strategies = []
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    def feed(self, chunk):
+        self._chunks.append(chunk)
+        events = self._summary(chunk)
+        self._buf += chunk
+        cut = self._buf.rfind("\n")
+        if cut < 0:
+            return events
+        lines, self._buf = self._buf[:cut + 1], self._buf[cut + 1:]
+        return events + self._emit(self._scanner.scan(lines))
+
+    def close(self):
+        found = self._scanner.scan(self._buf) + self._scanner.finish()
+        self._buf = ""
+        events = self._emit(found)
+        if self.sector_summary is None:
+            self.sector_summary = extract_sector_summary(self.text)
+            events.insert(0, ("sector_summary", self.sector_summary))
+        return events
+
+    def _summary(self, chunk):
+        if self.sector_summary is not None:
+            return []
+        window = self._carry + chunk
+        if self._head is None:
+            at = window.find(_SUMMARY_HEADER)
+            if at < 0:
+                self._carry = window[1 - len(_SUMMARY_HEADER):]
+                return []
+            self._head = [window[at:]]
+            window = window[at + len(_SUMMARY_HEADER):]
+        else:
+            self._head.append(chunk)
+        self._carry = window[-3:]
+        if "\n---" not in window:     # the summary only closes at a separator
+            return []
+        m = _SUMMARY.match("".join(self._head))
         if not m:
-            return 0
-        raw = m.group(1).replace(":", ".")
-        val = number_pat.search(raw)
-        if not val:
-            return 0
-        return float(val.group()) if not pct else float(val.group())
-
-    for block in raw_text.split('---'):
-        if "Strategy" not in block:
-            continue
-        clean = block.replace("**", "").replace("###", "").replace("-", "").strip()
-        name_match = re.search(r"Strategy\s*:\s*(.+?)\n", clean, flags=re.I)
-        explanation_match = re.search(r"Explanation\s*:\s*(.+?)\n", clean, flags=re.I)
-        if not name_match or not explanation_match:
-            continue
-        name = name_match.group(1).strip()
-        explanation = explanation_match.group(1).strip()
-        strategies.append({
-            "name": name,
-            "explanation": explanation,
-            "popularity": extract_value(clean, "Popularity", pct=True),
-            "avg_return": extract_value(clean, "Average Return", pct=True),
-            "sharpe_ratio": extract_value(clean, "Sharpe Ratio"),
-            "win_rate": extract_value(clean, "Win Rate", pct=True),
-            "max_drawdown": extract_value(clean, "Max Drawdown", pct=True),
-            "profit_factor": extract_value(clean, "Profit Factor"),
-            "volatility": extract_value(clean, "Volatility", pct=True),
-            "expectancy": extract_value(clean, "Expectancy"),
-            "trade_frequency": extract_value(clean, "Trade Frequency")
-        })
-    return strategies
+            return []
+        self.sector_summary = m.group(1).strip()
+        self._head = None
+        return [("sector_summary", self.sector_summary)]
+
+    def _emit(self, found):
+        self.strategies.extend(found)
+        return [("strategy", s) for s in found]
+
+
+def _fmt(value, suffix=""):
+    return "n/a" if value is None else f"{value}{suffix}"
 
 def build_response_summary(strategies):
     response_summary = ""
     for s in strategies:
         response_summary += f"\n### {s['name']}\n"
         response_summary += f"- **Explanation**: {s['explanation']}\n"
-        response_summary += f"- **Popularity**: {s['popularity']}%\n"
-        response_summary += f"- **Average Return**: {s['avg_return']}%\n"
-        response_summary += f"- **Sharpe Ratio**: {s['sharpe_ratio']}\n"
-        response_summary += f"- **Win Rate**: {s['win_rate']}%\n"
-        response_summary += f"- **Max Drawdown**: {s['max_drawdown']}%\n"
-        response_summary += f"- **Profit Factor**: {s['profit_factor']}\n"
-        response_summary += f"- **Volatility**: {s['volatility']}%\n"
-        response_summary += f"- **Expectancy**: {s['expectancy']}\n"
-        response_summary += f"- **Trade Frequency**: {s['trade_frequency']} trades/month\n"
-    return response_summary 
\ No newline at end of file
+        response_summary += f"- **Popularity**: {_fmt(s['popularity'], '%')}\n"
+        response_summary += f"- **Average Return**: {_fmt(s['avg_return'], '%')}\n"
+        response_summary += f"- **Sharpe Ratio**: {_fmt(s['sharpe_ratio'])}\n"
+        response_summary += f"- **Win Rate**: {_fmt(s['win_rate'], '%')}\n"
+        response_summary += f"- **Max Drawdown**: {_fmt(s['max_drawdown'], '%')}\n"
+        response_summary += f"- **Profit Factor**: {_fmt(s['profit_factor'])}\n"
+        response_summary += f"- **Volatility**: {_fmt(s['volatility'], '%')}\n"
+        response_summary += f"- **Expectancy**: {_fmt(s['expectancy'])}\n"
+        response_summary += f"- **Trade Frequency**: {_fmt(s['trade_frequency'], ' trades/month')}\n"
+    return response_summary
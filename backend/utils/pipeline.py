@@ -0,0 +1,95 @@
+import os
+
+from utils.metrics import span, record_strategies, STRATEGY_PARSES
+from utils.parsing import STRATEGY_SCHEMA, extract_sector_summary, parse_strategies, parse_strategies_json
+from utils.prompts import strategy_json_prompt, strategy_prompt
+from utils.providers import call_llm, router
+from utils.repair import needs_repair, repair_strategies
+from utils.scheduler import PRIORITY_STRATEGY
+from utils.strategy_cache import strategy_cache
+
+# "json": ask for a JSON answer (falling back to the markdown parser if it is not one);
+# "markdown": the original strategy_prompt + regex parser
+STRATEGY_OUTPUT          = os.getenv("STRATEGY_OUTPUT", "json")
+# what the provider is asked to enforce in json mode: json_object, json_schema or none
+STRATEGY_RESPONSE_FORMAT = os.getenv("STRATEGY_RESPONSE_FORMAT", "json_object")
+# where strategy metrics come from by default: "llm" (as answered) or "backtest" (utils.backtest)
+STRATEGY_METRICS         = os.getenv("STRATEGY_METRICS", "llm")
+
+
+def strategy_request(view: str):
+    """``(prompt, response_format)`` for a strategies answer to *view* in the configured mode."""
+    if STRATEGY_OUTPUT != "json":
+        return strategy_prompt(view), None
+    if STRATEGY_RESPONSE_FORMAT == "json_schema":
+        fmt = {"type": "json_schema",
+               "json_schema": {"name": "strategies", "strict": True, "schema": STRATEGY_SCHEMA}}
+    elif STRATEGY_RESPONSE_FORMAT == "json_object":
+        fmt = {"type": "json_object"}
+    else:
+        fmt = None
+    return strategy_json_prompt(view), fmt
+
+
+async def repair(view: str, strategies, priority: int = PRIORITY_STRATEGY, llm=None):
+    """``repair_strategies`` with the continuation calls asking for JSON like the main one."""
+    if not needs_repair(strategies):
+        return strategies
+    response_format = None if STRATEGY_RESPONSE_FORMAT == "none" else {"type": "json_object"}
+    return await repair_strategies(view, strategies, priority, llm, response_format)
+
+
+def parse_answer(raw: str, model: str = None):
+    """``(sector_summary, strategies)`` from a completion in either format.
+
+    JSON is tried first and the markdown parser is the fallback; which one
+    produced the result, and whether it had 3+ strategies, is counted per
+    model in ``tradegpt_strategy_parses_total``.
+    """
+    with span("parse"):
+        parsed = parse_strategies_json(raw) if STRATEGY_OUTPUT == "json" else None
+        if parsed is not None and parsed[1]:
+            fmt, (sector_summary, strategies) = "json", parsed
+        else:
+            fmt = "regex"
+            sector_summary = extract_sector_summary(raw)
+            strategies     = parse_strategies(raw)
+    STRATEGY_PARSES.inc(model=model or router.model_id, format=fmt,
+                        result="ok" if len(strategies) >= 3 else "short")
+    return sector_summary, strategies
+
+
+async def backtested(view: str, strategies, metrics: str = None):
+    """*strategies* with backtested numbers if *metrics* (default ``STRATEGY_METRICS``) is "backtest"."""
+    if (metrics or STRATEGY_METRICS) != "backtest":
+        return strategies
+    from utils.backtest import backtest_strategies      # numpy and a process pool, only when asked for
+    with span("backtest"):
+        return await backtest_strategies(view, strategies)
+
+
+async def get_strategies(view: str, raw: str = None, priority: int = PRIORITY_STRATEGY, llm=None,
+                         metrics: str = None):
+    """Return ``(sector_summary, strategies)`` for *view*.
+
+    Served from the strategy cache when possible. *raw* is an already
+    finished completion for ``strategy_request(view)`` (e.g. from speculation);
+    otherwise one is requested at *priority* from *llm* (default: the shared
+    router). An incomplete answer is repaired with targeted follow-up calls
+    rather than regenerated. Only complete answers (3+ strategies) are cached,
+    with the LLM's metrics; *metrics="backtest"* replaces those afterwards.
+    """
+    model = llm.model_id if llm is not None else None
+    hit = strategy_cache.get(view, model)
+    if hit is not None:
+        return hit["sector_view_summary"], await backtested(view, hit["strategies"], metrics)
+
+    if raw is None:
+        prompt, response_format = strategy_request(view)
+        raw = await call_llm(prompt, priority=priority, llm=llm, response_format=response_format)
+    sector_summary, strategies = parse_answer(raw, model)
+    strategies = await repair(view, strategies, priority, llm)
+    record_strategies(strategies, "complete")
+    if len(strategies) >= 3:
+        strategy_cache.put(view, sector_summary, strategies, model)
+    return sector_summary, await backtested(view, strategies, metrics)
@@ -1,3 +1,6 @@
+# bump whenever strategy_prompt's / strategy_json_prompt's wording/format changes; it is part of the cache key
+STRATEGY_PROMPT_VERSION = "2"
+
 def view_follow_up_prompt(user_msg: str) -> str:
     return (
         f"You are an engaging financial chatbot. The user said:\n"
@@ -6,6 +9,17 @@ def view_follow_up_prompt(user_msg: str) -> str:
         "you to suggest specific trading strategies. Keep it short."
     )
 
+def summary_prompt(summary: str, transcript: str, max_tokens: int = 300) -> str:
+    previous = f"Summary so far:\n{summary}\n\n" if summary else ""
+    return (
+        "You keep a running summary of a conversation between a user and a trading chatbot.\n\n"
+        f"{previous}"
+        f"New messages:\n{transcript}\n\n"
+        "Rewrite the summary to include the new messages. Keep the user's market views, "
+        "sectors, instruments, risk preferences and any strategies already discussed. "
+        f"Plain prose, at most {max_tokens * 3 // 4} words, no preamble."
+    )
+
 def strategy_prompt(user_msg: str) -> str:
     # (your long prompt from before, shortened here)
     prompt = f"""You are a highly knowledgeable trading assistant. A user has a market view or belief as follows:
@@ -53,4 +67,69 @@ def strategy_prompt(user_msg: str) -> str:
 
        Only return the 3+ structured strategy blocks. Avoid summaries, disclaimers, or repetition.
     """
-    return prompt
\ No newline at end of file
+    return prompt
+
+def strategy_json_prompt(user_msg: str) -> str:
+    """JSON counterpart of ``strategy_prompt``; the shape is ``parsing.STRATEGY_SCHEMA``."""
+    return f"""You are a highly knowledgeable trading assistant. A user has a market view or belief as follows:
+        "{user_msg}"
+
+        Recommend at least **three unique, well-justified short- to medium-term trading strategies**
+        aligned with the user's view. Each strategy should be distinct and non-overlapping, commonly
+        used in real-world trading and actionable (not long-term investing).
+
+        Answer with a single JSON object and nothing else, no markdown fences:
+        {{
+          "sector_view_summary": "<two paragraphs: the relevant sector(s), and the user's directional view and reasoning>",
+          "strategies": [
+            {{
+              "name": "<name of the strategy>",
+              "explanation": "<what it is, how it works, how it connects to the user's view; instruments and reasoning>",
+              "popularity": <percent>,
+              "avg_return": <percent>,
+              "sharpe_ratio": <number>,
+              "win_rate": <percent>,
+              "max_drawdown": <percent, negative>,
+              "profit_factor": <number>,
+              "volatility": <percent>,
+              "expectancy": <percent per trade>,
+              "trade_frequency": <trades per month>
+            }}
+          ]
+        }}
+
+        ⚠️ Important:
+        - "strategies" must hold at least 3 entries.
+        - Metrics are plain JSON numbers: 12.5, not "12.5%".
+    """
+
+def strategy_continuation_prompt(user_msg: str, used_names, count: int) -> str:
+    """Ask for *count* more strategies for the view, none of them named in *used_names*."""
+    used = "\n".join(f"        - {name}" for name in used_names) or "        (none)"
+    return f"""You are a highly knowledgeable trading assistant. A user has a market view or belief as follows:
+        "{user_msg}"
+
+        Already suggested (do not repeat these or close variants):
+{used}
+
+        Recommend exactly {count} more distinct short- to medium-term trading strategies aligned with the view.
+        Answer with a single JSON object and nothing else:
+        {{"strategies": [{{"name": "...", "explanation": "...", "popularity": <percent>, "avg_return": <percent>,
+          "sharpe_ratio": <number>, "win_rate": <percent>, "max_drawdown": <percent, negative>,
+          "profit_factor": <number>, "volatility": <percent>, "expectancy": <percent per trade>,
+          "trade_frequency": <trades per month>}}]}}
+        Metrics are plain JSON numbers: 12.5, not "12.5%".
+    """
+
+def strategy_metrics_prompt(user_msg: str, wanted: dict) -> str:
+    """Ask only for the metrics in *wanted* (strategy name -> missing metric keys)."""
+    lines = "\n".join(f"        - {name}: {', '.join(fields)}" for name, fields in wanted.items())
+    return f"""For these trading strategies suggested for the view "{user_msg}",
+        fill in the missing metrics with realistic estimates:
+{lines}
+
+        Keys: popularity, avg_return, win_rate, max_drawdown, volatility and expectancy are percents;
+        sharpe_ratio and profit_factor are ratios; trade_frequency is trades per month.
+        Answer with a single JSON object and nothing else, mapping each strategy name to its metrics,
+        e.g. {{"<name>": {{"sharpe_ratio": 1.2, "win_rate": 55}}}}. Plain JSON numbers only.
+    """
@@ -0,0 +1,493 @@
+"""LLM providers behind one interface, and a latency-aware router over them.
+
+Every backend talks to ``call_llm`` / ``stream_llm`` / ``detect_intent``
+here instead of a specific provider. The router keeps a rolling window of
+latency, time-to-first-token and errors per provider/model, sends each
+request to the fastest healthy one, fails over to the next on error and,
+with hedging on, starts a second attempt on the runner-up when the first has
+not answered (or, when streaming, produced a first token) by its own p95.
+Whichever attempt finishes first wins and the other is cancelled.
+
+Providers are configured with ``LLM_PROVIDERS``, a comma-separated list::
+
+    openrouter                        default model
+    openrouter:meta-llama/llama-3-8b-instruct
+    huggingface                       Mixtral inference endpoint
+    huggingface:https://api-inference.huggingface.co/models/...
+    fake  /  fake:0.2                 in-process fake, optional mean latency (s)
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, deque
+
+import httpx
+
+from utils.llm_client import (OPENROUTER_MODEL, HUGGING_FACE_API_URL, READ_TIMEOUT, INTENT_TIMEOUT,
+                              _post_openrouter, _stream_openrouter, _post_huggingface,
+                              _single_flight, _flight_key)
+from utils.metrics import span
+from utils.parsing import METRIC_FIELDS, extract_sector_summary, parse_strategies
+from utils.scheduler import PRIORITY_CHAT, PRIORITY_INTENT
+
+LLM_PROVIDERS      = os.getenv("LLM_PROVIDERS", "openrouter")
+LLM_HEDGE          = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_DELAY    = float(os.getenv("LLM_HEDGE_DELAY", "20"))       # until there are enough samples
+LLM_HEDGE_TTFT     = float(os.getenv("LLM_HEDGE_TTFT", "5"))         # same, for first token when streaming
+LLM_ROUTER_WINDOW_SECS = float(os.getenv("LLM_ROUTER_WINDOW_SECS", "300"))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "10"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+
+INTENT_LABELS = ("VIEW_WITH_STRATEGY", "VIEW_NO_STRATEGY", "OTHER")
+
+_INTENT_SYSTEM = (
+    "You are an intent classifier for a trading chatbot. "
+    "Return exactly one label from this set:\n"
+    "VIEW_WITH_STRATEGY   - user shares a market/sector view AND explicitly wants trade ideas / strategies\n"
+    "VIEW_NO_STRATEGY     - user shares a market/sector view but does NOT ask for strategies (might just discuss)\n"
+    "OTHER                - any other chit-chat, greeting, question, etc.\n\n"
+    "Output ONLY the label."
+)
+
+
+# ── providers ───────────────────────────────────────────────────────────
+class Provider:
+    """One model at one provider. ``complete`` returns the text, ``stream`` yields deltas."""
+
+    name = "provider"
+
+    async def complete(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT, response_format=None) -> str:
+        """*response_format* is OpenAI-style (``{"type": "json_object"}`` ...); providers
+        that cannot enforce it ignore it and rely on the prompt."""
+        raise NotImplementedError
+
+    async def stream(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT):
+        # providers without token streaming deliver the whole answer as one delta
+        yield await self.complete(messages, timeout, priority)
+
+
+class OpenRouterProvider(Provider):
+
+    def __init__(self, model=OPENROUTER_MODEL):
+        self.model = model
+        self.name = f"openrouter:{model}"
+
+    async def complete(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT, response_format=None) -> str:
+        return await _post_openrouter(messages, timeout, priority, self.model, response_format)
+
+    async def stream(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT):
+        async for delta in _stream_openrouter(messages, timeout, priority, self.model):
+            yield delta
+
+
+class HuggingFaceProvider(Provider):
+
+    def __init__(self, url=HUGGING_FACE_API_URL):
+        self.url = url
+        self.name = f"huggingface:{url.rsplit('/models/', 1)[-1]}"
+
+    async def complete(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT, response_format=None) -> str:
+        # text-generation endpoint: flatten the chat into Mixtral's instruction format,
+        # system text going into the first [INST] and earlier replies between them
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        prompt, pending = "", system
+        for m in messages:
+            if m["role"] == "user":
+                pending = f"{pending}\n\n{m['content']}" if pending else m["content"]
+            elif m["role"] == "assistant":
+                prompt += f"[INST] {pending} [/INST] {m['content']}</s>"
+                pending = ""
+        prompt += f"[INST] {pending} [/INST]"
+        return await _post_huggingface(prompt, timeout, priority, self.url)
+
+
+FAKE_STRATEGY_ANSWER = """**1. Sector & View Summary:**
+The view concerns large-cap technology, where earnings momentum and AI capex remain the main drivers.
+
+The user is moderately bullish over the next quarter and expects leaders to keep outperforming.
+
+---
+
+**2. Trading Strategies:**
+
+- Strategy: Momentum Breakout
+- Explanation: Buy sector leaders closing above 20-day highs on rising volume; exit on a close below the 10-day low.
+- Popularity: 62%
+- Average Return: 4.8%
+- Sharpe Ratio: 1.35
+- Win Rate: 54%
+- Max Drawdown: -9.5%
+- Profit Factor: 1.7
+- Volatility: 18%
+- Expectancy: 0.9% per trade
+- Trade Frequency: 6 trades/month
+---
+- Strategy: Bull Call Spread
+- Explanation: Buy an at-the-money call and sell a call 5% higher on the sector ETF, 30-45 days out.
+- Popularity: 48%
+- Average Return: 6.1%
+- Sharpe Ratio: 1.1
+- Win Rate: 47%
+- Max Drawdown: -12%
+- Profit Factor: 1.5
+- Volatility: 24%
+- Expectancy: 1.2% per trade
+- Trade Frequency: 3 trades/month
+---
+- Strategy: Pullback to 50-Day Moving Average
+- Explanation: Accumulate leaders on orderly pullbacks to the 50-day average with a stop 3% below it.
+- Popularity: 55%
+- Average Return: 3.9%
+- Sharpe Ratio: 1.25
+- Win Rate: 58%
+- Max Drawdown: -7.5%
+- Profit Factor: 1.8
+- Volatility: 15%
+- Expectancy: 0.7% per trade
+- Trade Frequency: 4 trades/month
+---
+"""
+
+FAKE_STRATEGY_JSON = json.dumps({
+    "sector_view_summary": extract_sector_summary(FAKE_STRATEGY_ANSWER),
+    "strategies": [{k: s[k] for k in ("name", "explanation", *METRIC_FIELDS)}
+                   for s in parse_strategies(FAKE_STRATEGY_ANSWER)],
+}, indent=2)
+
+
+def fake_reply(messages) -> str:
+    """Deterministic stand-in answers keyed off which prompt this is."""
+    system = " ".join(m["content"] for m in messages if m["role"] == "system")
+    text = messages[-1]["content"]
+    if "intent classifier" in system:
+        lowered = text.lower()
+        if "strateg" in lowered or "trade idea" in lowered:
+            return "VIEW_WITH_STRATEGY"
+        if any(w in lowered for w in ("bullish", "bearish", "rally", "crash", "outperform")):
+            return "VIEW_NO_STRATEGY"
+        return "OTHER"
+    if "fill in the missing metrics" in text:
+        metrics = json.loads(FAKE_STRATEGY_JSON)["strategies"][0]
+        names = [line.strip()[2:].rsplit(":", 1)[0] for line in text.splitlines() if line.strip().startswith("- ")]
+        return json.dumps({name: {k: metrics[k] for k in METRIC_FIELDS} for name in names})
+    if '"strategies"' in text:
+        return FAKE_STRATEGY_JSON
+    if "Trading Strategies" in text:
+        return FAKE_STRATEGY_ANSWER
+    return "Thanks for sharing. Would you like me to suggest a few trading strategies for that view?"
+
+
+class FakeProvider(Provider):
+    """In-process provider for offline runs, tests and benchmarks.
+
+    Latency is drawn from a lognormal around *latency* (seconds) with spread
+    *jitter*; *ttft* is the share of it spent before the first token when
+    streaming. A fraction *error_rate* of calls fail like an upstream 503.
+    *reply* maps messages to the answer text (default ``fake_reply``).
+    """
+
+    def __init__(self, name="fake", latency=0.05, jitter=0.3, ttft=0.2, error_rate=0.0,
+                 reply=fake_reply, chunk_size=24, seed=None):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.ttft = ttft
+        self.error_rate = error_rate
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    def _delay(self):
+        return self.latency * self._rng.lognormvariate(0, self.jitter) if self.jitter else self.latency
+
+    def _maybe_fail(self):
+        if self.error_rate and self._rng.random() < self.error_rate:
+            request = httpx.Request("POST", f"http://{self.name}.invalid/")
+            raise httpx.HTTPStatusError("fake upstream error", request=request,
+                                        response=httpx.Response(503, request=request))
+
+    async def complete(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT, response_format=None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return self.reply(messages)
+
+    async def stream(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT):
+        self.calls += 1
+        total = self._delay()
+        await asyncio.sleep(total * self.ttft)
+        self._maybe_fail()
+        text = self.reply(messages)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+        gap = total * (1 - self.ttft) / len(chunks)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(gap)
+            yield chunk
+
+
+def providers_from_spec(spec: str):
+    providers = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        kind, _, arg = item.partition(":")
+        if kind == "openrouter":
+            providers.append(OpenRouterProvider(arg or OPENROUTER_MODEL))
+        elif kind == "huggingface":
+            providers.append(HuggingFaceProvider(arg or HUGGING_FACE_API_URL))
+        elif kind == "fake":
+            providers.append(FakeProvider(f"fake{len(providers)}", latency=float(arg) if arg else 0.05))
+        else:
+            raise ValueError(f"unknown LLM provider {item!r} in LLM_PROVIDERS")
+    return providers
+
+
+# ── health / routing ────────────────────────────────────────────────────
+def _quantile(samples, q):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(q * len(s)))] if s else None
+
+
+class ProviderHealth:
+    """Latency, first-token latency and outcomes over the last *window* seconds."""
+
+    def __init__(self, window=LLM_ROUTER_WINDOW_SECS):
+        self.window = window
+        self._latency = deque()         # (t, seconds) of finished (or hedged-away) attempts
+        self._ttft = deque()
+        self._outcomes = deque()        # (t, ok)
+
+    def _prune(self, now):
+        for d in (self._latency, self._ttft, self._outcomes):
+            while d and now - d[0][0] > self.window:
+                d.popleft()
+
+    def record(self, seconds, ok=True, ttft=None):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        if ok:
+            self._latency.append((now, seconds))
+        if ttft is not None:
+            self._ttft.append((now, ttft))
+        self._prune(now)
+
+    def censored(self, seconds):
+        # a hedged-away attempt: it took at least this long
+        self._latency.append((time.monotonic(), seconds))
+
+    def latency(self, q):
+        self._prune(time.monotonic())
+        return _quantile([v for _, v in self._latency], q)
+
+    def first_token(self, q):
+        self._prune(time.monotonic())
+        return _quantile([v for _, v in self._ttft], q)
+
+    @property
+    def samples(self):
+        return len(self._latency)
+
+    @property
+    def error_rate(self):
+        self._prune(time.monotonic())
+        n = len(self._outcomes)
+        return sum(not ok for _, ok in self._outcomes) / n if n else 0.0
+
+    @property
+    def healthy(self):
+        return len(self._outcomes) < LLM_ROUTER_MIN_SAMPLES or self.error_rate <= LLM_ROUTER_MAX_ERROR_RATE
+
+
+class LLMRouter:
+
+    def __init__(self, providers, hedge=LLM_HEDGE, hedge_quantile=LLM_HEDGE_QUANTILE):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = list(providers)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.health = {p.name: ProviderHealth() for p in self.providers}
+        self.counts = Counter()
+
+    @property
+    def model_id(self) -> str:
+        """Identity of what answers, e.g. for cache keys; a lone OpenRouter model is just its name."""
+        if len(self.providers) == 1 and isinstance(self.providers[0], OpenRouterProvider):
+            return self.providers[0].model
+        return "+".join(sorted(p.name for p in self.providers))
+
+    def ranked(self):
+        """Healthy providers fastest-first (unmeasured ones first, to get samples), then the rest."""
+        def speed(p):
+            return self.health[p.name].latency(0.5) or 0.0
+        healthy = sorted((p for p in self.providers if self.health[p.name].healthy), key=speed)
+        sick = sorted((p for p in self.providers if not self.health[p.name].healthy),
+                      key=lambda p: self.health[p.name].error_rate)
+        return healthy + sick
+
+    def _hedge_after(self, provider, streaming):
+        h = self.health[provider.name]
+        if h.samples < LLM_ROUTER_MIN_SAMPLES:
+            return LLM_HEDGE_TTFT if streaming else LLM_HEDGE_DELAY
+        q = h.first_token(self.hedge_quantile) if streaming else h.latency(self.hedge_quantile)
+        return q if q is not None else (LLM_HEDGE_TTFT if streaming else LLM_HEDGE_DELAY)
+
+    async def _race(self, order, start_attempt, streaming):
+        """Start on ``order[0]``; hedge once past its p95, fail over on errors.
+
+        ``start_attempt(provider)`` returns a coroutine; the first one to
+        return wins, and ``(provider, result, started_at)`` is returned.
+        """
+        pending = list(order)
+        running = {}                    # task -> (provider, started_at)
+
+        def launch():
+            provider = pending.pop(0)
+            self.counts[f"sent:{provider.name}"] += 1
+            task = asyncio.ensure_future(start_attempt(provider))
+            running[task] = (provider, time.monotonic())
+
+        launch()
+        hedge_after = self._hedge_after(order[0], streaming) if self.hedge and len(order) > 1 else None
+        error = None
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.counts["hedged"] += 1
+                    hedge_after = None
+                    launch()
+                    continue
+                for task in done:
+                    provider, started = running.pop(task)
+                    if task.exception() is None:
+                        if len(running):
+                            self.counts[f"hedge_won:{provider.name}"] += 1
+                        return provider, task.result(), started
+                    error = task.exception()
+                    self.health[provider.name].record(time.monotonic() - started, ok=False)
+                    self.counts[f"error:{provider.name}"] += 1
+                if not running and pending:
+                    self.counts["failover"] += 1
+                    launch()
+            raise error
+        finally:
+            for task, (provider, started) in running.items():
+                task.cancel()
+                self.health[provider.name].censored(time.monotonic() - started)
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def complete(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT, response_format=None) -> str:
+        provider, text, started = await self._race(
+            self.ranked(), lambda p: p.complete(messages, timeout, priority, response_format), streaming=False)
+        self.health[provider.name].record(time.monotonic() - started)
+        return text
+
+    async def stream(self, messages, timeout=READ_TIMEOUT, priority=PRIORITY_CHAT):
+        """Yield deltas from whichever provider produces a first token first."""
+        gens = {}
+
+        async def first_token(p):
+            gens[p.name] = gen = p.stream(messages, timeout, priority)
+            try:
+                return await gen.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        try:
+            provider, first, started = await self._race(self.ranked(), first_token, streaming=True)
+        except BaseException:
+            for gen in gens.values():
+                await gen.aclose()
+            raise
+        for name, gen in gens.items():
+            if name != provider.name:
+                await gen.aclose()
+        gen = gens[provider.name]
+        health = self.health[provider.name]
+        ttft = time.monotonic() - started
+        try:
+            if first is not None:
+                yield first
+                async for delta in gen:
+                    yield delta
+        except Exception:
+            health.record(time.monotonic() - started, ok=False, ttft=ttft)
+            raise
+        finally:
+            await gen.aclose()
+        health.record(time.monotonic() - started, ttft=ttft)
+
+    def stats(self) -> dict:
+        return {
+            "hedge": self.hedge,
+            "ranking": [p.name for p in self.ranked()],
+            "providers": {
+                p.name: {
+                    "healthy": self.health[p.name].healthy,
+                    "error_rate": self.health[p.name].error_rate,
+                    "samples": self.health[p.name].samples,
+                    "latency_p50": self.health[p.name].latency(0.5),
+                    "latency_p95": self.health[p.name].latency(0.95),
+                    "first_token_p95": self.health[p.name].first_token(0.95),
+                    "hedge_after": self._hedge_after(p, streaming=False),
+                }
+                for p in self.providers
+            },
+            "counts": dict(self.counts),
+        }
+
+
+router = LLMRouter(providers_from_spec(LLM_PROVIDERS))
+
+
+# ── entry points used by the backends ───────────────────────────────────
+async def call_llm(prompt, timeout: float = READ_TIMEOUT, priority: int = PRIORITY_CHAT, llm=None, history=(),
+                   response_format=None):
+    """Completion for a user *prompt* through *llm* (default: the shared router).
+
+    *history* is prepended as-is, e.g. ``ConversationContext.history()``.
+    *response_format* asks providers that support it for structured output.
+    """
+    llm = llm or router
+    messages = [*history, {"role": "user", "content": prompt}]
+    with span("generate"):
+        return await _single_flight(_flight_key(id(llm), messages, response_format),
+                                    lambda: llm.complete(messages, timeout, priority, response_format))
+
+
+async def stream_llm(prompt, timeout: float = READ_TIMEOUT, priority: int = PRIORITY_CHAT, llm=None, history=()):
+    """Yield content deltas for a user *prompt* (after *history*)."""
+    messages = [*history, {"role": "user", "content": prompt}]
+    with span("generate"):
+        async for delta in (llm or router).stream(messages, timeout, priority):
+            yield delta
+
+
+async def detect_intent(user_msg: str, timeout: float = INTENT_TIMEOUT, fallback: str = "OTHER", llm=None) -> str:
+    """Classify *user_msg* with the LLM.
+
+    Upstream failures (rate limits, open circuit, timeouts) return *fallback*;
+    pass ``fallback=None`` to have them raised instead, so callers can tell a
+    real ``OTHER`` from an error.
+    """
+    llm = llm or router
+    messages = [
+        {"role": "system", "content": _INTENT_SYSTEM},
+        {"role": "user", "content": user_msg}
+    ]
+    try:
+        content = await _single_flight(_flight_key(id(llm), messages),
+                                       lambda: llm.complete(messages, timeout, PRIORITY_INTENT))
+    except Exception:
+        if fallback is None:
+            raise
+        return fallback
+    label = content.strip().upper()
+    if label not in INTENT_LABELS:
+        label = "OTHER"
+    return label
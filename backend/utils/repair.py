@@ -0,0 +1,121 @@
+"""Targeted repair of incomplete strategy answers.
+
+When an answer parses into fewer than 3 strategies, or strategies with
+metrics missing, regenerating the whole answer wastes the good part of it
+and doubles the load exactly when the upstream is struggling. Instead the
+valid strategies are kept and short follow-up calls ask only for what is
+missing: ``strategy_continuation_prompt`` for the missing strategies (with
+the names already used excluded). Individual missing metrics are best-effort
+and not worth a paid round-trip on the request path, so they stay ``None``
+unless ``STRATEGY_REPAIR_METRICS=1`` asks ``strategy_metrics_prompt`` for them.
+
+Every repair is bounded: at most ``STRATEGY_REPAIR_ATTEMPTS`` calls, all
+within ``STRATEGY_REPAIR_SECS`` and an estimated ``STRATEGY_REPAIR_TOKENS``
+(prompt + completion). An upstream error ends the repair with what is there.
+"""
+import asyncio
+import os
+import time
+
+from utils.context import estimate_tokens
+from utils.metrics import STRATEGY_REPAIRS, span
+from utils.parsing import METRIC_FIELDS, parse_metrics_json, parse_strategies, parse_strategies_json
+from utils.prompts import strategy_continuation_prompt, strategy_metrics_prompt
+from utils.providers import call_llm
+from utils.scheduler import PRIORITY_STRATEGY
+
+STRATEGY_REPAIR_ATTEMPTS = int(os.getenv("STRATEGY_REPAIR_ATTEMPTS", "2"))
+STRATEGY_REPAIR_SECS     = float(os.getenv("STRATEGY_REPAIR_SECS", "20"))
+STRATEGY_REPAIR_TOKENS   = int(os.getenv("STRATEGY_REPAIR_TOKENS", "1500"))
+STRATEGY_REPAIR_METRICS  = os.getenv("STRATEGY_REPAIR_METRICS", "0") == "1"
+
+MIN_STRATEGIES = 3
+# expected completion size, to check a call fits the token budget before making it
+_TOKENS_PER_STRATEGY = 160
+_TOKENS_PER_METRIC = 8
+
+
+def needs_repair(strategies) -> bool:
+    return len(strategies) < MIN_STRATEGIES or (
+        STRATEGY_REPAIR_METRICS and any(s["missing_fields"] for s in strategies))
+
+
+def _next_call(view, strategies):
+    """``(kind, prompt, expected completion tokens)`` for what is missing, or ``None``."""
+    needed = MIN_STRATEGIES - len(strategies)
+    if needed > 0:
+        prompt = strategy_continuation_prompt(view, [s["name"] for s in strategies], needed)
+        return "continue", prompt, needed * _TOKENS_PER_STRATEGY
+    if not STRATEGY_REPAIR_METRICS:
+        return None
+    wanted = {s["name"]: s["missing_fields"] for s in strategies if s["missing_fields"]}
+    if not wanted:
+        return None
+    expected = sum(len(fields) for fields in wanted.values()) * _TOKENS_PER_METRIC + 10 * len(wanted)
+    return "metrics", strategy_metrics_prompt(view, wanted), expected
+
+
+def _add_strategies(strategies, raw):
+    """Append the strategies in *raw* whose names are new; returns how many were added."""
+    parsed = parse_strategies_json(raw)
+    found = parsed[1] if parsed is not None else parse_strategies(raw)
+    used = {s["name"].casefold() for s in strategies}
+    added = 0
+    for s in found:
+        if s["name"].casefold() not in used:
+            used.add(s["name"].casefold())
+            strategies.append(s)
+            added += 1
+    return added
+
+
+def _fill_metrics(strategies, raw):
+    """Fill missing metrics from a metrics answer in place; returns how many were filled."""
+    answers = {name.casefold(): values for name, values in parse_metrics_json(raw).items()}
+    filled = 0
+    for i, s in enumerate(strategies):
+        values = answers.get(s["name"].casefold())
+        if not values or not s["missing_fields"]:
+            continue
+        s = strategies[i] = dict(s)
+        for field in [f for f in s["missing_fields"] if f in values]:
+            s[field] = values[field]
+            filled += 1
+        s["missing_fields"] = [f for f in METRIC_FIELDS if s[f] is None]
+    return filled
+
+
+async def repair_strategies(view: str, strategies, priority: int = PRIORITY_STRATEGY, llm=None,
+                            response_format=None):
+    """Return *strategies* completed as far as the budgets allow.
+
+    The input list and its dicts are not modified: repaired strategies are
+    copies, new ones are appended after the originals (so callers can tell
+    which are new by position).
+    """
+    strategies = list(strategies)
+    deadline = time.monotonic() + STRATEGY_REPAIR_SECS
+    spent = 0
+    for _ in range(STRATEGY_REPAIR_ATTEMPTS):
+        call = _next_call(view, strategies)
+        if call is None:
+            break
+        kind, prompt, expected = call
+        remaining = deadline - time.monotonic()
+        prompt_tokens = estimate_tokens(prompt)
+        if remaining <= 0 or spent + prompt_tokens + expected > STRATEGY_REPAIR_TOKENS:
+            STRATEGY_REPAIRS.inc(kind=kind, result="over_budget")
+            break
+        try:
+            with span("repair"):
+                raw = await asyncio.wait_for(
+                    call_llm(prompt, timeout=remaining, priority=priority, llm=llm,
+                             response_format=response_format),
+                    remaining)
+        except Exception:
+            STRATEGY_REPAIRS.inc(kind=kind, result="error")
+            break
+        spent += prompt_tokens + estimate_tokens(raw)
+        progress = _add_strategies(strategies, raw) if kind == "continue" else _fill_metrics(strategies, raw)
+        STRATEGY_REPAIRS.inc(kind=kind, result="ok" if progress else "no_progress")
+    return strategies
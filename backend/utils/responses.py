@@ -0,0 +1,176 @@
+"""Fast JSON responses, compression and ETags.
+
+``FastJSONResponse`` serialises with orjson (stdlib ``json`` if it is not
+installed). Return it from a handler directly: FastAPI runs every plain
+return value through ``jsonable_encoder`` first, which on a strategies +
+charts payload costs more than the encoding itself.
+
+``CompressionMiddleware`` handles every buffered (non-streaming) text/JSON
+response:
+
+* on GET / HEAD, adds a strong ``ETag`` (hash of the uncompressed body) and
+  answers ``If-None-Match`` hits with an empty 304, so a client polling an
+  unchanged resource does not download it twice. Unsafe methods (POST
+  ``/chat`` ...) always get the full response: a 304 there would hide the
+  result of the side effects the client asked for. Cached strategy answers
+  are re-fetchable as a GET from ``/strategies/cached?view=...``.
+* compresses bodies of ``RESPONSE_COMPRESS_MIN_BYTES`` or more with brotli
+  (if the ``brotli`` package is installed) or gzip, whichever the client's
+  ``Accept-Encoding`` prefers, and sends ``Vary: Accept-Encoding`` on every
+  such response, compressed or not, so shared caches key on it.
+
+Streamed responses (SSE, NDJSON) are passed through untouched.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL         = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY     = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))   # 11 is far too slow per request
+
+_COMPRESSIBLE = (b"application/json", b"text/", b"application/x-ndjson")
+
+
+def dumps(obj) -> bytes:
+    """JSON-encode *obj*; types orjson does not know go through ``jsonable_encoder``."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=jsonable_encoder,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(obj), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _accepted(accept_encoding: str) -> set:
+    """Codings with a non-zero q-value in an ``Accept-Encoding`` header."""
+    codings = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        codings.add(coding.strip())
+    return codings
+
+
+def choose_encoding(accept_encoding: str):
+    codings = _accepted(accept_encoding)
+    if brotli is not None and "br" in codings:
+        return "br"
+    if "gzip" in codings or "*" in codings:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: str, tag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # compare the opaque part only: W/ prefixes and our -gzip / -br suffixes name the same body
+    base = tag.strip('"').split("-", 1)[0]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/").strip('"')
+        if candidate.split("-", 1)[0] == base:
+            return True
+    return False
+
+
+class CompressionMiddleware:
+    """ASGI middleware: ETag / 304 and brotli-or-gzip for buffered text responses."""
+
+    def __init__(self, app, minimum_size=RESPONSE_COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = {k: v for k, v in scope["headers"] if k in (b"accept-encoding", b"if-none-match")}
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        cacheable = scope["method"] in ("GET", "HEAD")
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1") if cacheable else ""
+        start = None
+        body = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                response_headers = dict(message.get("headers", ()))
+                buffered = (b"content-length" in response_headers
+                            and b"content-encoding" not in response_headers
+                            and response_headers.get(b"content-type", b"").startswith(_COMPRESSIBLE)
+                            and 200 <= message["status"] < 300)
+                if not buffered:
+                    return await send(message)
+                start = message
+                return
+            if start is None:
+                return await send(message)
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await send_buffered(b"".join(body))
+
+        async def send_buffered(payload):
+            headers = [(k, v) for k, v in start.get("headers", ())
+                       if k not in (b"content-length", b"etag", b"vary")]
+            vary = [v for k, v in start.get("headers", ()) if k == b"vary"]
+            if not any(b"accept-encoding" in v.lower() for v in vary):
+                vary.append(b"Accept-Encoding")
+            headers.append((b"vary", b", ".join(vary)))
+            tag = etag(payload) if cacheable else None
+            coding = encoding if encoding is not None and len(payload) >= self.minimum_size else None
+            if coding is not None and tag is not None:
+                tag = f'{tag[:-1]}-{coding}"'
+            if if_none_match and _etag_matches(if_none_match, tag):
+                headers = [(k, v) for k, v in headers if k != b"content-type"]
+                await send({"type": "http.response.start", "status": 304,
+                            "headers": headers + [(b"etag", tag.encode())]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if coding is not None:
+                payload = compress(payload, coding)
+                headers.append((b"content-encoding", coding.encode()))
+            headers.append((b"content-length", str(len(payload)).encode()))
+            if tag is not None:
+                headers.append((b"etag", tag.encode()))
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": payload})
+
+        await self.app(scope, receive, send_wrapper)
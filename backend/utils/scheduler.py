@@ -0,0 +1,302 @@
+"""Rate-limit-aware scheduling of outbound LLM calls.
+
+One ``LLMScheduler`` per provider. It owns a pool of API keys, each with its
+own token bucket (requests/minute) and optional daily quota, and a circuit
+breaker for the provider as a whole. Callers wait in a priority queue, so
+short intent calls go ahead of long strategy generations and batch jobs.
+429s put the key that got them on cooldown for Retry-After (or a jittered
+exponential backoff) and the request is retried on the next available key.
+Transport errors and 5xx are retried with backoff and count against the
+breaker.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import Counter, deque
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+PRIORITY_INTENT   = 0
+PRIORITY_CHAT     = 1
+PRIORITY_STRATEGY = 2
+PRIORITY_BATCH    = 3
+PRIORITY_NAMES = {PRIORITY_INTENT: "intent", PRIORITY_CHAT: "chat",
+                  PRIORITY_STRATEGY: "strategy", PRIORITY_BATCH: "batch"}
+
+KEY_RPM          = float(os.getenv("LLM_KEY_RPM", "20"))
+KEY_BURST        = float(os.getenv("LLM_KEY_BURST", "5"))
+KEY_DAILY_QUOTA  = int(os.getenv("LLM_KEY_DAILY_QUOTA", "0"))       # 0 = unlimited
+MAX_RETRIES      = int(os.getenv("LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE     = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP      = float(os.getenv("LLM_BACKOFF_CAP", "30"))
+QUEUE_TIMEOUT    = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET    = float(os.getenv("LLM_BREAKER_RESET_SECS", "30"))
+
+
+class LLMUnavailable(Exception):
+    """No upstream capacity right now; callers should answer 503."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(LLMUnavailable):
+    pass
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+def backoff(attempt: int, floor: float = 0.0) -> float:
+    """Full-jitter exponential backoff, never shorter than *floor*."""
+    return max(floor, random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+
+def retry_after(response: httpx.Response):
+    """Seconds to wait from Retry-After (seconds or HTTP date) or X-RateLimit-Reset (epoch ms)."""
+    value = response.headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    reset = response.headers.get("x-ratelimit-reset")
+    if reset:
+        try:
+            return max(0.0, float(reset) / 1000 - time.time())
+        except ValueError:
+            pass
+    return None
+
+
+class ApiKey:
+    """Token bucket + cooldown + daily quota for one API key."""
+
+    def __init__(self, value, rpm=KEY_RPM, burst=KEY_BURST, daily_quota=KEY_DAILY_QUOTA):
+        self.value = value
+        self.rate = rpm / 60.0
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.cooldown_until = 0.0
+        self.daily_quota = daily_quota
+        self.day = time.strftime("%Y-%m-%d", time.gmtime())
+        self.used_today = 0
+        self.rate_limited = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        today = time.strftime("%Y-%m-%d", time.gmtime())
+        if today != self.day:
+            self.day, self.used_today = today, 0
+
+    def ready_in(self, now) -> float:
+        """Seconds until this key may send (inf if its daily quota is spent)."""
+        self._refill(now)
+        if self.daily_quota and self.used_today >= self.daily_quota:
+            return float("inf")
+        wait = max(0.0, self.cooldown_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+        self.used_today += 1
+
+    def cool_down(self, seconds, now):
+        self.rate_limited += 1
+        self.cooldown_until = max(self.cooldown_until, now + seconds)
+
+    def stats(self, now) -> dict:
+        self._refill(now)
+        return {
+            "key": f"…{self.value[-4:]}" if self.value else None,
+            "tokens": round(self.tokens, 2),
+            "cooling_for": round(max(0.0, self.cooldown_until - now), 2),
+            "used_today": self.used_today,
+            "daily_quota": self.daily_quota or None,
+            "rate_limited": self.rate_limited,
+        }
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open after a pause."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        state = self.state
+        if state == "open":
+            raise CircuitOpen("LLM provider circuit is open",
+                              self.reset_after - (time.monotonic() - self.opened_at))
+        if state == "half_open":
+            if self._probing:
+                raise CircuitOpen("LLM provider circuit is half-open, probe in flight", 1.0)
+            self._probing = True
+
+    def success(self):
+        self.failures, self.opened_at, self._probing = 0, None, False
+
+    def release(self):
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class LLMScheduler:
+
+    def __init__(self, name, keys, rpm=KEY_RPM, burst=KEY_BURST, daily_quota=KEY_DAILY_QUOTA,
+                 max_retries=MAX_RETRIES, queue_timeout=QUEUE_TIMEOUT, breaker=None):
+        self.name = name
+        self.keys = [ApiKey(k, rpm, burst, daily_quota) for k in keys] or [ApiKey(None, rpm, burst, daily_quota)]
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._waiters = []              # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._timer = None
+        self._waits = {p: deque(maxlen=500) for p in PRIORITY_NAMES}
+        self.counts = Counter()
+
+    # ── queue ──────────────────────────────────────────────────────────
+    def _best_key(self, now):
+        waits = [(k.ready_in(now), -k.tokens, i) for i, k in enumerate(self.keys)]
+        wait, _, i = min(waits)
+        return self.keys[i], wait
+
+    def _kick(self):
+        self._timer = None
+        now = time.monotonic()
+        while self._waiters:
+            if self._waiters[0][2].done():          # timed out / cancelled
+                heapq.heappop(self._waiters)
+                continue
+            key, wait = self._best_key(now)
+            if wait > 0:
+                if wait != float("inf"):
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._kick)
+                return
+            _, _, fut = heapq.heappop(self._waiters)
+            key.take(now)
+            fut.set_result(key)
+
+    async def acquire(self, priority=PRIORITY_CHAT) -> ApiKey:
+        """Wait (in priority order) for a key that may send now."""
+        start = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._timer is None:
+            self._kick()
+        try:
+            key = await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counts["queue_timeouts"] += 1
+            raise RateLimited(f"{self.name}: no API key capacity within {self.queue_timeout:.0f}s",
+                              self._best_key(time.monotonic())[1])
+        self._waits[priority].append(time.monotonic() - start)
+        return key
+
+    # ── requests ───────────────────────────────────────────────────────
+    def report(self, key: ApiKey, response: httpx.Response, attempt: int) -> bool:
+        """Record an upstream response; True if the caller should retry."""
+        status = response.status_code
+        if status == 429:
+            self.counts["429"] += 1
+            key.cool_down(backoff(attempt, retry_after(response) or 0.0), time.monotonic())
+            self.breaker.release()          # our quota, not the provider's health: no verdict
+            return True
+        if status >= 500:
+            self.counts["5xx"] += 1
+            self.breaker.failure()
+            return True
+        self.breaker.success()
+        return False
+
+    async def request(self, send, priority=PRIORITY_CHAT) -> httpx.Response:
+        """``await send(api_key)`` under rate limits, retries and the breaker.
+
+        Returns the final response (``raise_for_status`` is left to the caller).
+        """
+        response = None
+        for attempt in range(self.max_retries + 1):
+            self.breaker.check()
+            try:
+                key = await self.acquire(priority)
+                self.counts["sent"] += 1
+                response = await send(key.value)
+            except (httpx.TransportError, httpx.TimeoutException):
+                self.counts["transport_errors"] += 1
+                self.breaker.failure()
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(backoff(attempt))
+                continue
+            except BaseException:
+                self.breaker.release()      # queue timeout / cancelled: no verdict on the provider
+                raise
+            if not self.report(key, response, attempt) or attempt == self.max_retries:
+                break
+            await response.aclose()
+            if response.status_code >= 500:
+                await asyncio.sleep(backoff(attempt))
+        if response.status_code == 429:
+            await response.aclose()
+            raise RateLimited(f"{self.name}: rate limited after {self.max_retries + 1} attempts",
+                              self._best_key(time.monotonic())[1])
+        return response
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        depth = Counter(p for p, _, f in self._waiters if not f.done())
+        waits = {}
+        for p, samples in self._waits.items():
+            s = sorted(samples)
+            waits[PRIORITY_NAMES[p]] = {
+                "samples": len(s),
+                "avg": sum(s) / len(s) if s else 0.0,
+                "p95": s[int(0.95 * (len(s) - 1))] if s else 0.0,
+            }
+        return {
+            "provider": self.name,
+            "queue_depth": {PRIORITY_NAMES[p]: depth[p] for p in PRIORITY_NAMES},
+            "wait_secs": waits,
+            "breaker": self.breaker.state,
+            "keys": [k.stats(now) for k in self.keys],
+            "counts": dict(self.counts),
+        }
+
+
+def keys_from_env(list_var, single_var):
+    keys = [k.strip() for k in os.getenv(list_var, "").split(",") if k.strip()]
+    single = os.getenv(single_var)
+    return keys or ([single] if single else [])
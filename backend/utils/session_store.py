@@ -0,0 +1,377 @@
+"""Conversation state per session, in-process or shared between workers.
+
+``SESSION_BACKEND`` picks where sessions live:
+
+    memory   in-process LRU with an idle TTL (default; one worker only)
+    sqlite   SQLite file in WAL mode at ``SESSION_DB_PATH``, shared by every
+             worker on the box
+    redis    Redis at ``SESSION_REDIS_URL``, shared across nodes
+             (``pip install redis``)
+
+Every store has the same async API, ``async with store.session(id) as (id, state):``,
+so handlers do not care which one is behind it. Shared stores use optimistic
+concurrency: a session is loaded at some version and the save only goes
+through if nobody saved it in between. On a conflict the changes the request
+made (journaled by the state object) are replayed onto the newer copy and
+the save is retried. Two workers answering the same session at once both
+keep their turns; for flags the last writer wins.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+from itertools import islice
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from utils.context import ConversationContext
+
+MAX_SESSIONS       = int(os.getenv("MAX_SESSIONS", "10000"))
+SESSION_IDLE_TTL   = float(os.getenv("SESSION_IDLE_TTL_SECS", "1800"))
+SESSION_MAX_TURNS  = int(os.getenv("SESSION_MAX_TURNS", "20"))    # exchanges kept verbatim at most
+SESSION_BACKEND    = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH    = os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_REDIS_URL  = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_CAS_RETRIES = int(os.getenv("SESSION_CAS_RETRIES", "5"))
+
+
+class SessionConflict(Exception):
+    """A session kept changing under us for ``SESSION_CAS_RETRIES`` attempts."""
+
+
+class SessionState:
+    __slots__ = ("memory", "last_view", "awaiting_confirmation")
+
+    _TRACKED = frozenset(("last_view", "awaiting_confirmation"))
+
+    def __init__(self, max_turns=SESSION_MAX_TURNS):
+        # recent turns within the token budget, older ones folded into a summary
+        self.memory = ConversationContext(max_turns=2 * max_turns)
+        self.last_view = ""
+        self.awaiting_confirmation = False
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self._TRACKED and self.memory.journal is not None:
+            self.memory.journal.append(("set", name, value))
+
+    def to_dict(self) -> dict:
+        return {"last_view": self.last_view, "awaiting_confirmation": self.awaiting_confirmation,
+                "memory": self.memory.to_dict()}
+
+    def load_dict(self, data: dict):
+        object.__setattr__(self, "last_view", data["last_view"])
+        object.__setattr__(self, "awaiting_confirmation", data["awaiting_confirmation"])
+        self.memory.load_dict(data["memory"])
+        return self
+
+    def apply(self, op):
+        if op[0] == "set":
+            object.__setattr__(self, op[1], op[2])
+        else:
+            self.memory.apply(op)
+
+
+def _context(state) -> ConversationContext:
+    """The conversation inside a state object (a ``SessionState`` or a bare memory)."""
+    return getattr(state, "memory", state)
+
+
+def _approx_bytes(state) -> int:
+    ctx = _context(state)
+    turns = ctx.turns
+    return (
+        sys.getsizeof(state) + sys.getsizeof(ctx) + sys.getsizeof(turns)
+        + sys.getsizeof(getattr(state, "last_view", "")) + sys.getsizeof(ctx.summary)
+        + sum(sys.getsizeof(t) + sys.getsizeof(t.content) for t in turns)
+    )
+
+
+class SessionStore:
+    """LRU of sessions with an idle TTL.
+
+    Entries are kept in last-access order, so expired sessions are always at
+    the front and sweeping costs only as much as there is to evict.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_ttl=SESSION_IDLE_TTL, max_turns=SESSION_MAX_TURNS,
+                 factory=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self.factory = factory or (lambda: SessionState(max_turns))
+        self._sessions = OrderedDict()      # session_id -> [last_seen, state]
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted_lru = 0
+        self.expired = 0
+
+    def _sweep(self, now):
+        cutoff = now - self.idle_ttl
+        while self._sessions:
+            sid, entry = next(iter(self._sessions.items()))
+            if entry[0] > cutoff:
+                break
+            del self._sessions[sid]
+            self.expired += 1
+
+    def get(self, session_id=None):
+        """Return ``(session_id, state)``, creating the session if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            entry = self._sessions.get(session_id) if session_id else None
+            if entry is None:
+                session_id = session_id or str(uuid4())
+                entry = self._sessions[session_id] = [now, self.factory()]
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_lru += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            entry[0] = now
+            return session_id, entry[1]
+
+    async def load(self, session_id=None):
+        return self.get(session_id)
+
+    async def save(self, session_id, state):
+        pass                        # the state object is the session: nothing to write back
+
+    @asynccontextmanager
+    async def session(self, session_id=None):
+        yield self.get(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self, sample=1000) -> dict:
+        with self._lock:
+            self._sweep(time.monotonic())
+            n = len(self._sessions)
+            # walking millions of sessions for a debug page is too slow: extrapolate
+            states = [e[1] for e in islice(reversed(self._sessions.values()), sample)]
+            per_session = sum(_approx_bytes(s) for s in states) / len(states) if states else 0
+            return {
+                "backend": "memory",
+                "sessions": n,
+                "max_sessions": self.max_sessions,
+                "idle_ttl_secs": self.idle_ttl,
+                "max_turns_per_session": self.max_turns,
+                "created": self.created,
+                "evicted_lru": self.evicted_lru,
+                "expired_idle": self.expired,
+                "approx_bytes": int(per_session * n + sys.getsizeof(self._sessions)),
+                "sampled": len(states),
+            }
+
+
+# ── shared backends ──────────────────────────────────────────────────────
+class SQLiteSessionBackend:
+    """Versioned session documents in a local SQLite file (WAL: readers never block).
+
+    Queries run in the default executor: a write waits up to the busy timeout
+    for another worker's lock, and that must not stall this worker's loop.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=SESSION_DB_PATH, idle_ttl=SESSION_IDLE_TTL, max_sessions=MAX_SESSIONS,
+                 sweep_every=500):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sweep_every = sweep_every
+        self._writes = 0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")     # other workers' writes
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, version INTEGER, updated_at REAL, data TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+        self._lock = threading.Lock()
+
+    async def get(self, session_id):
+        """``(version, data)``, or ``(0, None)`` for a missing or expired session."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._get, session_id)
+
+    async def cas(self, session_id, version, data) -> bool:
+        """Store *data* as ``version + 1`` if the session is still at *version*."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._cas, session_id, version, data)
+
+    def _get(self, session_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, data FROM sessions WHERE id = ? AND updated_at > ?",
+                (session_id, time.time() - self.idle_ttl),
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else (0, None)
+
+    def _cas(self, session_id, version, data):
+        now = time.time()
+        payload = json.dumps(data)
+        with self._lock:
+            if version == 0:
+                # new, or expired and not swept yet
+                cur = self._db.execute(
+                    "INSERT INTO sessions VALUES (?, 1, ?, ?) ON CONFLICT (id) DO UPDATE"
+                    " SET version = 1, updated_at = excluded.updated_at, data = excluded.data"
+                    " WHERE sessions.updated_at <= ?",
+                    (session_id, now, payload, now - self.idle_ttl),
+                )
+            else:
+                cur = self._db.execute(
+                    "UPDATE sessions SET version = version + 1, updated_at = ?, data = ?"
+                    " WHERE id = ? AND version = ?",
+                    (now, payload, session_id, version),
+                )
+            ok = cur.rowcount == 1
+            self._writes += 1
+            if self._writes % self.sweep_every == 0:
+                self._sweep(now)
+        return ok
+
+    def _sweep(self, now):
+        self._db.execute("DELETE FROM sessions WHERE updated_at <= ?", (now - self.idle_ttl,))
+        self._db.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions").fetchone()
+        return {"sessions": n, "approx_bytes": size}
+
+
+# HSET v/data only if v is still what the caller loaded; refresh the idle TTL
+_REDIS_CAS = """
+local v = tonumber(redis.call('HGET', KEYS[1], 'v') or '0')
+if v ~= tonumber(ARGV[1]) then return 0 end
+redis.call('HSET', KEYS[1], 'v', v + 1, 'data', ARGV[2])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class RedisSessionBackend:
+    """Versioned session documents in Redis, for workers on several nodes.
+
+    The compare-and-set is a Lua script, so it is atomic on the server;
+    idle sessions expire through Redis' own key TTL.
+    """
+
+    name = "redis"
+
+    def __init__(self, url=SESSION_REDIS_URL, idle_ttl=SESSION_IDLE_TTL, prefix="tradegpt:session:"):
+        import redis.asyncio as redis       # optional: only needed with SESSION_BACKEND=redis
+
+        self.idle_ttl = idle_ttl
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+        self._cas = self._redis.register_script(_REDIS_CAS)
+
+    async def get(self, session_id):
+        version, data = await self._redis.hmget(self.prefix + session_id, "v", "data")
+        return (int(version), json.loads(data)) if version is not None else (0, None)
+
+    async def cas(self, session_id, version, data) -> bool:
+        ok = await self._cas(keys=[self.prefix + session_id],
+                             args=[version, json.dumps(data), int(self.idle_ttl * 1000)])
+        return ok == 1
+
+    def stats(self) -> dict:
+        return {}
+
+
+class SharedSessionStore:
+    """Sessions in a backend that every worker and node can reach.
+
+    ``session()`` loads a fresh copy per request and saves it on the way out
+    (not when the handler raised). Background summary folds are saved the
+    same way once they land.
+    """
+
+    def __init__(self, backend, max_turns=SESSION_MAX_TURNS, factory=None, max_retries=SESSION_CAS_RETRIES):
+        self.backend = backend
+        self.max_turns = max_turns
+        self.factory = factory or (lambda: SessionState(max_turns))
+        self.max_retries = max_retries
+        self.counts = Counter()
+        self._pending = set()       # fold saves in flight
+
+    def _restore(self, data):
+        state = self.factory()
+        return state if data is None else state.load_dict(data)
+
+    async def load(self, session_id=None):
+        session_id = session_id or str(uuid4())
+        version, data = await self.backend.get(session_id)
+        state = self._restore(data)
+        self.counts["loads" if data is not None else "created"] += 1
+        ctx = _context(state)
+        ctx.version = version
+        ctx.journal = []
+        ctx.on_fold = lambda op: self._save_later(session_id, op)
+        return session_id, state
+
+    async def save(self, session_id, state):
+        ctx = _context(state)
+        ops, ctx.journal = ctx.journal, []
+        if not ops:
+            return
+        if await self.backend.cas(session_id, ctx.version, state.to_dict()):
+            ctx.version += 1
+            self.counts["saves"] += 1
+            return
+        await self.update(session_id, ops)
+
+    async def update(self, session_id, ops):
+        """Replay *ops* onto the latest copy of the session and save it."""
+        for _ in range(self.max_retries):
+            version, data = await self.backend.get(session_id)
+            state = self._restore(data)
+            for op in ops:
+                state.apply(op)
+            if await self.backend.cas(session_id, version, state.to_dict()):
+                self.counts["merged_saves"] += 1
+                return
+            self.counts["conflicts"] += 1
+        raise SessionConflict(f"session {session_id} kept changing; gave up after {self.max_retries} tries")
+
+    def _save_later(self, session_id, op):
+        task = asyncio.ensure_future(self.update(session_id, [op]))
+        self._pending.add(task)
+        task.add_done_callback(self._settle)
+
+    def _settle(self, task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.counts["fold_save_errors"] += 1
+
+    @asynccontextmanager
+    async def session(self, session_id=None):
+        session_id, state = await self.load(session_id)
+        yield session_id, state
+        await self.save(session_id, state)
+
+    def stats(self) -> dict:
+        return {"backend": self.backend.name, "max_turns_per_session": self.max_turns,
+                **self.backend.stats(), **self.counts}
+
+
+def session_store_from_env(factory=None, backend=SESSION_BACKEND):
+    """The store ``SESSION_BACKEND`` asks for; *factory* builds an empty state."""
+    if backend == "memory":
+        return SessionStore(factory=factory)
+    if backend == "sqlite":
+        return SharedSessionStore(SQLiteSessionBackend(), factory=factory)
+    if backend == "redis":
+        return SharedSessionStore(RedisSessionBackend(), factory=factory)
+    raise ValueError(f"unknown SESSION_BACKEND {backend!r} (memory, sqlite or redis)")
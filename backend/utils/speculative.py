@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+from collections import Counter, deque
+
+from utils.context import estimate_tokens
+from utils.providers import call_llm
+from utils.scheduler import PRIORITY_CHAT, PRIORITY_STRATEGY
+from utils.intent_fast import classifier
+
+# Opt-in: the intent call and the most likely downstream call run side by side.
+# Whatever the classifier does not pick is cancelled and charged to a rolling
+# token budget; once that budget is spent we fall back to sequential calls.
+SPECULATIVE_MODE   = os.getenv("SPECULATIVE_MODE", "0") == "1"
+SPEC_TOKEN_BUDGET  = int(os.getenv("SPECULATIVE_TOKEN_BUDGET", "200000"))   # wasted tokens / window
+SPEC_WINDOW_SECS   = float(os.getenv("SPECULATIVE_WINDOW_SECS", "3600"))
+SPEC_OUTPUT_TOKENS = int(os.getenv("SPECULATIVE_OUTPUT_TOKENS", "1500"))    # worst case per cancelled call
+
+# a speculative call queues like the call it stands in for would, never above it
+BRANCH_PRIORITY = {"VIEW_WITH_STRATEGY": PRIORITY_STRATEGY}     # other branches: chat replies
+
+
+class SpeculationPolicy:
+    """Decides whether to speculate and which branch, and caps the wasted spend."""
+
+    def __init__(self, enabled=SPECULATIVE_MODE, token_budget=SPEC_TOKEN_BUDGET,
+                 window=SPEC_WINDOW_SECS, output_tokens=SPEC_OUTPUT_TOKENS):
+        self.enabled = enabled
+        self.token_budget = token_budget
+        self.window = window
+        self.output_tokens = output_tokens
+        self._waste = deque()       # (timestamp, tokens)
+        # prior: most fresh messages on our traffic are VIEW_WITH_STRATEGY
+        self.branch_counts = Counter({"VIEW_WITH_STRATEGY": 1})
+        self.speculated = 0         # calls started
+        self.speculated_tokens = 0
+        self.hits = 0
+        self.misses = 0
+        self.abandoned = 0          # the request failed before the intent was known
+        self.skipped = 0
+
+    def wasted_tokens(self) -> int:
+        cutoff = time.monotonic() - self.window
+        while self._waste and self._waste[0][0] < cutoff:
+            self._waste.popleft()
+        return sum(t for _, t in self._waste)
+
+    def cost(self, prompt: str, context_tokens: int = 0) -> int:
+        """Worst-case tokens of one speculative call."""
+        return estimate_tokens(prompt) + context_tokens + self.output_tokens
+
+    def allow(self, prompt: str, context_tokens: int = 0) -> bool:
+        if not self.enabled:
+            return False
+        if self.wasted_tokens() + self.cost(prompt, context_tokens) > self.token_budget:
+            self.skipped += 1
+            return False
+        return True
+
+    def likely_branch(self, candidates) -> str:
+        return max(candidates, key=lambda b: self.branch_counts[b])
+
+    def started(self, cost: int):
+        self.speculated += 1
+        self.speculated_tokens += cost
+
+    def record(self, intent: str, branch: str, cost: int):
+        """Outcome of a speculative call of *cost* tokens once the intent is known."""
+        self.branch_counts[intent] += 1
+        if intent == branch:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._waste.append((time.monotonic(), cost))
+
+    def abandon(self, cost: int):
+        self.abandoned += 1
+        self._waste.append((time.monotonic(), cost))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "speculated": self.speculated,
+            "speculated_tokens": self.speculated_tokens,
+            "hits": self.hits,
+            "misses": self.misses,
+            "abandoned": self.abandoned,
+            "hit_rate": self.hits / self.speculated if self.speculated else 0.0,
+            "skipped_over_budget": self.skipped,
+            "wasted_tokens_in_window": self.wasted_tokens(),
+            "token_budget": self.token_budget,
+        }
+
+
+policy = SpeculationPolicy()
+
+
+def _discard(task: asyncio.Task):
+    if task.done():
+        if not task.cancelled():
+            task.exception()    # mark retrieved, we don't care about the loser
+    else:
+        task.cancel()
+
+
+async def speculate_intent(user_text: str, branches: dict, fallback: str = "OTHER",
+                           awaiting_confirmation: bool = False, histories: dict = None,
+                           response_formats: dict = None):
+    """Classify *user_text* while speculatively running the likeliest branch.
+
+    *branches* maps intent label -> downstream prompt, or ``None`` when that
+    branch needs no LLM call (e.g. a cache hit). Intents missing from it
+    resolve to *fallback*'s prompt. *histories* optionally maps a label to the
+    conversation messages sent ahead of its prompt, and *response_formats* a
+    label to the ``response_format`` its call asks for. Returns ``(intent, raw)`` where *raw* is the
+    finished completion for the chosen branch, or ``None`` if it was not
+    speculated and the caller has to make the call itself.
+
+    When the local fast-path classifier is confident there is nothing to
+    overlap with, so no speculation happens.
+    """
+    intent = classifier.fast(user_text, awaiting_confirmation)
+    if intent is not None:
+        return intent, None
+
+    candidates = [b for b, p in branches.items() if p is not None]
+    if not candidates:
+        return await classifier.slow(user_text, awaiting_confirmation), None
+    branch = policy.likely_branch(candidates)
+    prompt = branches[branch]
+    history = (histories or {}).get(branch, ())
+    context_tokens = sum(estimate_tokens(m["content"]) for m in history)
+    if not policy.allow(prompt, context_tokens):
+        return await classifier.slow(user_text, awaiting_confirmation), None
+
+    response_format = (response_formats or {}).get(branch)
+    cost = policy.cost(prompt, context_tokens)
+    policy.started(cost)
+    spec = asyncio.ensure_future(call_llm(prompt, priority=BRANCH_PRIORITY.get(branch, PRIORITY_CHAT),
+                                          history=history, response_format=response_format))
+    try:
+        intent = await classifier.slow(user_text, awaiting_confirmation)
+    except BaseException:
+        _discard(spec)
+        policy.abandon(cost)
+        raise
+
+    chosen = intent if intent in branches else fallback
+    policy.record(chosen, branch, cost)
+    if chosen != branch:
+        _discard(spec)
+        return intent, None
+    return intent, await spec
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.parsing import PARSER_VERSION
+from utils.prompts import STRATEGY_PROMPT_VERSION
+from utils.providers import router
+
+CACHE_PATH        = os.getenv("STRATEGY_CACHE_PATH", "strategy_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("STRATEGY_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECS    = float(os.getenv("STRATEGY_CACHE_TTL_SECS", str(6 * 3600)))
+
+# words that don't change the view ("Bullish on the telecom sector!" == "bullish on telecom")
+_FILLER = {
+    "a", "an", "the", "sector", "sectors", "stocks", "stock", "space", "industry",
+    "please", "pls", "really", "very", "quite", "i", "im", "am", "i'm",
+}
+_PUNCT = re.compile(r"[^\w\s%'-]")
+
+
+def normalize_view(view: str) -> str:
+    words = _PUNCT.sub(" ", view.lower()).split()
+    return " ".join(w for w in words if w not in _FILLER)
+
+
+def cache_key(view: str, model: str = None, version: str = STRATEGY_PROMPT_VERSION) -> str:
+    """*model* identifies who answers (default: the shared router's providers)."""
+    model = model or router.model_id
+    raw = f"{version}|{PARSER_VERSION}|{model}|{normalize_view(view)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class StrategyCache:
+    """LRU + TTL cache of parsed strategy answers, write-through to SQLite.
+
+    Values are ``{"sector_view_summary": str, "strategies": [dict, ...]}``.
+    The in-process LRU serves hot keys; SQLite makes entries survive restarts
+    and lets several workers on one box share them. Called from a running
+    event loop, lookups and ``put`` update the LRU at once and leave SQLite
+    writes to the default executor, on a connection of their own (WAL: they
+    never block reads); ``flush()`` waits for those.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lru = OrderedDict()     # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = self._writer = None
+        self._write_lock = threading.Lock()
+        self._pending = set()         # SQLite writes in the executor
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS strategy_cache ("
+                " key TEXT PRIMARY KEY, expires_at REAL, used_at REAL, value TEXT)"
+            )
+            self._writer = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+
+    def _remember(self, key, expires_at, value):
+        self._lru[key] = (expires_at, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, key, now):
+        entry = self._lru.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._lru.move_to_end(key)
+                return entry[1], False
+            del self._lru[key]
+        if self._db is None:
+            return None, False
+        row = self._db.execute(
+            "SELECT expires_at, value FROM strategy_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] <= now:
+            return None, False
+        value = json.loads(row[1])
+        self._remember(key, row[0], value)
+        self._in_background(self._touch, key, now)
+        return value, True
+
+    def peek(self, view: str, model: str = None):
+        """Like :meth:`get` but without touching the hit/miss counters."""
+        with self._lock:
+            return self._lookup(cache_key(view, model), time.time())[0]
+
+    def contains(self, view: str, model: str = None) -> bool:
+        return self.peek(view, model) is not None
+
+    def get(self, view: str, model: str = None):
+        with self._lock:
+            value, from_disk = self._lookup(cache_key(view, model), time.time())
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.disk_hits += from_disk
+            return value
+
+    def put(self, view: str, sector_view_summary: str, strategies: list, model: str = None):
+        key = cache_key(view, model)
+        now = time.time()
+        value = {"sector_view_summary": sector_view_summary, "strategies": strategies}
+        with self._lock:
+            self._remember(key, now + self.ttl, value)
+        if self._db is None:
+            return
+        row = (key, now + self.ttl, now, json.dumps(value))     # serialised now: callers may change value
+        self._in_background(self._write, row, now)
+
+    # ── SQLite writes ──────────────────────────────────────────────────
+    def _in_background(self, fn, *args):
+        """*fn* in the executor if there is a running loop (the request path), else right away."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return fn(*args)
+        future = loop.run_in_executor(None, fn, *args)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    def _touch(self, key, now):
+        with self._write_lock:
+            self._writer.execute("UPDATE strategy_cache SET used_at = ? WHERE key = ?", (now, key))
+
+    def _write(self, row, now):
+        with self._write_lock:
+            self._writer.execute("INSERT OR REPLACE INTO strategy_cache VALUES (?, ?, ?, ?)", row)
+            # keep the file bounded too: drop expired rows, then least recently used
+            self._writer.execute("DELETE FROM strategy_cache WHERE expires_at <= ?", (now,))
+            self._writer.execute(
+                "DELETE FROM strategy_cache WHERE key IN ("
+                " SELECT key FROM strategy_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    async def flush(self):
+        """Wait for the SQLite writes still in flight."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM strategy_cache")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries_in_memory": len(self._lru),
+            "max_entries": self.max_entries,
+            "ttl_secs": self.ttl,
+        }
+
+
+strategy_cache = StrategyCache()
@@ -0,0 +1,60 @@
+from utils.charts import render_charts
+from utils.metrics import TOO_FEW_STRATEGIES, record_strategies
+from utils.parsing import IncrementalStrategyParser
+from utils.pipeline import repair
+from utils.prompts import strategy_prompt
+from utils.providers import stream_llm
+from utils.responses import dumps
+from utils.scheduler import PRIORITY_STRATEGY
+from utils.strategy_cache import strategy_cache
+
+
+def sse(event: str, data) -> str:
+    """Format one Server-Sent-Events frame."""
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+async def stream_strategies(view: str, chart_format: str = None):
+    """Yield ``(event, data)`` for a strategy answer as it is generated.
+
+    Events: ``token`` (raw provider text), ``sector_summary``, ``strategy``
+    (one per block, as soon as its closing ``---`` arrives), then ``charts``
+    on success or ``error`` if fewer than 3 strategies parsed. An incomplete
+    answer is repaired first: strategies it adds come as further ``strategy``
+    events, and ones whose metrics were filled in as ``strategy_update``
+    (``{"index": i, "strategy": ...}``).
+    """
+    hit = strategy_cache.get(view)
+    if hit is not None:
+        yield "sector_summary", hit["sector_view_summary"]
+        for s in hit["strategies"]:
+            yield "strategy", s
+        strategies = hit["strategies"]
+    else:
+        parser = IncrementalStrategyParser()
+        async for chunk in stream_llm(strategy_prompt(view), priority=PRIORITY_STRATEGY):
+            yield "token", chunk
+            for event in parser.feed(chunk):
+                yield event
+        for event in parser.close():
+            yield event
+        strategies = await repair(view, parser.strategies)
+        for i, s in enumerate(strategies):
+            if i >= len(parser.strategies):
+                yield "strategy", s
+            elif s is not parser.strategies[i]:
+                yield "strategy_update", {"index": i, "strategy": s}
+        record_strategies(strategies, "stream")
+        if len(strategies) < 3:
+            TOO_FEW_STRATEGIES.inc(endpoint="/chat/stream")
+            yield "error", "LLM returned fewer than 3 strategies."
+            return
+        strategy_cache.put(view, parser.sector_summary, strategies)
+
+    yield "charts", render_charts(strategies, chart_format)
+
+
+async def stream_reply(prompt: str, history=()):
+    """Yield ``("token", text)`` for a plain conversational completion."""
+    async for chunk in stream_llm(prompt, history=history):
+        yield "token", chunk
@@ -0,0 +1,349 @@
+"""Parameter sweeps over the backtest templates.
+
+``sweep()`` evaluates parameter sets of one template on a set of tickers and
+returns them ranked, as strategy dicts that ``build_response_summary`` and
+``render_charts`` take as they are. Search spaces map a parameter to a list
+of values (grid) or to ``{"low": .., "high": .., "int": bool, "log": bool}``
+(random / TPE); ``DEFAULT_SPACES`` has one per template.
+
+    grid    every combination (dict ranges become ``num`` evenly spaced points)
+    random  ``trials`` independent draws
+    tpe     ``trials`` draws, after a random start each batch proposed where a
+            Parzen estimator over the best quarter of the results so far beats
+            the one over the rest (Bayesian optimisation, TPE flavour)
+
+Candidates are evaluated by a process pool. The bars of every ticker are
+copied once into a ``SharedMemory`` block that the workers map at start-up,
+so a task carries only its parameters, never price arrays. Evaluation runs
+in rungs over a growing share of the tickers (``SWEEP_RUNGS``; of the
+history when there is only one ticker -- a backtest of a few thousand daily
+bars costs about the same whatever its length, so cutting tickers is what
+saves time): after each rung a candidate is pruned if it scores in the
+bottom ``1 - 1/SWEEP_ETA`` of everything seen at that rung, so clearly bad
+regions are never backtested in full.
+"""
+import asyncio
+import functools
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils import backtest as bt
+from utils.marketdata import FIELDS, Bars, available_tickers, load_bars
+
+SWEEP_PROCESSES = int(os.getenv("SWEEP_PROCESSES", str(os.cpu_count() or 1)))
+SWEEP_RUNGS     = tuple(float(f) for f in os.getenv("SWEEP_RUNGS", "0.25,0.5,1").split(","))
+SWEEP_ETA       = float(os.getenv("SWEEP_ETA", "3"))        # keep the best 1/eta at each rung
+SWEEP_MAX_TRIALS = int(os.getenv("SWEEP_MAX_TRIALS", "2000"))
+
+DEFAULT_SPACES = {
+    "momentum": {"lookback": [10, 21, 42, 63, 126, 189, 252], "long_only": [True, False]},
+    "mean_reversion": {"period": [5, 7, 10, 14, 21], "lower": [15, 20, 25, 30, 35, 40],
+                       "exit": [45, 50, 55, 60, 65, 70]},
+    "breakout": {"entry": [10, 20, 40, 55, 80, 120], "exit": [5, 10, 20, 40]},
+    "pairs": {"window": [20, 40, 60, 90, 120], "entry": [1.5, 2.0, 2.5, 3.0], "exit": [0.0, 0.25, 0.5, 1.0]},
+    "covered_call": {"days": [5, 10, 21, 42, 63], "otm": [0.0, 0.02, 0.05, 0.08, 0.1]},
+}
+_LABELS = {
+    "momentum": "Momentum",
+    "mean_reversion": "RSI Mean Reversion",
+    "breakout": "Breakout",
+    "pairs": "Pairs vs " + bt.BACKTEST_BENCHMARK,
+    "covered_call": "Covered Call",
+}
+
+
+# ── search spaces ───────────────────────────────────────────────────────
+def _is_range(values):
+    return isinstance(values, dict)
+
+
+def grid(space: dict, num: int = 5) -> list:
+    axes = []
+    for name, values in space.items():
+        if _is_range(values):
+            lo, hi = values["low"], values["high"]
+            points = np.geomspace(lo, hi, num) if values.get("log") else np.linspace(lo, hi, num)
+            values = sorted({int(round(p)) for p in points}) if values.get("int") else [float(p) for p in points]
+        axes.append([(name, v) for v in values])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+
+def _draw(values, rng):
+    if not _is_range(values):
+        return values[rng.integers(len(values))]
+    lo, hi = values["low"], values["high"]
+    x = math.exp(rng.uniform(math.log(lo), math.log(hi))) if values.get("log") else rng.uniform(lo, hi)
+    return int(round(x)) if values.get("int") else float(x)
+
+
+def sample(space: dict, n: int, rng) -> list:
+    return [{name: _draw(values, rng) for name, values in space.items()} for _ in range(n)]
+
+
+def _key(params):
+    return tuple(sorted(params.items()))
+
+
+def _tpe(space, history, n, rng, tried, gamma=0.25, candidates=64):
+    """*n* untried parameter sets maximising l(x)/g(x) among draws from the good points' estimator."""
+    ranked = sorted(history, key=lambda h: h[1], reverse=True)
+    split = max(1, int(math.ceil(gamma * len(ranked))))
+    good, bad = [p for p, _ in ranked[:split]], [p for p, _ in ranked[split:]] or [p for p, _ in ranked]
+
+    def density(name, values, points, x):
+        if not _is_range(values):
+            counts = sum(1 for p in points if p[name] == x)
+            return (counts + 1) / (len(points) + len(values))
+        to = math.log if values.get("log") else float
+        lo, hi = to(values["low"]), to(values["high"])
+        width = max((hi - lo) / max(len(points), 1) ** 0.5, 1e-9)
+        centres = np.array([to(p[name]) for p in points])
+        return float(np.mean(np.exp(-0.5 * ((to(x) - centres) / width) ** 2)) / width + 1e-12)
+
+    def propose():
+        params = {}
+        for name, values in space.items():
+            base = good[rng.integers(len(good))][name]
+            if not _is_range(values):
+                params[name] = base if rng.random() < 0.7 else _draw(values, rng)
+                continue
+            to, back = (math.log, math.exp) if values.get("log") else (float, float)
+            lo, hi = to(values["low"]), to(values["high"])
+            x = back(float(np.clip(rng.normal(to(base), (hi - lo) / max(len(good), 1) ** 0.5), lo, hi)))
+            params[name] = int(round(x)) if values.get("int") else x
+        return params
+
+    scored = []
+    for params in (propose() for _ in range(candidates)):
+        ratio = 1.0
+        for name, values in space.items():
+            ratio *= density(name, values, good, params[name]) / density(name, values, bad, params[name])
+        scored.append((ratio, params))
+    scored.sort(key=lambda s: s[0], reverse=True)
+    out = []
+    for _, params in scored:
+        if _key(params) not in tried:
+            tried.add(_key(params))
+            out.append(params)
+        if len(out) == n:
+            break
+    return out
+
+
+# ── shared price data ───────────────────────────────────────────────────
+class SharedBars:
+    """Bars of many tickers in one ``SharedMemory`` block: 5 float64 rows + int64 dates."""
+
+    def __init__(self, bars: dict = None, name: str = None, layout: dict = None):
+        if name is None:
+            layout, total = {}, 0
+            for ticker, b in bars.items():
+                layout[ticker] = (total, len(b.close))
+                total += len(b.close)
+            self.shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * 8 * (len(FIELDS) + 1))
+            self._owner = True
+        else:
+            total = sum(n for _, n in layout.values())
+            self.shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self.layout = layout
+        self.values = np.ndarray((len(FIELDS), total), np.float64, buffer=self.shm.buf)
+        self.dates = np.ndarray((total,), np.int64, buffer=self.shm.buf, offset=len(FIELDS) * total * 8)
+        if bars is not None:
+            for ticker, (offset, n) in layout.items():
+                b = bars[ticker]
+                self.dates[offset:offset + n] = b.dates.astype(np.int64)
+                for i, field in enumerate(FIELDS):
+                    self.values[i, offset:offset + n] = getattr(b, field)
+
+    def __getitem__(self, ticker) -> Bars:
+        offset, n = self.layout[ticker]
+        rows = slice(offset, offset + n)
+        return Bars(self.dates[rows].view("datetime64[D]"), *(self.values[i, rows] for i in range(len(FIELDS))))
+
+    def close(self):
+        self.values = self.dates = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+_shared = None
+
+
+def _attach(name, layout):
+    """Pool initializer: map the parent's block."""
+    global _shared
+    _shared = SharedBars(name=name, layout=layout)
+
+
+def evaluate(template: str, params: dict, fraction: float = 1.0, data=None) -> dict:
+    """Median metrics of *params* over the first *fraction* of the tickers in *data* (default:
+    the worker's shared bars), or over the first *fraction* of the history if there is one ticker."""
+    data = data if data is not None else _shared
+    benchmark = data[bt.BACKTEST_BENCHMARK] if template == "pairs" else None
+    tickers = [t for t in data.layout if not (template == "pairs" and t == bt.BACKTEST_BENCHMARK)]
+    if len(tickers) > 1:
+        tickers, fraction = tickers[:max(1, round(len(tickers) * fraction))], 1.0
+    results = {}
+    for ticker in tickers:
+        bars = data[ticker]
+        if fraction < 1.0:
+            bars = Bars(*(a[:int(len(a) * fraction)] for a in bars))
+        try:
+            results[ticker] = bt.compute_metrics(*bt.run(template, bars, params, benchmark))
+        except ValueError:
+            results[ticker] = None
+    return bt.aggregate(results)
+
+
+def _evaluate_batch(template, batch, fraction, data=None):
+    return [evaluate(template, params, fraction, data) for params in batch]
+
+
+# ── the sweep ───────────────────────────────────────────────────────────
+def _score(metrics, objective):
+    value = metrics.get(objective)
+    if value is None:
+        return -math.inf
+    return -value if objective in ("volatility",) else value
+
+
+def _settings(params):
+    return ", ".join(f"{k}={v:g}" if isinstance(v, float) else f"{k}={v}" for k, v in params.items())
+
+
+def _describe(template, params, tickers, start, end):
+    return (f"{_LABELS[template]} with {_settings(params)}, backtested on {', '.join(tickers)} "
+            f"from {start} to {end} (median across tickers).")
+
+
+def sweep(template: str, tickers, space: dict = None, search: str = "grid", trials: int = 100,
+          objective: str = "sharpe_ratio", top: int = 10, start=None, end=None, processes: int = None,
+          seed: int = 0, data_dir: str = None, rungs=SWEEP_RUNGS, eta=SWEEP_ETA):
+    """Rank parameter sets of *template* on *tickers*; returns ``(strategies, stats)``.
+
+    *strategies* are the *top* parameter sets by *objective* (any backtested
+    metric; higher is better except for volatility) that survived every
+    rung, each with a ``params`` entry. *stats* counts evaluations, pruning
+    and the share of full backtests the pruning saved. ``ValueError`` for an
+    unknown template, objective, search or parameter name.
+    """
+    if template not in bt.TEMPLATES:
+        raise ValueError(f"unknown template {template!r}; one of {', '.join(bt.TEMPLATES)}")
+    if objective not in bt.BACKTEST_FIELDS:
+        raise ValueError(f"unknown objective {objective!r}; one of {', '.join(bt.BACKTEST_FIELDS)}")
+    space = space or DEFAULT_SPACES[template]
+    bt.check_params(template, space)    # a typo is a 400 here, not a TypeError in every worker
+    rng = np.random.default_rng(seed)
+    trials = min(trials, SWEEP_MAX_TRIALS)
+    rungs = sorted(set(rungs) | {1.0})
+
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    names = tickers + ([bt.BACKTEST_BENCHMARK] if template == "pairs" and bt.BACKTEST_BENCHMARK not in tickers else [])
+    bars = {t: load_bars(t, data_dir, start, end) for t in names}
+    shared = SharedBars(bars)
+    processes = max(1, processes or SWEEP_PROCESSES)
+    pool = ProcessPoolExecutor(processes, initializer=_attach, initargs=(shared.shm.name, shared.layout)) \
+        if processes > 1 else None
+
+    seen = {r: [] for r in rungs}       # scores per rung, for the pruning quantile
+    finished, history = [], []
+    stats = {"evaluations": 0, "pruned": 0, "full_equivalents": 0.0}
+
+    def run_batch(candidates):
+        alive = candidates
+        for fraction in rungs:
+            if not alive:
+                return
+            if pool is None:
+                metrics = _evaluate_batch(template, alive, fraction, shared)
+            else:
+                chunks = [alive[i::processes] for i in range(processes)]
+                futures = [pool.submit(_evaluate_batch, template, c, fraction) for c in chunks if c]
+                parts = [f.result() for f in futures]
+                metrics = [None] * len(alive)
+                for i, part in enumerate(parts):
+                    metrics[i::processes] = part
+            stats["evaluations"] += len(alive)
+            stats["full_equivalents"] += len(alive) * fraction
+            scores = [_score(m, objective) for m in metrics]
+            seen[fraction].extend(scores)
+            if fraction == 1.0:
+                finished.extend(zip(alive, metrics, scores))
+                history.extend(zip(alive, scores))
+                return
+            cut = np.quantile(seen[fraction], 1 - 1 / eta) if len(seen[fraction]) >= eta else -math.inf
+            keep = [i for i, s in enumerate(scores) if s >= cut and s > -math.inf]
+            stats["pruned"] += len(alive) - len(keep)
+            history.extend((alive[i], scores[i]) for i in range(len(alive)) if i not in keep)
+            alive = [alive[i] for i in keep]
+
+    try:
+        if search == "grid":
+            candidates = grid(space)[:SWEEP_MAX_TRIALS]
+            run_batch(candidates)
+        elif search == "random":
+            candidates = sample(space, trials, rng)
+            run_batch(candidates)
+        elif search == "tpe":
+            startup = min(trials, max(processes, trials // 4))
+            candidates = list({_key(p): p for p in sample(space, startup, rng)}.values())
+            tried = {_key(p) for p in candidates}
+            run_batch(candidates)
+            batch = max(processes, 4)
+            while len(candidates) < trials:
+                proposals = _tpe(space, history, min(batch, trials - len(candidates)), rng, tried)
+                if not proposals:       # (nearly) every point of a discrete space has been tried
+                    break
+                candidates += proposals
+                run_batch(proposals)
+        else:
+            raise ValueError(f"unknown search {search!r}; grid, random or tpe")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        shared.close()
+
+    first, last = min(b.dates[0] for b in bars.values()), max(b.dates[-1] for b in bars.values())
+    finished.sort(key=lambda f: f[2], reverse=True)
+    strategies = []
+    for params, metrics, score in finished[:top]:
+        if score == -math.inf:
+            continue
+        s = {"name": f"{_LABELS[template]} ({_settings(params)})",
+             "explanation": _describe(template, params, tickers, first, last),
+             "popularity": None, **metrics}
+        s["missing_fields"] = [f for f in ("popularity",) + bt.BACKTEST_FIELDS if s[f] is None]
+        s["params"] = params
+        strategies.append(s)
+    stats.update(candidates=len(candidates), completed=len(finished), template=template, search=search,
+                 objective=objective, processes=processes,
+                 saved=round(1 - stats["full_equivalents"] / max(len(candidates), 1), 3))
+    stats["full_equivalents"] = round(stats["full_equivalents"], 2)
+    return strategies, stats
+
+
+async def sweep_view(template: str, tickers=None, view: str = None, years: float = None, **kwargs):
+    """``sweep()`` off the event loop, on *tickers* or those ``tickers_for_view(view)`` picks.
+
+    Uses the last *years* (default ``BACKTEST_YEARS``) of history unless
+    ``start`` / ``end`` are given. ``ValueError`` for an unknown template,
+    search or ticker, or when no local data matches.
+    """
+    data_dir = kwargs.get("data_dir")
+    have = set(available_tickers(data_dir))
+    tickers = [t.upper() for t in tickers] if tickers else bt.tickers_for_view(view or "", data_dir)
+    unknown = [t for t in tickers if t not in have]
+    if unknown or not tickers:
+        raise ValueError(f"no market data for {', '.join(unknown)}" if unknown else "no market data for this view")
+    if kwargs.get("start") is None:
+        end = kwargs.get("end") or max(load_bars(t, data_dir).dates[-1] for t in tickers)
+        kwargs["start"] = np.datetime64(end, "D") - np.timedelta64(int((years or bt.BACKTEST_YEARS) * 365), "D")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(sweep, template, tickers, **kwargs))
@@ -1,16 +1,21 @@
-import streamlit as st, base64, requests, plotly.graph_objects as go
+import streamlit as st, base64, os, uuid, requests, plotly.graph_objects as go
+from requests.adapters import HTTPAdapter
+
+BACKEND_URL     = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
+BACKEND_TIMEOUT = (5, float(os.getenv("BACKEND_READ_TIMEOUT", "120")))   # (connect, read) seconds
+HERE            = os.path.dirname(os.path.abspath(__file__))
 
 # --- MUST be first Streamlit call -------------
 st.set_page_config(page_title="Trading Strategy Chatbot", layout="wide")
 # ----------------------------------------------
 
-def set_background(image_file: str) -> None:
-    """Cover the viewport with *image_file* while keeping content visible."""
+@st.cache_resource
+def background_css(image_file: str) -> str:
+    """Read + base64 the background once per process, not on every rerun."""
     with open(image_file, "rb") as f:
         encoded = base64.b64encode(f.read()).decode()
 
-    st.markdown(
-        f"""
+    return f"""
         <style>
             /* 1️⃣ Full-page fixed layer */
             .stApp::before {{
@@ -30,12 +35,54 @@ def set_background(image_file: str) -> None:
                 color:#ffffff !important;
             }}
         </style>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
+
+def set_background(image_file: str) -> None:
+    """Cover the viewport with *image_file* while keeping content visible."""
+    st.markdown(background_css(image_file), unsafe_allow_html=True)
+
+@st.cache_resource
+def http_session() -> requests.Session:
+    """One keep-alive connection pool to the backend, shared by all reruns/users."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
 
 # inject CSS **after** page-config
-set_background("5072609.jpg")
+set_background(os.path.join(HERE, "5072609.jpg"))
+
+def chart_figures(charts: dict) -> dict:
+    """Figures keyed by metric, from either chart payload the backend sends.
+
+    ``compact``: one name vector + one value vector per metric + a small spec,
+    expanded here. Otherwise the payload already is ``{metric: figure_dict}``.
+    """
+    if charts.get("format") != "compact":
+        return {k: go.Figure(v) for k, v in charts.items()}
+    figures = {}
+    for key, values in charts["series"].items():
+        spec = charts["spec"][key]
+        fig = go.Figure([go.Bar(x=charts["x"], y=values)])
+        fig.update_layout(title=spec["title"], xaxis_title=charts["xaxis_title"],
+                          yaxis_title=spec["yaxis_title"])
+        figures[key] = fig
+    return figures
+
+@st.cache_resource(max_entries=256)
+def cached_figures(message_id: str, _charts: dict) -> dict:
+    """chart_figures, built once per assistant message (``_charts`` isn't hashed)."""
+    return chart_figures(_charts)
+
+def render_charts(message_id: str, charts: dict) -> None:
+    figures = cached_figures(message_id, charts) if message_id else chart_figures(charts)
+    chart_keys = list(figures.keys())
+    for i in range(0, len(chart_keys), 3):
+        cols = st.columns(min(3, len(chart_keys) - i))
+        for j, key in enumerate(chart_keys[i:i+3]):
+            with cols[j]:
+                st.subheader(key.replace("_", " ").title())
+                st.plotly_chart(figures[key], use_container_width=True, key=f"{message_id or id(charts)}_{key}")
 
 # === Streamlit UI ===
 st.title("📈 Trading Strategy Chatbot")
@@ -51,8 +98,11 @@ st.set_page_config(layout="wide")
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# index of the newest assistant message: only its charts are drawn eagerly
+latest = max((i for i, m in enumerate(st.session_state.messages) if m["role"] == "assistant"), default=-1)
+
 # Display all chat messages from history
-for message in st.session_state.messages:
+for idx, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         # For assistant messages, show additional elements
         if message["role"] == "assistant":
@@ -66,14 +116,14 @@ for message in st.session_state.messages:
         
         # Show charts if they exist
         if message["role"] == "assistant" and "charts" in message and message["charts"]:
-            chart_keys = list(message["charts"].keys())
-            for i in range(0, len(chart_keys), 3):
-                cols = st.columns(min(3, len(chart_keys) - i))
-                for j, key in enumerate(chart_keys[i:i+3]):
-                    with cols[j]:
-                        st.subheader(key.replace("_", " ").title())
-                        fig = go.Figure(message["charts"][key])
-                        st.plotly_chart(fig, use_container_width=True)
+            message_id = message.get("id")      # cache key; shared across sessions, so never an index
+            if idx == latest:
+                render_charts(message_id, message["charts"])
+            else:
+                # older answers: collapsed, and nothing is built or sent until asked for
+                with st.expander("📊 Strategy charts"):
+                    if st.toggle("Show charts", key=f"show_{message_id or idx}"):
+                        render_charts(message_id, message["charts"])
 
 # Handle new user input
 if prompt := st.chat_input("What's your market view or investment interest?"):
@@ -86,7 +136,8 @@ if prompt := st.chat_input("What's your market view or investment interest?"):
     
     try:
         # Get response from backend
-        response = requests.post("http://127.0.0.1:8000/chat", json={"message": prompt})
+        response = http_session().post(f"{BACKEND_URL}/chat", json={"message": prompt},
+                                       timeout=BACKEND_TIMEOUT)
         response.raise_for_status()
         data = response.json()
 
@@ -96,6 +147,7 @@ if prompt := st.chat_input("What's your market view or investment interest?"):
 
         # Create assistant message structure
         assistant_message = {
+            "id": uuid.uuid4().hex,
             "role": "assistant",
             "content": bot_response,
             "charts": charts